@@ -1,18 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Iterable
+import hashlib
+import struct
+
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
 
 from .horizons import Horizons
+from .local import Local
+from .provider import CoordinateProvider
 from helios_exceptions import HeliosException
+from persistent_cache import PersistentCache
+import conf
 
 # Use lower case for key names
 _providers = {
-    'horizons': Horizons
+    'horizons': Horizons,
+    'local': Local
 }
 
+# Positions are cached per (provider, body, date). Dates on multiples of this
+# many seconds are keyed by that multiple, see _CachedGet.
+_QUANTUM = int(conf.get("cache", "ephemeris_quantum_seconds", "60"))
+_cache = PersistentCache("ephemeris", int(conf.get("cache", "ephemeris_max_bytes", str(64 * 1024 * 1024))))
+# Shared by all requests so the number of concurrent upstream queries stays
+# bounded no matter how many batch requests are running.
+_pool = ThreadPoolExecutor(max_workers=int(conf.get("ephemeris", "max_concurrent_queries", "8")),
+                           thread_name_prefix="ephemeris")
+# Largest number of dates a single range request may generate
+_MAX_RANGE_POINTS = int(conf.get("ephemeris", "max_range_points", "100000"))
+
 def Get(provider: str, body: str, dates: Iterable[datetime]) -> list[dict]:
     try:
         # Use lower case so any variation of PrOvIdEr will execute the
         # selected provider.
-        return _providers[provider.lower()].Get(body, dates)
+        source = _providers[provider.lower()]
     except KeyError:
-        raise HeliosException(f"Unknown provider: {provider}")
\ No newline at end of file
+        raise HeliosException(f"Unknown provider: {provider}")
+    if not source.cache_results:
+        return source.Get(body, dates)
+    return _CachedGet(provider.lower(), source, body, dates)
+
+def GetBodies(provider: str, bodies: Iterable[str], dates: Iterable[datetime]) -> dict[str, list[dict]]:
+    """
+    Returns positions for several bodies at the same dates. Bodies are queried
+    concurrently, so this takes about as long as the slowest body.
+
+    Returns
+    -------
+    dict of body: positions, where positions holds one coordinate per date.
+    """
+    bodies = list(dict.fromkeys(bodies))
+    dates = Time(dates)
+    futures = {body: _pool.submit(Get, provider, body, dates) for body in bodies}
+    return {body: future.result() for body, future in futures.items()}
+
+def DateRange(start: datetime, end: datetime, cadence: float) -> Time:
+    """
+    Returns an array of times from start to end (inclusive) spaced by cadence.
+    `HeliosException` is raised if the range is invalid or too large.
+
+    Parameters
+    ----------
+    start: `datetime`
+        First date in the range
+    end: `datetime`
+        Last date in the range. It is only included if it falls on the cadence.
+    cadence: `float`
+        Seconds between each date
+    """
+    if cadence <= 0:
+        raise HeliosException("Cadence must be greater than 0")
+    start = Time(start)
+    duration = (Time(end) - start).to_value(u.s)
+    if duration < 0:
+        raise HeliosException("End date must be after the start date")
+    count = int(np.floor(duration / cadence + 1e-9)) + 1
+    if count > _MAX_RANGE_POINTS:
+        raise HeliosException(f"Range contains {count} dates, the maximum is {_MAX_RANGE_POINTS}. Use a larger cadence or smaller range.")
+    return start + np.arange(count) * cadence * u.s
+
+def RangeResponse(start: Time, cadence: float, xyz: np.ndarray) -> dict:
+    """
+    Packs positions over a date range into a response. The dates are implied
+    by start, cadence, and count, and positions are given as one list per axis.
+
+    Parameters
+    ----------
+    start: `Time`
+        First date in the range
+    cadence: `float`
+        Seconds between each date
+    xyz: `np.ndarray`
+        Array with shape (3, count) of positions in the Helios frame
+    """
+    x, y, z = np.reshape(xyz, (3, -1)).tolist()
+    return {
+        "start": start.isot,
+        "cadence": cadence,
+        "count": len(x),
+        "x": x,
+        "y": y,
+        "z": z
+    }
+
+def GetRange(provider: str, body: str, start: datetime, end: datetime, cadence: float) -> tuple[Time, np.ndarray]:
+    """
+    Returns positions for a body at every `cadence` seconds from start to end.
+
+    Returns
+    -------
+    The dates as a `Time` array, and an `np.ndarray` with shape (3, N) of the
+    positions in the Helios frame.
+    """
+    dates = DateRange(start, end, cadence)
+    return dates, PositionsToArray(Get(provider, body, dates))
+
+def PositionsToArray(positions: list[dict]) -> np.ndarray:
+    """
+    Converts a list of {x, y, z} positions into an array with shape (3, N)
+    """
+    return np.array([[p['x'], p['y'], p['z']] for p in positions]).reshape(-1, 3).T
+
+def _Pack(position: dict) -> bytes:
+    return struct.pack("<3d", position['x'], position['y'], position['z'])
+
+def _Unpack(data: bytes) -> dict:
+    x, y, z = struct.unpack("<3d", data)
+    return {'x': x, 'y': y, 'z': z}
+
+def _CachedGet(provider: str, source: CoordinateProvider, body: str, dates: Iterable[datetime]) -> list[dict]:
+    """
+    Returns positions from the ephemeris cache, querying the provider only for
+    the dates that aren't cached.
+    """
+    # Dates on the grid of whole multiples of _QUANTUM unix seconds share keys
+    # across requests with slightly different dates. Other dates, like those of
+    # ranges with a finer cadence, are cached by their exact microsecond.
+    unix = np.atleast_1d(Time(dates).unix)
+    grid = np.round(unix / _QUANTUM) * _QUANTUM
+    on_grid = np.abs(unix - grid) < 1e-3
+    keys = [f"{provider}/{body}/{int(grid_time)}" if is_on_grid else f"{provider}/{body}/{round(exact * 1e6)}us"
+            for grid_time, exact, is_on_grid in zip(grid, unix, on_grid)]
+    # Layout is key: unix time to query
+    key_times = {key: grid_time if is_on_grid else exact for key, grid_time, exact, is_on_grid in zip(keys, grid, unix, on_grid)}
+    cached = _cache.GetMany(keys)
+    missing = sorted((key_times[key], key) for key in key_times if key not in cached)
+    if len(missing) > 0:
+        missing_keys = [key for _, key in missing]
+
+        def fetch() -> dict[str, bytes]:
+            missing_dates = Time([unix_time for unix_time, _ in missing], format="unix").to_datetime()
+            positions = source.Get(body, missing_dates)
+            fetched = {key: _Pack(position) for key, position in zip(missing_keys, positions)}
+            _cache.PutMany(fetched)
+            return fetched
+
+        def fetched_by_other_request() -> dict[str, bytes] | None:
+            found = _cache.GetMany(missing_keys, record=False)
+            return found if len(found) == len(missing_keys) else None
+
+        # Concurrent requests missing the same dates share one upstream query
+        flight = f"{provider}/{body}/" + hashlib.sha1(",".join(missing_keys).encode()).hexdigest()
+        cached.update(_cache.Coalesce(flight, fetch, fetched_by_other_request))
+    return [_Unpack(cached[key]) for key in keys]
+
+def CacheStats() -> dict:
+    return _cache.Stats()
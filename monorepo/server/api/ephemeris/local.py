@@ -0,0 +1,287 @@
+"""
+Local ephemeris store for Horizons bodies.
+
+Positions are ingested from JPL Horizons at a coarse cadence and fit with
+Chebyshev polynomials over fixed length time segments. Queries within the
+stored time span are answered by evaluating the polynomials, anything outside
+of it falls back to querying Horizons.
+
+Each body in the store directory is saved as two files:
+
+- `<body>.npy` float64 array with shape (segments, 3, degree + 1) holding the
+  Chebyshev coefficients of the HCRS x, y, and z position in solar radii.
+  Segment `i` covers the TT julian dates `start + i * segment_days` to
+  `start + (i + 1) * segment_days`. It is memory mapped when loaded.
+- `<body>.json` metadata: start, end, segment_days, and max_error. end is
+  the TT julian date of the last ingested position, the last segment may
+  extend past it but isn't fit there. max_error is the largest difference
+  (in solar radii) between the fit and ingested positions that were held out
+  of the fit.
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Callable, Iterable
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord, CartesianRepresentation, HCRS
+from astropy.time import Time
+from numpy.polynomial import chebyshev
+from sunpy.coordinates import get_horizons_coord
+
+from api.ephemeris.horizons import Horizons
+from api.ephemeris.provider import CoordinateProvider
+from helios_exceptions import HeliosException
+from helios_frame import skycoord_to_helios, helios_to_hcrs
+import conf
+
+PROGRAM_DESCRIPTION = "Ingest Horizons positions for a body into the local ephemeris store"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['body'], {'type': str, 'help': 'Body to ingest, uses the same names as the horizons provider'}),
+    (['start'], {'type': datetime.fromisoformat, 'help': 'UTC start of the time span to store'}),
+    (['end'], {'type': datetime.fromisoformat, 'help': 'UTC end of the time span to store'}),
+    (['--step-minutes'], {'type': int, 'default': 60, 'help': 'Cadence to sample Horizons at'}),
+    (['--segment-days'], {'type': float, 'default': 4, 'help': 'Length of each polynomial segment'}),
+    (['--degree'], {'type': int, 'default': 24, 'help': 'Degree of the polynomial fit to each segment'}),
+]
+
+# Horizons limits the number of rows returned per query, so long spans are
+# ingested in chunks of this many days.
+_INGEST_CHUNK_DAYS = 365
+
+def _StorePath() -> str:
+    return conf.get("ephemeris", "store_path", "ephemeris_store")
+
+def _FileName(body: str) -> str:
+    """
+    Returns a file system safe name for the given body.
+    """
+    return re.sub(r"[^\w+-]", "_", body)
+
+class EphemerisStore:
+    def __init__(self, coefficients: np.ndarray, start: float, end: float, segment_days: float, max_error: float):
+        """
+        Parameters
+        ----------
+        coefficients: `np.ndarray`
+            Chebyshev coefficients with shape (segments, 3, degree + 1)
+        start: `float`
+            TT julian date of the start of the first segment
+        end: `float`
+            TT julian date of the last position the segments were fit to
+        segment_days: `float`
+            Length of each segment in days
+        max_error: `float`
+            Error bound of the stored positions in solar radii, measured
+            against ingested positions that weren't used in the fit.
+        """
+        self.coefficients = coefficients
+        self.start = start
+        self.end = end
+        self.segment_days = segment_days
+        self.max_error = max_error
+
+    def Contains(self, jd: np.ndarray) -> np.ndarray:
+        """
+        Returns a mask of which of the given TT julian dates are in the stored span.
+        """
+        return (jd >= self.start) & (jd <= self.end)
+
+    def Evaluate(self, jd: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the stored positions at the given TT julian dates.
+        All dates must be within the stored span.
+
+        Returns
+        -------
+        `np.ndarray` with shape (3, N) of HCRS x, y, and z in solar radii.
+        """
+        offset = (jd - self.start) / self.segment_days
+        segment = np.clip(np.floor(offset).astype(int), 0, len(self.coefficients) - 1)
+        # Position within each segment scaled to [-1, 1]
+        t = (2 * (offset - segment) - 1)[:, None]
+        coefficients = self.coefficients[segment]
+        # Clenshaw's recurrence, evaluated for every date at once.
+        b1 = np.zeros(coefficients.shape[:2])
+        b2 = np.zeros(coefficients.shape[:2])
+        for k in range(coefficients.shape[2] - 1, 0, -1):
+            b1, b2 = 2 * t * b1 - b2 + coefficients[:, :, k], b1
+        return (t * b1 - b2 + coefficients[:, :, 0]).T
+
+    @classmethod
+    def Fit(cls, jd: np.ndarray, hcrs: np.ndarray, segment_days: float, degree: int) -> "EphemerisStore":
+        """
+        Fits Chebyshev segments to the given positions.
+
+        Parameters
+        ----------
+        jd: `np.ndarray`
+            Sorted TT julian dates of each position
+        hcrs: `np.ndarray`
+            HCRS positions with shape (3, N) in solar radii
+        segment_days: `float`
+            Length of each segment in days
+        degree: `int`
+            Degree of the polynomial fit to each segment
+        """
+        start = jd[0]
+        count = max(1, int(np.ceil((jd[-1] - start) / segment_days)))
+        coefficients = np.empty((count, 3, degree + 1))
+        max_error = 0
+        for idx in range(count):
+            segment_start = start + idx * segment_days
+            # Samples on the boundary between segments are used by both.
+            in_segment = (jd >= segment_start) & (jd <= segment_start + segment_days)
+            t = 2 * (jd[in_segment] - segment_start) / segment_days - 1
+            positions = hcrs[:, in_segment]
+            # Every other sample is held out of the fit so the error is
+            # measured between the points the polynomial was fit to.
+            if len(t[::2]) <= degree:
+                raise HeliosException(f"Not enough samples to fit segment {idx}, use a smaller step or degree")
+            fit = chebyshev.chebfit(t[::2], positions[:, ::2].T, degree)
+            coefficients[idx] = fit.T
+            residual = chebyshev.chebval(t, fit) - positions
+            max_error = max(max_error, np.max(np.abs(residual)))
+        return cls(coefficients, start, jd[-1], segment_days, float(max_error))
+
+    def Save(self, path: str, body: str):
+        os.makedirs(path, exist_ok=True)
+        name = os.path.join(path, _FileName(body))
+        with open(name + ".json", "w") as fp:
+            json.dump({
+                "body": body,
+                "start": self.start,
+                "end": self.end,
+                "segment_days": self.segment_days,
+                "max_error": self.max_error
+            }, fp)
+        np.save(name + ".npy", self.coefficients)
+
+    @classmethod
+    def Load(cls, path: str, body: str) -> "EphemerisStore | None":
+        """
+        Loads the given body from the store, or None if the body isn't stored.
+        """
+        name = os.path.join(path, _FileName(body))
+        if not os.path.exists(name + ".npy"):
+            return None
+        with open(name + ".json") as fp:
+            meta = json.load(fp)
+        coefficients = np.load(name + ".npy", mmap_mode="r")
+        # Stores saved without an end are trusted up to the end of their last
+        # segment, re-ingest them to stop extrapolating past the last sample.
+        end = meta.get("end", meta["start"] + len(coefficients) * meta["segment_days"])
+        return cls(coefficients, meta["start"], end, meta["segment_days"], meta["max_error"])
+
+# Loaded stores, layout is body: (modification time, store)
+_stores = {}
+
+def _GetStore(body: str) -> EphemerisStore | None:
+    """
+    Returns the store for the given body, reloading it if it has been re-ingested.
+    """
+    path = _StorePath()
+    try:
+        mtime = os.path.getmtime(os.path.join(path, _FileName(body) + ".npy"))
+    except OSError:
+        return None
+    cached = _stores.get(body)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, EphemerisStore.Load(path, body))
+        _stores[body] = cached
+    return cached[1]
+
+class Local(CoordinateProvider):
+    # Evaluating the store is faster than a cache lookup
+    cache_results = False
+
+    @classmethod
+    def Query(cls, body: str, dates: Iterable[datetime]) -> SkyCoord:
+        """
+        Returns coordinates from the local ephemeris store. Dates outside of
+        the stored span are queried from Horizons.
+
+        Parameters
+        ----------
+        body: `str`
+            Body to request coordinates for
+        dates: `list[datetime]`
+            List of dates. A coordinate will be returned for each date in the list
+        """
+        times = Time(dates)
+        jd = np.atleast_1d(times.tt.jd)
+        store = _GetStore(body)
+        stored = store.Contains(jd) if store is not None else np.zeros(jd.shape, dtype=bool)
+        hcrs = np.empty((3, len(jd)))
+        if np.any(stored):
+            hcrs[:, stored] = store.Evaluate(jd[stored])
+        if not np.all(stored):
+            missing = np.atleast_1d(times)[~stored]
+            logging.debug(f"{len(missing)} dates for {body} are outside the local store, querying Horizons")
+            hcrs[:, ~stored] = helios_to_hcrs(skycoord_to_helios(Horizons.Query(body, missing)))
+        return SkyCoord(CartesianRepresentation(hcrs.reshape((3,) + times.shape) * u.solRad), frame=HCRS(obstime=times))
+
+def _QueryHorizonsRange(body: str, start: Time, stop: Time, step_minutes: int) -> SkyCoord:
+    return get_horizons_coord(body, {'start': start, 'stop': stop, 'step': f"{step_minutes}m"})
+
+def Ingest(body: str, start: datetime, end: datetime, step_minutes: int = 60, segment_days: float = 4, degree: int = 24,
+           query: Callable[[str, Time, Time, int], SkyCoord] = _QueryHorizonsRange) -> EphemerisStore:
+    """
+    Samples positions for the given body and saves them to the local store.
+    Any previously stored data for the body is replaced.
+
+    Parameters
+    ----------
+    body: `str`
+        Body to ingest
+    start: `datetime`
+        Start of the time span to store
+    end: `datetime`
+        End of the time span to store
+    step_minutes: `int`
+        Cadence to sample positions at
+    segment_days: `float`
+        Length of each polynomial segment in days
+    degree: `int`
+        Degree of the polynomial fit to each segment
+    query: `Callable`
+        Function that returns positions for a body between two times at the
+        given cadence. Defaults to querying Horizons.
+    """
+    chunks = []
+    chunk_start = Time(start)
+    while chunk_start < Time(end):
+        chunk_end = min(chunk_start + _INGEST_CHUNK_DAYS * u.day, Time(end))
+        chunks.append(query(body, chunk_start, chunk_end, step_minutes))
+        chunk_start = chunk_end
+    jd = np.concatenate([np.atleast_1d(chunk.obstime.tt.jd) for chunk in chunks])
+    hcrs = np.concatenate([helios_to_hcrs(skycoord_to_helios(chunk)).reshape(3, -1) for chunk in chunks], axis=1)
+    # Chunk boundaries are sampled twice
+    jd, unique = np.unique(jd, return_index=True)
+    store = EphemerisStore.Fit(jd, hcrs[:, unique], segment_days, degree)
+    store.Save(_StorePath(), body)
+    return store
+
+def main(body: str, start: datetime, end: datetime, step_minutes: int, segment_days: float, degree: int):
+    store = Ingest(body, start, end, step_minutes, segment_days, degree)
+    print(f"Stored {len(store.coefficients)} segments for {body}, max error {store.max_error:.3e} solar radii ({(store.max_error * u.solRad).to_value(u.km):.3f} km)")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
@@ -2,11 +2,16 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Iterable
 
+import numpy as np
 from astropy.coordinates import SkyCoord
 
-from get_heeq import convert_skycoords_to_heeq
+from get_heeq import convert_skycoords_to_heeq_array, heeq_array_to_list
 
 class CoordinateProvider(ABC):
+    # Set to False for providers that are already cheap to query, so their
+    # results aren't stored in the ephemeris cache.
+    cache_results = True
+
     @classmethod
     def Get(cls, body: str, dates: Iterable[datetime]) -> list[dict]:
         """
@@ -25,11 +30,18 @@ class CoordinateProvider(ABC):
         return CoordinateProvider.ConvertSkyCoords(coordinates)
 
     @classmethod
-    def ConvertSkyCoords(cls, coords: Iterable[SkyCoord]) -> list[dict]:
+    def ConvertSkyCoords(cls, coords: SkyCoord | Iterable[SkyCoord]) -> list[dict]:
         """
         Converts SkyCoords to Helios coordinates.
+        Array SkyCoords are transformed together in a single vectorized call.
         """
-        return list(map(lambda x: convert_skycoords_to_heeq(x), coords))
+        if isinstance(coords, SkyCoord):
+            xyz = convert_skycoords_to_heeq_array(coords)
+        else:
+            # Scalar SkyCoords may each have their own obstime, so they can't
+            # be merged into one array and must be transformed one by one.
+            xyz = np.stack([convert_skycoords_to_heeq_array(coord) for coord in coords], axis=-1)
+        return heeq_array_to_list(xyz)
 
     @classmethod
     @abstractmethod
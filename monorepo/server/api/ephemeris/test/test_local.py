@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+import astropy.units as u
+from astropy.time import Time
+from sunpy.coordinates import get_earth
+
+from api.ephemeris import local
+from api.ephemeris.local import Local, EphemerisStore
+from api.ephemeris.horizons import Horizons
+from get_heeq import convert_skycoords_to_heeq_array
+
+# Earth (399) positions from 2023-01-01 to 2023-03-01, made with local.Ingest
+# using sunpy's get_earth in place of Horizons.
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures")
+
+@pytest.fixture
+def store(monkeypatch) -> EphemerisStore:
+    monkeypatch.setattr(local, "_StorePath", lambda: FIXTURE_PATH)
+    local._stores.clear()
+    return local._GetStore("399")
+
+@pytest.fixture
+def horizons_calls(monkeypatch) -> list:
+    # Stand in for Horizons with sunpy's earth ephemeris
+    calls = []
+    def fake_query(body, dates):
+        calls.append(dates)
+        return get_earth(Time(dates))
+    monkeypatch.setattr(Horizons, "Query", fake_query)
+    return calls
+
+def _assert_earth_positions(positions: list[dict], dates: Time, tolerance: float):
+    expected = convert_skycoords_to_heeq_array(get_earth(dates))
+    for idx, position in enumerate(positions):
+        assert position['x'] == pytest.approx(expected[0, idx], abs=tolerance)
+        assert position['y'] == pytest.approx(expected[1, idx], abs=tolerance)
+        assert position['z'] == pytest.approx(expected[2, idx], abs=tolerance)
+
+def test_stored_dates_are_interpolated(store, horizons_calls):
+    dates = Time("2023-01-01") + np.random.default_rng(0).uniform(0, 59, 100) * u.day
+    positions = Local.Get("399", dates.to_datetime())
+    assert len(positions) == 100
+    # The stored bound is measured at held out samples, error between those
+    # samples may be slightly larger.
+    _assert_earth_positions(positions, dates, 2 * store.max_error)
+    assert len(horizons_calls) == 0
+
+def test_dates_outside_store_use_horizons(store, horizons_calls):
+    dates = Time(["2022-12-01 00:00:00", "2023-02-01 00:00:00", "2024-01-01 00:00:00"])
+    positions = Local.Get("399", dates.to_datetime())
+    _assert_earth_positions(positions, dates, 1e-6)
+    # Only the dates outside the store are sent to horizons
+    assert len(horizons_calls) == 1
+    assert len(horizons_calls[0]) == 2
+
+def test_dates_after_last_sample_use_horizons(store, horizons_calls):
+    # The last segment runs past the last sample at 2023-03-01 00:00, but
+    # isn't fit there.
+    dates = Time(["2023-03-01 00:00:00", "2023-03-01 00:01:00", "2023-03-01 23:00:00"])
+    positions = Local.Get("399", dates.to_datetime())
+    _assert_earth_positions(positions, dates, 1e-6)
+    assert len(horizons_calls) == 1
+    assert len(horizons_calls[0]) == 2
+
+def test_unknown_body_uses_horizons(store, horizons_calls):
+    dates = Time(["2023-02-01 00:00:00"])
+    Local.Get("not stored", dates.to_datetime())
+    assert len(horizons_calls) == 1
+
+def test_fit_save_load(tmp_path):
+    dates = Time("2023-01-01") + np.arange(0, 8, 1 / 24) * u.day
+    jd = dates.tt.jd
+    positions = np.stack([np.sin(jd), np.cos(jd), jd - jd[0]])
+    store = EphemerisStore.Fit(jd, positions, 4, 10)
+    store.Save(str(tmp_path), "test/body")
+    loaded = EphemerisStore.Load(str(tmp_path), "test/body")
+    assert np.array_equal(loaded.coefficients, store.coefficients)
+    assert loaded.Evaluate(jd) == pytest.approx(positions, abs=1e-6)
+    assert loaded.end == jd[-1]
+    assert not loaded.Contains(np.array([jd[-1] + 1 / 24]))[0]
@@ -1,10 +1,56 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+import json
+import zlib
 
 from pydantic import BaseModel
 
 from get_heeq import Coordinate
-from event_coord import get_event_coordinates, CoordinateSystem
+from event_coord import get_events_coordinates
 from hek import query_hek
+from database.events import QueryHekEvents, MissingHekWindows, StoreHekEvents
+from database.models import HekEvent
+from persistent_cache import PersistentCache
+import conf
+
+# Time ranges that aren't in the event store are split into buckets of this
+# size, and each bucket's events are cached separately. Overlapping requests
+# then share buckets instead of querying the HEK again.
+_BUCKET = timedelta(minutes=int(conf.get("events", "bucket_minutes", "60")))
+# Events in recent buckets may still change on the HEK, so those buckets
+# expire. Older buckets are kept until evicted.
+_RECENT = timedelta(hours=float(conf.get("events", "recent_hours", "48")))
+_RECENT_TTL = float(conf.get("events", "recent_ttl_seconds", "600"))
+# Layout is key = "<bucket minutes>/<bucket start>", value = compressed json list of HekEvents
+_cache = PersistentCache("hek", int(conf.get("cache", "hek_max_bytes", str(128 * 1024 * 1024))))
+_pool = ThreadPoolExecutor(max_workers=int(conf.get("events", "max_concurrent_queries", "4")), thread_name_prefix="hek")
+_EPOCH = datetime(1970, 1, 1)
+
+# vo_event fields returned by the compact profile of /event. These describe
+# what the event is and where and when it happened. The full HEK record has
+# hundreds of fields.
+COMPACT_FIELDS = [
+    "kb_archivid",
+    "event_type",
+    "concept",
+    "frm_name",
+    "event_starttime",
+    "event_peaktime",
+    "event_endtime",
+    "obs_observatory",
+    "obs_instrument",
+    "obs_channelid",
+    "event_coordsys",
+    "event_coord1",
+    "event_coord2",
+    "event_coord3",
+    "event_coordunit",
+    "hgs_x",
+    "hgs_y",
+    "ar_noaanum",
+    "fl_goescls",
+]
 
 class EventPosition(BaseModel):
     lat: float
@@ -19,33 +65,158 @@ class Event(BaseModel):
     vo_event: dict
     coordinates: EventCoordinateDetails
 
-def lookup_hek_events(start_time: datetime, end_time: datetime) -> list[Event]:
+def lookup_hek_events(start_time: datetime, end_time: datetime, types: list[str] = None, fields: list[str] = None) -> list[Event]:
     """
     Looks up HEK events that occur within the given time range
 
-    TODO: This should use the Helioviewer Event Interface since it will be faster.
+    Events are read from the local event store. Parts of the time range that
+    haven't been ingested yet are read from cached time buckets, and the HEK
+    is only queried for buckets that aren't cached.
 
     :param start_time: Beginning of time range to query
-    :type start_time: str
+    :type start_time: datetime
     :param end_time: End of time range to query
-    :type end_time: str
+    :type end_time: datetime
+    :param types: HEK event types to return, defaults to all types
+    :type types: list[str]
+    :param fields: vo_event fields to return, defaults to all fields
+    :type fields: list[str]
     :return: List of events
     """
-    # Query all events
-    events = query_hek(start_time, end_time)
+    events = sorted(iter_hek_events(start_time, end_time, types), key=lambda event: event.start)
     # List that is going to be returned
     results = {"results": []}
-    # For each event, transform them into usable coordinates
     for event in events:
-        system = CoordinateSystem.from_str(event["event_coordsys"])
-        coordinates = get_event_coordinates(system, event["event_coord1"], event["event_coord2"], event["event_coord3"], event["event_starttime"].to_datetime(), event["obs_instrument"], event["event_coordunit"])
-        # Convert Coordinate object to json to prepare it to be sent back to the client
+        results["results"].append(Event(vo_event=project_vo_event(event.vo_event, fields), coordinates=event.coordinates))
+    return results
+
+def _naive_utc(date: datetime) -> datetime:
+    """
+    Stored event times are UTC without a timezone. Dates with a timezone,
+    like the Z suffixed dates the app sends, are converted to match.
+    """
+    if date.tzinfo is None:
+        return date
+    return date.astimezone(timezone.utc).replace(tzinfo=None)
+
+def project_vo_event(vo_event: dict, fields: list[str] = None) -> dict:
+    """
+    Returns only the given fields of an event's vo_event. Fields the event
+    doesn't have are left out. If fields is None, the vo_event is returned as is.
+    """
+    if fields is None:
+        return vo_event
+    return {field: vo_event[field] for field in fields if field in vo_event}
+
+def iter_hek_events(start_time: datetime, end_time: datetime, types: list[str] = None) -> Iterator[HekEvent]:
+    """
+    Yields the same events as lookup_hek_events as soon as each one is
+    available. Stored events come first in start order, followed by the events
+    of each bucket as its query finishes, so the events aren't sorted overall.
+
+    See lookup_hek_events for parameter details.
+    """
+    start_time, end_time = _naive_utc(start_time), _naive_utc(end_time)
+    seen = set()
+    for event in QueryHekEvents(start_time, end_time, types):
+        seen.add(event.kb_archivid)
+        yield event
+    for start, end in MissingHekWindows(start_time, end_time):
+        for event in _iter_buckets(start, end):
+            # Buckets extend past the requested range
+            overlaps = event.start <= end_time and event.end >= start_time
+            if overlaps and (types is None or event.event_type in types) and event.kb_archivid not in seen:
+                seen.add(event.kb_archivid)
+                yield event
+
+def _buckets(start: datetime, end: datetime) -> list[datetime]:
+    """
+    Returns the start of each bucket that overlaps the given time range
+    """
+    bucket = _EPOCH + ((start - _EPOCH) // _BUCKET) * _BUCKET
+    buckets = [bucket]
+    while buckets[-1] + _BUCKET < end:
+        buckets.append(buckets[-1] + _BUCKET)
+    return buckets
+
+def _pack(events: list[HekEvent]) -> bytes:
+    return zlib.compress(json.dumps([event.as_dict() for event in events]).encode())
+
+def _unpack(data: bytes) -> list[HekEvent]:
+    events = json.loads(zlib.decompress(data))
+    for event in events:
+        event["start"] = datetime.fromisoformat(event["start"])
+        event["end"] = datetime.fromisoformat(event["end"])
+    return [HekEvent.from_dict(event) for event in events]
+
+def _iter_buckets(start: datetime, end: datetime) -> Iterator[HekEvent]:
+    """
+    Yields the events in every bucket overlapping the given time range.
+    Cached buckets come first, then buckets that aren't cached are queried
+    from the HEK concurrently and yielded as each query finishes.
+    """
+    buckets = _buckets(start, end)
+    keys = [f"{int(_BUCKET.total_seconds() // 60)}/{bucket.isoformat()}" for bucket in buckets]
+    cached = _cache.GetMany(keys)
+    futures = [_pool.submit(_fetch_bucket, bucket, key) for bucket, key in zip(buckets, keys) if key not in cached]
+    for key in keys:
+        if key in cached:
+            yield from _unpack(cached.pop(key))
+    for future in as_completed(futures):
+        yield from _unpack(future.result())
+
+def _fetch_bucket(bucket: datetime, key: str) -> bytes:
+    """
+    Queries the HEK for a bucket's events and caches them
+    """
+    def fetch() -> bytes:
+        data = _pack(convert_hek_events(query_hek(bucket, bucket + _BUCKET)))
+        recent = bucket + _BUCKET > datetime.utcnow() - _RECENT
+        _cache.Put(key, data, ttl=_RECENT_TTL if recent else None)
+        return data
+    # Concurrent requests for the same bucket share one HEK query
+    return _cache.Coalesce(key, fetch, lambda: _cache.GetMany([key], record=False).get(key))
+
+def convert_hek_events(events) -> list[HekEvent]:
+    """
+    Computes the coordinates of events returned by the HEK
+
+    :param events: Events returned by query_hek
+    :return: The events as HekEvents, without duplicates
+    """
+    # Transform all events into usable coordinates at once, events with the
+    # same coordinate system and observer are converted together.
+    all_coordinates = get_events_coordinates([(event["event_coordsys"], event["event_coord1"], event["event_coord2"], event["event_coord3"], event["event_starttime"].to_datetime(), event["obs_instrument"], event["event_coordunit"]) for event in events])
+    # Layout is kb_archivid: HekEvent
+    results = {}
+    for event, coordinates in zip(events, all_coordinates):
         # Convert the event data into a serializable dictionary
         event_dict = {k:str(v) for (k,v) in zip(event.keys(), event.values())}
         # Python needs a way for us to make a class serializable.
         # How is this not a language feature?
         coordinates['observer'] = coordinates['observer'].model_dump()
-        vo_event = Event(vo_event=event_dict, coordinates=coordinates)
-        results["results"].append(vo_event)
-    return results
+        results[event_dict["kb_archivid"]] = HekEvent(
+            kb_archivid=event_dict["kb_archivid"],
+            event_type=event_dict["event_type"],
+            start=event["event_starttime"].to_datetime(),
+            end=event["event_endtime"].to_datetime(),
+            vo_event=event_dict,
+            coordinates=EventCoordinateDetails(**coordinates).model_dump()
+        )
+    return list(results.values())
+
+def ingest_hek_events(start_time: datetime, end_time: datetime) -> int:
+    """
+    Queries the HEK for events within the given time range and saves them
+    with their coordinates to the local event store.
 
+    :param start_time: Beginning of time range to ingest
+    :type start_time: datetime
+    :param end_time: End of time range to ingest
+    :type end_time: datetime
+    :return: Number of events stored
+    """
+    start_time, end_time = _naive_utc(start_time), _naive_utc(end_time)
+    events = convert_hek_events(query_hek(start_time, end_time))
+    StoreHekEvents(start_time, end_time, events)
+    return len(events)
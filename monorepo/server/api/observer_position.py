@@ -1,6 +1,22 @@
-from get_heeq import convert_skycoords_to_heeq
-from coordinate_lookup import get_observer_coordinate_by_id
+import struct
 
+from get_heeq import Coordinate, convert_skycoords_to_heeq
+from coordinate_lookup import get_observer_coordinates_by_id
+from helios_exceptions import HeliosException
+from persistent_cache import PersistentCache
+import conf
+
+# An image's header never changes, so positions are cached by image id forever
+# and shared by all workers.
+# Layout is key = "<id>", value = packed x, y, z
+_CACHE = PersistentCache("jp2_observer", int(conf.get("cache", "jp2_observer_max_bytes", str(16 * 1024 * 1024))))
+
+def _pack(coordinate: Coordinate) -> bytes:
+    return struct.pack("<3d", coordinate.x, coordinate.y, coordinate.z)
+
+def _unpack(data: bytes) -> Coordinate:
+    x, y, z = struct.unpack("<3d", data)
+    return Coordinate(x=x, y=y, z=z)
 
 def get_observer_position(id):
     """
@@ -8,7 +24,32 @@ def get_observer_position(id):
     :param id: ID of the image to get observer coordinates for
     :type id: str, int
     """
-    observer = get_observer_coordinate_by_id(id)
-    result = convert_skycoords_to_heeq(observer)
-    return result
+    positions, errors = get_observer_positions([id])
+    if len(errors) > 0:
+        raise errors[int(id)]
+    return positions[int(id)]
 
+def get_observer_positions(ids) -> tuple[dict[int, Coordinate], dict[int, HeliosException]]:
+    """
+    Looks up the observer coordinates for many images. Only images that
+    haven't been looked up before are queried, and those are queried concurrently.
+    :param ids: IDs of the images to get observer coordinates for
+    :type ids: list[str, int]
+    :return: Coordinates of the images that were found, and the errors for the ones that weren't, both keyed by id
+    """
+    ids = list(dict.fromkeys(int(id) for id in ids))
+    cached = _CACHE.GetMany([str(id) for id in ids])
+    positions = {id: _unpack(cached[str(id)]) for id in ids if str(id) in cached}
+    errors = {}
+    missing = [id for id in ids if id not in positions]
+    if len(missing) > 0:
+        found = {}
+        for id, observer in zip(missing, get_observer_coordinates_by_id(missing)):
+            if isinstance(observer, HeliosException):
+                errors[id] = observer
+            else:
+                positions[id] = convert_skycoords_to_heeq(observer)
+                found[str(id)] = _pack(positions[id])
+        if len(found) > 0:
+            _CACHE.PutMany(found)
+    return {id: positions[id] for id in ids if id in positions}, errors
@@ -0,0 +1,81 @@
+"""
+Compares the JSON and packed binary response formats of the /earth/range
+endpoint by response size and server time.
+
+The encode column times only serializing the positions, the request column
+times the whole request including computing the positions.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import gzip
+import json
+import time
+
+import numpy as np
+from astropy.time import Time
+
+from main import app
+from api.ephemeris import RangeResponse
+from routes.common.coordinates import PackCoordinates, DTYPES
+
+PROGRAM_DESCRIPTION = "Benchmark JSON vs binary coordinate responses"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['-n', '--sizes'], {'type': int, 'nargs': '+', 'default': [10, 1440, 43200], 'help': 'Number of positions to request at a 1 minute cadence'}),
+    (['-r', '--repeat'], {'type': int, 'default': 3, 'help': 'Number of requests to average over for each format'}),
+]
+
+FORMATS = ["json", "float32", "float64"]
+
+def time_request(client, url: str, repeat: int) -> tuple[float, int]:
+    """
+    Returns the average time to serve the given url and the size of its response body
+    """
+    # Warm up
+    response = client.get(url)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url)
+    elapsed = (time.perf_counter() - start) / repeat
+    assert response.status_code == 200, response.data
+    return elapsed, len(response.data)
+
+def time_encode(xyz: np.ndarray, format: str, repeat: int) -> float:
+    """
+    Returns the average time to serialize the given positions in the given format
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if format == "json":
+            json.dumps(RangeResponse(Time("2023-01-01"), 60, xyz))
+        else:
+            gzip.compress(PackCoordinates(xyz, DTYPES[format]), compresslevel=1)
+    return (time.perf_counter() - start) / repeat
+
+def main(sizes: list[int], repeat: int):
+    client = app.test_client()
+    print(f"{'positions':>10} {'format':>8} {'bytes':>12} {'encode (s)':>11} {'request (s)':>12}")
+    for size in sizes:
+        start = datetime(2023, 1, 1)
+        end = start + timedelta(minutes=size - 1)
+        url = f"/earth/range?start={start.isoformat()}&end={end.isoformat()}&cadence=60"
+        xyz = np.random.default_rng(0).uniform(-250, 250, (3, size))
+        for format in FORMATS:
+            encode = time_encode(xyz, format, repeat)
+            elapsed, size_bytes = time_request(client, f"{url}&format={format}", repeat)
+            print(f"{size:>10} {format:>8} {size_bytes:>12} {encode:>11.4f} {elapsed:>12.4f}")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
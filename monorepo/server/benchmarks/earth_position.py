@@ -0,0 +1,64 @@
+"""
+Compares computing the earth's Helios frame position with
+`sunpy.coordinates.get_earth` against the interpolated earth table in
+`helios_frame`.
+"""
+from argparse import ArgumentParser
+import time
+
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+from sunpy.coordinates import get_earth
+
+from get_heeq import convert_skycoords_to_heeq_array
+from helios_frame import earth_position
+
+PROGRAM_DESCRIPTION = "Benchmark get_earth vs the interpolated earth table"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['-n', '--sizes'], {'type': int, 'nargs': '+', 'default': [1, 1000, 100000], 'help': 'Number of dates to compute positions for'}),
+    (['--max-sunpy'], {'type': int, 'default': 10000, 'help': 'Maximum number of dates to compute with get_earth. Larger sizes are extrapolated.'}),
+]
+
+def time_sunpy(dates: Time, max_sunpy: int) -> tuple[float, bool]:
+    """
+    Times get_earth and converting the result to the Helios frame.
+    Returns the total time and whether or not it was extrapolated.
+    """
+    sample = dates[:max_sunpy]
+    start = time.perf_counter()
+    convert_skycoords_to_heeq_array(get_earth(sample))
+    elapsed = time.perf_counter() - start
+    return elapsed * len(dates) / len(sample), len(sample) < len(dates)
+
+def time_table(dates: Time) -> float:
+    start = time.perf_counter()
+    earth_position(dates)
+    return time.perf_counter() - start
+
+def main(sizes: list[int], max_sunpy: int):
+    # Fill the table for the benchmarked span before timing
+    earth_position(Time("2023-01-01") + np.arange(2) * 70 * u.day)
+    print(f"{'dates':>8} {'get_earth (s)':>14} {'table (s)':>10} {'dates/s':>12} {'speedup':>10}")
+    for size in sizes:
+        dates = Time("2023-01-01") + np.linspace(0, 70, size) * u.day
+        sunpy_time, extrapolated = time_sunpy(dates, max_sunpy)
+        table_time = time_table(dates)
+        note = " (get_earth extrapolated)" if extrapolated else ""
+        print(f"{size:>8} {sunpy_time:>14.4f} {table_time:>10.5f} {size / table_time:>12.0f} {sunpy_time / table_time:>9.1f}x{note}")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
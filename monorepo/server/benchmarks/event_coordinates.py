@@ -0,0 +1,132 @@
+"""
+Compares converting HEK events one at a time with get_event_coordinates
+against converting them in groups with get_events_coordinates.
+
+The benchmark runs over HEK events recorded in `--fixture`, along with the
+observer position of each event so the conversion can be timed without
+network access. Record the fixture with `--record`, which queries the HEK
+for the events between `--start` and `--end`.
+"""
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import HeliographicStonyhurst
+
+from coordinate_lookup import get_observer_coordinates
+from event_coord import get_event_coordinates, get_events_coordinates, clean_observatory, CoordinateSystem, OBSERVER_SYSTEMS
+from hek import query_hek
+
+PROGRAM_DESCRIPTION = "Benchmark per-event vs grouped event coordinate conversion"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['--fixture'], {'type': str, 'default': os.path.join(os.path.dirname(__file__), "hek_events.json"), 'help': 'File of recorded HEK events'}),
+    (['--record'], {'action': 'store_true', 'help': 'Query the HEK and save its events to the fixture before benchmarking'}),
+    (['--start'], {'type': datetime.fromisoformat, 'default': datetime(2023, 1, 1), 'help': 'Start of the time range to record'}),
+    (['--end'], {'type': datetime.fromisoformat, 'default': datetime(2023, 1, 2), 'help': 'End of the time range to record'}),
+    (['-r', '--repeat'], {'type': int, 'default': 1, 'help': 'Number of times to convert the events'}),
+]
+
+EVENT_FIELDS = ["event_coordsys", "event_coord1", "event_coord2", "event_coord3", "obs_instrument", "event_coordunit"]
+
+def _value(value):
+    # Masked HEK values are saved as null
+    if np.ma.is_masked(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+def record_fixture(fixture: str, start: datetime, end: datetime):
+    """
+    Saves the HEK events between start and end with their observer positions.
+    """
+    events = []
+    for event in query_hek(start, end):
+        record = {field: _value(event[field]) for field in EVENT_FIELDS}
+        record["event_starttime"] = event["event_starttime"].isot
+        events.append(record)
+    needs_observer = [event for event in events if CoordinateSystem(event["event_coordsys"]) in OBSERVER_SYSTEMS]
+    observers = get_observer_coordinates([(clean_observatory(event["obs_instrument"]), datetime.fromisoformat(event["event_starttime"]))
+                                          for event in needs_observer])
+    for event, observer in zip(needs_observer, observers):
+        coordinate = observer["coordinate"]
+        event["observer"] = {
+            "lon": coordinate.lon.to_value(u.deg),
+            "lat": coordinate.lat.to_value(u.deg),
+            "radius": coordinate.radius.to_value(u.m),
+            "obstime": coordinate.obstime.isot,
+            "rsun": coordinate.rsun.to_value(u.m),
+            "notes": observer["notes"]
+        }
+    with open(fixture, "w") as fp:
+        json.dump(events, fp)
+
+def load_fixture(fixture: str) -> tuple[list, list]:
+    """
+    Returns the recorded events as get_events_coordinates arguments, and their observers
+    """
+    with open(fixture) as fp:
+        records = json.load(fp)
+    events, observers = [], []
+    # Events with the same observer share one coordinate, as they do in coordinate_lookup
+    coordinates = {}
+    for record in records:
+        events.append((record["event_coordsys"], record["event_coord1"], record["event_coord2"], record["event_coord3"],
+                       datetime.fromisoformat(record["event_starttime"]), record["obs_instrument"], record["event_coordunit"]))
+        observer = record.get("observer")
+        if observer is None:
+            observers.append(None)
+            continue
+        key = (observer["lon"], observer["lat"], observer["radius"], observer["obstime"])
+        if key not in coordinates:
+            coordinates[key] = SkyCoord(HeliographicStonyhurst(observer["lon"] * u.deg, observer["lat"] * u.deg, observer["radius"] * u.m,
+                                                               obstime=observer["obstime"], rsun=observer["rsun"] * u.m))
+        observers.append({"coordinate": coordinates[key], "notes": observer["notes"]})
+    return events, observers
+
+def main(fixture: str, record: bool, start: datetime, end: datetime, repeat: int):
+    if record:
+        record_fixture(fixture, start, end)
+    if not os.path.exists(fixture):
+        print(f"No events found at {fixture}, record some with --record")
+        return
+    warnings.simplefilter("ignore")
+    events, observers = load_fixture(fixture)
+    systems = Counter(CoordinateSystem(event[0]).name for event in events)
+    print(f"{len(events)} events: " + ", ".join(f"{count} {system}" for system, count in systems.items()))
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        single = [get_event_coordinates(*event, observer=observer) for event, observer in zip(events, observers)]
+    single_time = (time.perf_counter() - start_time) / repeat
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        grouped = get_events_coordinates(events, observers)
+    grouped_time = (time.perf_counter() - start_time) / repeat
+
+    difference = max((max(abs(a["event"]["lat"] - b["event"]["lat"]), abs(a["event"]["lon"] - b["event"]["lon"]))
+                      for a, b in zip(single, grouped)), default=0)
+    print(f"{'per event (s)':>14} {'grouped (s)':>12} {'speedup':>8} {'difference (deg)':>17}")
+    print(f"{single_time:>14.3f} {grouped_time:>12.3f} {single_time / grouped_time:>7.1f}x {difference:>17.3e}")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
@@ -0,0 +1,77 @@
+"""
+Measures the size and serialization time of /event responses for each
+vo_event field profile.
+
+The benchmark runs over a recorded /event response with every HEK field, saved
+in `--fixture`. Record it with `--record`, which looks up the events on
+`--date`. Pick a busy day, the default is during the May 2024 solar storms.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+import time
+
+from api.events import lookup_hek_events, project_vo_event, Event, COMPACT_FIELDS
+from routes.events import EventResponse
+
+PROGRAM_DESCRIPTION = "Benchmark /event payloads for each vo_event field profile"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['--fixture'], {'type': str, 'default': os.path.join(os.path.dirname(__file__), "hek_busy_day.json"), 'help': 'File with a recorded full /event response'}),
+    (['--record'], {'action': 'store_true', 'help': 'Look up the events on --date and save them to the fixture before benchmarking'}),
+    (['--date'], {'type': datetime.fromisoformat, 'default': datetime(2024, 5, 10), 'help': 'Day to record events for'}),
+    (['-r', '--repeat'], {'type': int, 'default': 5, 'help': 'Number of times to serialize each response'}),
+]
+
+PROFILES = {
+    "full": None,
+    "compact": COMPACT_FIELDS,
+    "type and time": ["event_type", "event_starttime", "event_endtime"],
+}
+
+def record_fixture(fixture: str, date: datetime):
+    events = lookup_hek_events(date, date + timedelta(days=1))
+    with open(fixture, "w") as fp:
+        json.dump([event.model_dump() for event in events["results"]], fp)
+
+def serialize(events: list[dict], fields: list[str]) -> str:
+    """
+    Serializes events the same way /event does
+    """
+    results = [Event(vo_event=project_vo_event(event["vo_event"], fields), coordinates=event["coordinates"]) for event in events]
+    return json.dumps(EventResponse(results=results).model_dump())
+
+def main(fixture: str, record: bool, date: datetime, repeat: int):
+    if record:
+        record_fixture(fixture, date)
+    if not os.path.exists(fixture):
+        print(f"No events found at {fixture}, record some with --record")
+        return
+    with open(fixture) as fp:
+        events = json.load(fp)
+    fields = sum(len(event["vo_event"]) for event in events) / max(len(events), 1)
+    print(f"{len(events)} events with {fields:.0f} vo_event fields on average")
+    print(f"{'profile':>14} {'bytes':>12} {'gzip bytes':>12} {'serialize (s)':>14}")
+    for name, fields in PROFILES.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = serialize(events, fields)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{name:>14} {len(body.encode()):>12} {len(gzip.compress(body.encode())):>12} {elapsed:>14.4f}")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
@@ -0,0 +1,109 @@
+"""
+Compares looking up the nearest PFSS file for each date with one QueryGong
+per date on a thread pool, the way /pfss/gong/ used to, against resolving
+all dates at once with QueryGongNearest, and against the in memory
+GongCatalog that /pfss/gong/ uses now.
+
+The benchmark runs against the database in config.ini. Point
+`connection_string` at SQLite or MariaDB to compare them. It stores `--rows`
+fake PFSS rows with a level of detail that real data doesn't use, and
+deletes them when it's done. Pass `--explain` to print the database's plan
+for QueryGongNearest, each date should be two seeks on the pfss_lod_date
+index.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import random
+import time
+
+from sqlalchemy import delete, insert, text
+from sqlalchemy.orm import Session
+
+from database._db import engine
+from database.models import GongPFSS
+from database.query import QueryGong, QueryGongNearest, _NearestStatement
+from database.gong_catalog import GongCatalog
+
+PROGRAM_DESCRIPTION = "Benchmark per-date, batched, and in memory nearest PFSS lookups"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['--rows'], {'type': int, 'default': 20000, 'help': 'Number of hourly PFSS rows to store'}),
+    (['--dates'], {'type': int, 'nargs': '+', 'default': [1, 10, 50, 200, 1000], 'help': 'Numbers of dates to look up'}),
+    (['--explain'], {'action': 'store_true', 'help': "Print the database's query plan for QueryGongNearest"}),
+    (['-r', '--repeat'], {'type': int, 'default': 5, 'help': 'Number of times to run each lookup'}),
+]
+
+# Not used by real PFSS data
+LOD = -2
+START = datetime(2015, 1, 1)
+
+def store_rows(rows: int):
+    # Inserted in batches to bound memory use on large tables
+    for first in range(0, rows, 100000):
+        with Session(engine) as session, session.begin():
+            session.execute(insert(GongPFSS), [
+                {"date": START + timedelta(hours=i), "path": f"benchmark/pfss_{i}.bin", "lod": LOD} for i in range(first, min(first + 100000, rows))
+            ])
+
+def print_plan():
+    keyword = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        for row in connection.execute(text(f"{keyword} {_NearestStatement(1)}"), {"date0": START, "lod": LOD}):
+            print(*row)
+
+def delete_rows():
+    with Session(engine) as session, session.begin():
+        session.execute(delete(GongPFSS).where(GongPFSS.lod == LOD))
+
+def per_date(dates: list[datetime]) -> list:
+    with ThreadPoolExecutor() as executor:
+        return list(executor.map(lambda date: QueryGong(date, LOD), dates))
+
+def batched(dates: list[datetime]) -> list:
+    return QueryGongNearest(dates, LOD)
+
+def timed(fn, dates: list[datetime], repeat: int) -> tuple[float, list]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(dates)
+    return (time.perf_counter() - start) / repeat, result
+
+def main(rows: int, dates: list[int], explain: bool, repeat: int):
+    engine.echo = False
+    print(f"{engine.dialect.name} with {rows} rows")
+    store_rows(rows)
+    try:
+        if explain:
+            print_plan()
+        catalog = GongCatalog()
+        start = time.perf_counter()
+        catalog.Nearest([START], LOD)
+        print(f"Loaded catalog in {time.perf_counter() - start:.4f}s")
+        print(f"{'dates':>6} {'per date (s)':>13} {'batched (s)':>12} {'catalog (s)':>12} {'catalog per date (us)':>22}")
+        for count in dates:
+            # Animation frames are evenly spaced through a random time range
+            first = START + timedelta(hours=random.uniform(0, rows - count * 6))
+            requested = [first + timedelta(hours=6 * i + random.random()) for i in range(count)]
+            per_date_time, expected = timed(per_date, requested, repeat)
+            batched_time, result = timed(batched, requested, repeat)
+            catalog_time, catalog_result = timed(lambda dates: catalog.Nearest(dates, LOD), requested, repeat)
+            assert [row.id for row in expected] == [row.id for row in result] == [row.id for row in catalog_result]
+            print(f"{count:>6} {per_date_time:>13.4f} {batched_time:>12.4f} {catalog_time:>12.6f} {catalog_time / count * 1e6:>22.2f}")
+    finally:
+        delete_rows()
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
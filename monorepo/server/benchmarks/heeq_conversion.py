@@ -0,0 +1,69 @@
+"""
+Compares converting coordinates to the Helios frame one by one against the
+vectorized batch conversions through astropy and through `helios_frame`.
+"""
+from argparse import ArgumentParser
+import time
+
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+from sunpy.coordinates import get_earth
+
+from get_heeq import convert_skycoords_to_heeq_array
+
+PROGRAM_DESCRIPTION = "Benchmark per-coordinate vs batch conversion to the Helios frame"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['-n', '--sizes'], {'type': int, 'nargs': '+', 'default': [10, 1000, 100000], 'help': 'Number of dates to convert'}),
+    (['--max-scalar'], {'type': int, 'default': 1000, 'help': 'Maximum number of coordinates to convert one by one. Larger sizes are extrapolated.'}),
+]
+
+def make_coordinates(count: int):
+    """
+    Returns `count` earth positions at a 1 minute cadence
+    """
+    dates = Time("2023-01-01 00:00:00") + np.arange(count) * u.min
+    return get_earth(dates)
+
+def time_scalar(coords, max_scalar: int) -> tuple[float, bool]:
+    """
+    Times converting coordinates one at a time through astropy.
+    Returns the total time and whether or not it was extrapolated.
+    """
+    sample = coords[:max_scalar]
+    start = time.perf_counter()
+    for coord in sample:
+        convert_skycoords_to_heeq_array(coord, use_astropy=True)
+    elapsed = time.perf_counter() - start
+    return elapsed * len(coords) / len(sample), len(sample) < len(coords)
+
+def time_batch(coords, use_astropy: bool) -> float:
+    start = time.perf_counter()
+    convert_skycoords_to_heeq_array(coords, use_astropy=use_astropy)
+    return time.perf_counter() - start
+
+def main(sizes: list[int], max_scalar: int):
+    print(f"{'dates':>8} {'scalar (s)':>12} {'astropy (s)':>12} {'matrix (s)':>12} {'speedup':>10}")
+    for size in sizes:
+        coords = make_coordinates(size)
+        scalar, extrapolated = time_scalar(coords, max_scalar)
+        astropy_batch = time_batch(coords, True)
+        matrix_batch = time_batch(coords, False)
+        note = " (scalar extrapolated)" if extrapolated else ""
+        print(f"{size:>8} {scalar:>12.4f} {astropy_batch:>12.4f} {matrix_batch:>12.4f} {scalar / matrix_batch:>9.1f}x{note}")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
@@ -0,0 +1,94 @@
+"""
+Compares reading the observer position from jp2 headers through a sunpy Map
+against reading the observer keywords directly.
+
+The benchmark runs over a corpus of jp2 XML headers saved in `--corpus`.
+Record the corpus from helioviewer with `--record`, which saves the header of
+the image closest to `--date` for every source in `sources.py`.
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+import glob
+import os
+import time
+import warnings
+
+import hvpy
+import numpy as np
+
+from coordinate_lookup import get_observer_coordinate_from_header, _observer_from_map, _observer_from_keywords, _read_observer_keywords
+from get_heeq import convert_skycoords_to_heeq_array
+from sources import sources
+
+PROGRAM_DESCRIPTION = "Benchmark header-only observer extraction vs sunpy Maps"
+
+# Arguments to pass to parser.add_argument
+PROGRAM_ARGS = [
+    (['--corpus'], {'type': str, 'default': os.path.join(os.path.dirname(__file__), "headers"), 'help': 'Folder of recorded jp2 XML headers'}),
+    (['--record'], {'action': 'store_true', 'help': 'Download headers for every source into the corpus before benchmarking'}),
+    (['--date'], {'type': datetime.fromisoformat, 'default': datetime(2023, 1, 1), 'help': 'Date of the images to record'}),
+    (['-r', '--repeat'], {'type': int, 'default': 20, 'help': 'Number of times to read each header'}),
+]
+
+def record_corpus(corpus: str, date: datetime):
+    """
+    Saves the header of the image closest to date for each source.
+    """
+    os.makedirs(corpus, exist_ok=True)
+    for name, source_id in sources.items():
+        try:
+            image = hvpy.getClosestImage(date=date, sourceId=source_id)
+            header = hvpy.getJP2Header(id=image["id"])
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        if "error" in header and "errno" in header:
+            print(f"Skipping {name}: no image")
+            continue
+        with open(os.path.join(corpus, f"{name}.xml"), "w") as fp:
+            fp.write(header)
+
+def time_reader(reader, header: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        reader(header)
+    return (time.perf_counter() - start) / repeat
+
+def main(corpus: str, record: bool, date: datetime, repeat: int):
+    if record:
+        record_corpus(corpus, date)
+    files = sorted(glob.glob(os.path.join(corpus, "*.xml")))
+    if len(files) == 0:
+        print(f"No headers found in {corpus}, record some with --record")
+        return
+    # Map emits metadata warnings for many helioviewer headers
+    warnings.simplefilter("ignore")
+    print(f"{'header':>32} {'path':>8} {'map (ms)':>10} {'direct (ms)':>12} {'speedup':>8} {'difference (solRad)':>20}")
+    total_map = total_direct = 0
+    for file in files:
+        with open(file) as fp:
+            header = fp.read()
+        direct_path = _observer_from_keywords(_read_observer_keywords(header)) is not None
+        map_time = time_reader(_observer_from_map, header, repeat)
+        direct_time = time_reader(get_observer_coordinate_from_header, header, repeat)
+        difference = np.max(np.abs(convert_skycoords_to_heeq_array(_observer_from_map(header))
+                                   - convert_skycoords_to_heeq_array(get_observer_coordinate_from_header(header))))
+        total_map += map_time
+        total_direct += direct_time
+        name = os.path.splitext(os.path.basename(file))[0]
+        print(f"{name:>32} {'direct' if direct_path else 'map':>8} {map_time * 1000:>10.3f} {direct_time * 1000:>12.3f} {map_time / direct_time:>7.1f}x {difference:>20.3e}")
+    print(f"{'total':>32} {'':>8} {total_map * 1000:>10.3f} {total_direct * 1000:>12.3f} {total_map / total_direct:>7.1f}x")
+
+#######################
+# Template code below #
+#######################
+# Reference: https://docs.python.org/3/library/argparse.html
+def parse_args():
+    parser = ArgumentParser(description=PROGRAM_DESCRIPTION)
+    for args in PROGRAM_ARGS:
+        parser.add_argument(*args[0], **args[1])
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**vars(args))
@@ -39,7 +39,7 @@ def _replace_env_vars(text: str) -> str:
         text = text.replace(text_var, os.environ[env_var])
     return text
 
-def get(section: str, key: str) -> str:
+def get(section: str, key: str, default: str = None) -> str:
     """
     Returns a value from the config.ini file
 
@@ -49,5 +49,10 @@ def get(section: str, key: str) -> str:
         Section of the ini file to read from.
     key: `str`
         Configuration key to get the value of.
+    default: `str`
+        Value to return if the key is not in the config file.
+        If not given, a missing key raises a KeyError.
     """
+    if default is not None and not _parser.has_option(section, key):
+        return default
     return _replace_env_vars(_parser[section][key])
\ No newline at end of file
@@ -2,17 +2,30 @@
 # Without passing this to argparse, it will print PROGRAM_DESCRIPTION to stdout all on one line even if it has newline characters.
 from argparse import RawTextHelpFormatter
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import hvpy
+from hvpy.core import parse_response
+from hvpy.parameters import getClosestImageInputParameters, getJP2HeaderInputParameters
 from sources import find_sourceid
 from jp2parser import JP2parser
 from tempfile import mkstemp
-from sunpy.map import Map
+from sunpy.map import Map, GenericMap
+from sunpy.util import MetaDict
 from sunpy.util.xml import xml_to_dict
 from helios_exceptions import HeliosException
+from persistent_cache import PersistentCache
+from observer_trajectory import ObserverTrajectory
+import conf
+import json
 import os
 import numpy as np
 import logging
+import requests
+import xml.etree.ElementTree as ET
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import HeliographicStonyhurst, HeliographicCarrington
+from sunpy.time import parse_time
 
 # This is passed to ArgumentParser's "description."
 # It is the information printed before the accepted arguments when you run the script with "-h/--help"
@@ -26,10 +39,59 @@ PROGRAM_ARGS = [
     (['date'], {'type': datetime.fromisoformat, 'help': "The UTC time to use for the lookup"}),
 ]
 
+# Header keywords used to find the observer position without building a sunpy
+# Map. Keys are lower case.
+# GenericMap members that determine its observer coordinate
+_OBSERVER_MEMBERS = ["observer_coordinate", "_supported_observer_coordinates", "_default_observer_coordinate",
+                     "date", "_date_obs", "_get_date", "_timesys", "rsun_meters", "_rsun_meters", "rsun_obs", "_rsun_obs_no_default"]
+
+def _sources_with_own_observer():
+    """
+    Returns the is_datasource_for function of each sunpy map source that
+    overrides how GenericMap finds the observer, i.e. AIA, EIT, and EUI.
+    """
+    return [is_source for source, is_source in Map.registry.items()
+            if any(getattr(source, member) is not getattr(GenericMap, member) for member in _OBSERVER_MEMBERS)]
+
+_SOURCES_WITH_OWN_OBSERVER = _sources_with_own_observer()
+
 # Stores a cache of information to reduce the number of queries.
-# TODO: Make cache persistent
-# Layout is key = "<source_id>_date"
-_CACHE = {}
+# Shared by all workers and kept across restarts.
+# Layout is key = "<source_id>_date", value = json from _pack_observer
+_CACHE = PersistentCache("observer", int(conf.get("cache", "observer_max_bytes", str(16 * 1024 * 1024))))
+
+# Known observer positions for each source, positions within this many seconds
+# of a requested date are interpolated instead of looking up another image.
+# Layout is source_id: ObserverTrajectory
+_MAX_GAP = float(conf.get("observer", "max_gap_minutes", "30")) * 60
+_TRAJECTORIES = {}
+
+def _get_trajectory(source_id):
+    trajectory = _TRAJECTORIES.get(source_id)
+    if trajectory is None:
+        trajectory = _TRAJECTORIES.setdefault(source_id, ObserverTrajectory(_MAX_GAP))
+    return trajectory
+
+# Bulk lookups resolve this many observers at once. The session keeps
+# connections to helioviewer open between requests.
+_MAX_CONCURRENT_LOOKUPS = int(conf.get("observer", "max_concurrent_lookups", "8"))
+_POOL = ThreadPoolExecutor(max_workers=_MAX_CONCURRENT_LOOKUPS, thread_name_prefix="observer")
+_SESSION = requests.Session()
+_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=_MAX_CONCURRENT_LOOKUPS))
+
+def _helioviewer_call(params):
+    """
+    Executes a helioviewer API call with hvpy's parameters over the shared session
+    """
+    response = _SESSION.get(params.url, params=params.model_dump(), timeout=60)
+    response.raise_for_status()
+    return parse_response(response, params.get_output_type())
+
+def _get_closest_image(date, source_id):
+    return _helioviewer_call(getClosestImageInputParameters(date=date, sourceId=source_id))
+
+def _get_jp2_header(id):
+    return _helioviewer_call(getJP2HeaderInputParameters(id=id))
 
 def observatory2source_id(observatory):
     """
@@ -47,10 +109,86 @@ def observatory2source_id(observatory):
 
 def get_observer_coordinate_by_id(id):
     # Get the jp2 header for that image, this contains the position we want
-    jp2_header = hvpy.getJP2Header(id=id)
+    jp2_header = _get_jp2_header(id)
     if ("error" in jp2_header and "errno" in jp2_header):
         logging.error(jp2_header)
         raise HeliosException("Couldn't find image with id {}".format(id))
+    return get_observer_coordinate_from_header(jp2_header)
+
+def get_observer_coordinates_by_id(ids):
+    """
+    Looks up the observer coordinates of many images concurrently.
+    Returns one result per id in the same order. Images that couldn't be
+    found have the HeliosException raised for them in place of a coordinate.
+    """
+    def lookup(id):
+        try:
+            return get_observer_coordinate_by_id(id)
+        except HeliosException as e:
+            return e
+    if len(ids) == 1:
+        return [lookup(ids[0])]
+    return list(_POOL.map(lookup, ids))
+
+def get_observer_coordinate_from_header(jp2_header):
+    """
+    Returns the observer coordinate described by a jp2 XML header.
+    The observer keywords are read directly when possible, otherwise the
+    header is loaded into a sunpy Map.
+    """
+    try:
+        coordinate = _observer_from_keywords(_read_fits_keywords(jp2_header))
+    except (ET.ParseError, ValueError, TypeError) as e:
+        logging.debug("Couldn't read observer keywords: {}".format(e))
+        coordinate = None
+    if coordinate is None:
+        return _observer_from_map(jp2_header)
+    return coordinate
+
+def _read_fits_keywords(jp2_header):
+    """
+    Returns the keywords in the header's fits block
+    """
+    root = ET.fromstring(jp2_header)
+    fits = root if root.tag == "fits" else root.find(".//fits")
+    if fits is None:
+        return MetaDict()
+    return MetaDict({element.tag: (element.text or "").strip() for element in fits})
+
+def _observer_from_keywords(keywords):
+    """
+    Builds the observer coordinate from header keywords the same way sunpy's
+    GenericMap does. Returns None if the keywords aren't enough, so the caller
+    can fall back to a Map, which knows about instrument specific headers.
+    """
+    if any(is_source(None, keywords) for is_source in _SOURCES_WITH_OWN_OBSERVER):
+        return None
+    date = keywords.get("date-obs")
+    # Dates without a time (i.e. old LASCO and MDI headers) are completed with
+    # other keywords by their map sources.
+    if not date or "T" not in date:
+        return None
+    # Matches GenericMap._get_date
+    timesys = "TAI" if "TAI" in date else (keywords.get("timesys") or "UTC")
+    obstime = parse_time(date, scale=timesys.lower())
+    # Without rsun_ref, GenericMap derives the radius from other keywords
+    if "rsun_ref" not in keywords or "dsun_obs" not in keywords:
+        return None
+    rsun = float(keywords["rsun_ref"]) * u.m
+    radius = float(keywords["dsun_obs"]) * u.m
+    if "hgln_obs" in keywords and "hglt_obs" in keywords:
+        # Building the frame first skips most of SkyCoord's argument parsing
+        return SkyCoord(HeliographicStonyhurst(float(keywords["hgln_obs"]) * u.deg, float(keywords["hglt_obs"]) * u.deg, radius,
+                                               obstime=obstime, rsun=rsun), copy=False)
+    if "crln_obs" in keywords and "crlt_obs" in keywords:
+        carrington = SkyCoord(float(keywords["crln_obs"]) * u.deg, float(keywords["crlt_obs"]) * u.deg, radius,
+                              frame=HeliographicCarrington(obstime=obstime, rsun=rsun))
+        # The carrington position is the observer's own position
+        carrington.frame._observer = "self"
+        return SkyCoord(carrington.heliographic_stonyhurst)
+    return None
+
+def _observer_from_map(jp2_header):
     # Finagle that header data into a format sunpy will enjoy
     # This trick is done in helioviewer
     data = xml_to_dict(jp2_header)
@@ -72,34 +210,99 @@ def _get_cache_key(source_id, date):
     date_str = str(date)[0:-3]
     return "{}_{}".format(source_id, date_str)
 
-def get_observer_coordinate(observatory, date):
+def _pack_observer(coordinate):
     """
-    Uses a local database of jp2 images to find an observatory's position in space.
+    Serializes an observer coordinate as plain numbers for the cache
+    """
+    rsun = getattr(coordinate, "rsun", None)
+    return json.dumps({
+        "lon": coordinate.lon.to_value(u.deg),
+        "lat": coordinate.lat.to_value(u.deg),
+        "radius": coordinate.radius.to_value(u.m),
+        "obstime": coordinate.obstime.isot,
+        "rsun": None if rsun is None else rsun.to_value(u.m)
+    }).encode()
+
+def _unpack_observer(data):
+    """
+    Rebuilds an observer coordinate from the output of _pack_observer
+    """
+    values = json.loads(data)
+    frame_args = {"obstime": values["obstime"]}
+    if values["rsun"] is not None:
+        frame_args["rsun"] = values["rsun"] * u.m
+    return SkyCoord(values["lon"] * u.deg, values["lat"] * u.deg, values["radius"] * u.m,
+                    frame=HeliographicStonyhurst(**frame_args))
+
+def _resolve_observer(source_id, date):
+    """
+    Returns the observer coordinate for a source at the given date.
+    Checks known positions, then the shared cache, then helioviewer.
     """
-    # Map the observatory to a source id
-    lookup = observatory2source_id(observatory)
-    source_id = lookup["source"]
-    # first check the cache
-    cache_key = _get_cache_key(observatory, date)
-    if (cache_key in _CACHE):
+    trajectory = _get_trajectory(source_id)
+    coordinate = trajectory.Lookup(date)
+    if coordinate is not None:
+        logging.debug("Trajectory hit: {} {}".format(source_id, date))
+        return coordinate
+    cache_key = _get_cache_key(source_id, date)
+    cached = _CACHE.Get(cache_key)
+    if (cached is not None):
         logging.debug("Cache hit: {}".format(cache_key))
-        return _CACHE[cache_key]
+        coordinate = _unpack_observer(cached)
+        trajectory.Add(coordinate)
+        return coordinate
     logging.debug("Cache miss: {}".format(cache_key))
 
-    # Cache miss, continue query
-    # Get the nearest image to the date we want for that source id
-    closest_image = hvpy.getClosestImage(date=date, sourceId=source_id)
-
-    coordinate = get_observer_coordinate_by_id(closest_image["id"])
-    note = ""
-    if not lookup["found"]:
-        note = "No position data available for {}, defaulting to AIA".format(observatory)
-    result = {
-        "coordinate": coordinate,
-        "notes": note
-    }
-    _CACHE[cache_key] = result
-    return result
+    def fetch():
+        # Get the nearest image to the date we want for that source id
+        closest_image = _get_closest_image(date, source_id)
+        data = _pack_observer(get_observer_coordinate_by_id(closest_image["id"]))
+        _CACHE.Put(cache_key, data)
+        return data
+
+    # Other requests for the same source and minute wait for this one
+    data = _CACHE.Coalesce(cache_key, fetch, lambda: _CACHE.GetMany([cache_key], record=False).get(cache_key))
+    coordinate = _unpack_observer(data)
+    trajectory.Add(coordinate)
+    return coordinate
+
+def get_observer_coordinate(observatory, date):
+    """
+    Uses a local database of jp2 images to find an observatory's position in space.
+    """
+    return get_observer_coordinates([(observatory, date)])[0]
+
+def get_observer_coordinates(observations):
+    """
+    Looks up observer positions for many (observatory, date) pairs at once.
+    Pairs that map to the same source and minute are only looked up once, and
+    the rest are looked up concurrently.
+
+    :param observations: List of (observatory, date) pairs
+    :type observations: list[tuple[str, datetime]]
+    :return: One {"coordinate", "notes"} result for each pair, in the same order
+    """
+    lookups = [observatory2source_id(observatory) for observatory, _ in observations]
+    keys = [_get_cache_key(lookup["source"], date) for lookup, (_, date) in zip(lookups, observations)]
+    # Layout is cache key: (source_id, date of the first pair with that key)
+    unique = {}
+    for key, lookup, (_, date) in zip(keys, lookups, observations):
+        unique.setdefault(key, (lookup["source"], date))
+    if len(unique) == 1:
+        resolved = {key: _resolve_observer(*args) for key, args in unique.items()}
+    else:
+        futures = {key: _POOL.submit(_resolve_observer, *args) for key, args in unique.items()}
+        resolved = {key: future.result() for key, future in futures.items()}
+    results = []
+    for key, lookup, (observatory, _) in zip(keys, lookups, observations):
+        note = ""
+        if not lookup["found"]:
+            note = "No position data available for {}, defaulting to AIA".format(observatory)
+        results.append({
+            "coordinate": resolved[key],
+            "notes": note
+        })
+    return results
 
 # All args passed in will be passed as keyword args to main.
 def main(observatory, date):
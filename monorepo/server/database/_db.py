@@ -1,6 +1,6 @@
 import logging
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, MetaData, Table, Column, DateTime, Index
 
 from .models import Model
 import conf
@@ -8,3 +8,16 @@ import conf
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARN)
 engine = create_engine(conf.get('database', 'connection_string'), echo=True, pool_pre_ping=True, pool_recycle=1800, pool_size=3, max_overflow=0)
 Model.metadata.create_all(engine)
+# create_all only creates indexes along with new tables, so add indexes that
+# were declared after an existing table was created.
+for table in Model.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
+# Indexes replaced by newer ones, dropped from databases created before the
+# change. Declared on a separate MetaData so create_all never creates them.
+_obsolete_indexes = MetaData()
+Table("pfss", _obsolete_indexes, Column("date", DateTime), Index("ix_pfss_date", "date"))
+for table in _obsolete_indexes.sorted_tables:
+    for index in table.indexes:
+        index.drop(engine, checkfirst=True)
@@ -0,0 +1,77 @@
+"""
+Local store of HEK events, filled by the HEK ingest job.
+"""
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+
+from ._db import engine
+from .models import HekEvent, HekIngestWindow
+
+def QueryHekEvents(start: datetime, end: datetime, types: list[str] = None, batch_size: int = 500) -> Iterator[HekEvent]:
+    """
+    Yields stored events that overlap the given time range, ordered by start time.
+    Rows are read from the database batch_size at a time.
+
+    Parameters
+    ----------
+    start: `datetime`
+        Beginning of the time range
+    end: `datetime`
+        End of the time range
+    types: `list[str]`
+        Only return events with these HEK event types. Defaults to all types.
+    batch_size: `int`
+        Number of rows to read at a time
+    """
+    query = select(HekEvent).where(HekEvent.start <= end, HekEvent.end >= start)
+    if types is not None:
+        query = query.where(HekEvent.event_type.in_(types))
+    query = query.order_by(HekEvent.start).execution_options(yield_per=batch_size)
+    with Session(engine) as session:
+        for event in session.execute(query).scalars():
+            yield event
+            # Stop tracking events that have already been consumed
+            session.expunge(event)
+
+def MissingHekWindows(start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+    """
+    Returns the parts of the given time range that aren't covered by an
+    ingest window, in order.
+    """
+    with Session(engine) as session:
+        windows = session.execute(
+            select(HekIngestWindow.start, HekIngestWindow.end)
+            .where(HekIngestWindow.start <= end, HekIngestWindow.end >= start)
+            .order_by(HekIngestWindow.start)
+        ).all()
+    missing = []
+    covered_until = start
+    for window_start, window_end in windows:
+        if window_start > covered_until:
+            missing.append((covered_until, window_start))
+        covered_until = max(covered_until, window_end)
+        if covered_until >= end:
+            break
+    if covered_until < end:
+        missing.append((covered_until, end))
+    return missing
+
+def StoreHekEvents(start: datetime, end: datetime, events: list[HekEvent]):
+    """
+    Replaces the stored events that overlap the given time range with the
+    given events, and marks the range as ingested. The events should be every
+    HEK event overlapping the range.
+    """
+    with Session(engine) as session, session.begin():
+        session.execute(delete(HekEvent).where(HekEvent.start <= end, HekEvent.end >= start))
+        # Events that changed time since they were stored may be outside the range
+        archive_ids = [event.kb_archivid for event in events]
+        if len(archive_ids) > 0:
+            session.execute(delete(HekEvent).where(HekEvent.kb_archivid.in_(archive_ids)))
+        session.add_all(events)
+        # Windows within this one are redundant now
+        session.execute(delete(HekIngestWindow).where(HekIngestWindow.start >= start, HekIngestWindow.end <= end))
+        session.add(HekIngestWindow(start=start, end=end, ingested_at=datetime.utcnow()))
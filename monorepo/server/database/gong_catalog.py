@@ -0,0 +1,119 @@
+"""
+In memory catalog of the pfss table.
+
+The table only changes when `scripts/pfss/import.py` runs, so each worker
+keeps the rows for each level of detail sorted by date and finds the nearest
+row to a date with a binary search instead of querying the database. The
+catalog checks the table's max id and row count at most every
+`catalog_refresh_seconds`, loads any rows added since, and reloads
+everything if the counts show rows were deleted or added out of order.
+"""
+from datetime import datetime, timezone
+import threading
+import time
+from typing import NamedTuple, Union
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from ._db import engine
+from .models import GongPFSS
+import conf
+
+class GongCatalogEntry(NamedTuple):
+    id: int
+    date: datetime
+    path: str
+
+class _LodCatalog(NamedTuple):
+    # Row dates as microseconds since the epoch, sorted
+    times: np.ndarray
+    ids: np.ndarray
+    paths: np.ndarray
+
+    @staticmethod
+    def from_rows(rows: list) -> "_LodCatalog":
+        times = np.array([row.date for row in rows], dtype="datetime64[us]").astype(np.int64)
+        order = np.argsort(times, kind="stable")
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        paths = np.array([row.path for row in rows], dtype=object)
+        return _LodCatalog(times[order], ids[order], paths[order])
+
+    def merge(self, other: "_LodCatalog") -> "_LodCatalog":
+        times = np.concatenate((self.times, other.times))
+        order = np.argsort(times, kind="stable")
+        return _LodCatalog(times[order], np.concatenate((self.ids, other.ids))[order], np.concatenate((self.paths, other.paths))[order])
+
+def _ToTimestamps(dates: list[datetime]) -> np.ndarray:
+    # Stored dates are UTC without a timezone
+    naive = [date.astimezone(timezone.utc).replace(tzinfo=None) if date.tzinfo else date for date in dates]
+    return np.array(naive, dtype="datetime64[us]").astype(np.int64)
+
+class GongCatalog:
+    def __init__(self, refresh_seconds: float = float(conf.get("pfss", "catalog_refresh_seconds", "60"))):
+        self.refresh_seconds = refresh_seconds
+        self.lods: dict[int, _LodCatalog] = {}
+        self.max_id = 0
+        self.count = 0
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def _Refresh(self):
+        """
+        Loads rows added to the pfss table since the last refresh
+        """
+        if self.checked_at is not None and time.monotonic() - self.checked_at < self.refresh_seconds:
+            return
+        with self.lock, Session(engine) as session:
+            # Another thread may have refreshed while this one waited
+            if self.checked_at is not None and time.monotonic() - self.checked_at < self.refresh_seconds:
+                return
+            max_id, count = session.execute(select(func.max(GongPFSS.id), func.count(GongPFSS.id))).one()
+            max_id = max_id or 0
+            if count != self.count + (max_id - self.max_id) or max_id < self.max_id:
+                # Rows were deleted, or inserted with ids below max_id, start over
+                lods, loaded_id = {}, 0
+            else:
+                lods, loaded_id = dict(self.lods), self.max_id
+            if max_id != loaded_id:
+                rows = session.execute(select(GongPFSS.id, GongPFSS.date, GongPFSS.path, GongPFSS.lod).where(GongPFSS.id > loaded_id)).all()
+                for lod in set(row.lod for row in rows):
+                    new = _LodCatalog.from_rows([row for row in rows if row.lod == lod])
+                    lods[lod] = lods[lod].merge(new) if lod in lods else new
+            self.lods = lods
+            self.max_id, self.count = max_id, count
+            self.checked_at = time.monotonic()
+
+    def Nearest(self, dates: list[datetime], lod: int = 33) -> list[Union[GongCatalogEntry, None]]:
+        """
+        Returns the PFSS row closest in time to each of the given dates.
+        Gives the same results as `database.query.QueryGongNearest`.
+
+        Parameters
+        ----------
+        dates: `list[datetime]`
+            Dates to find PFSS rows for
+        lod: `int`
+            Level of detail of the PFSS rows
+
+        Returns
+        -------
+        The closest row for each date in the same order as dates, None where
+        there are no rows with the given level of detail.
+        """
+        self._Refresh()
+        catalog = self.lods.get(lod)
+        if catalog is None or len(catalog.times) == 0:
+            return [None] * len(dates)
+        times = _ToTimestamps(dates)
+        after = np.searchsorted(catalog.times, times, side="right")
+        before = np.maximum(after - 1, 0)
+        after = np.minimum(after, len(catalog.times) - 1)
+        # The earlier row wins ties
+        nearest = np.where(np.abs(times - catalog.times[before]) <= np.abs(catalog.times[after] - times), before, after)
+        dates = catalog.times[nearest].astype("datetime64[us]").tolist()
+        return [GongCatalogEntry(id, date, path) for id, date, path in zip(catalog.ids[nearest].tolist(), dates, catalog.paths[nearest])]
+
+# Shared by every request in this worker
+gong_catalog = GongCatalog()
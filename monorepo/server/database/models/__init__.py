@@ -1,4 +1,5 @@
 from .base import Model
 from .layer import Layer, LayerData
 from .scene import Scene, SceneData
-from .gong_pfss import GongPFSS
\ No newline at end of file
+from .gong_pfss import GongPFSS
+from .hek_event import HekEvent, HekIngestWindow
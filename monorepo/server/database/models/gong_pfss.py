@@ -1,15 +1,19 @@
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy import Integer, DateTime, VARCHAR
+from sqlalchemy import Integer, DateTime, VARCHAR, Index
 
 from .base import Model
 
 class GongPFSS(Model):
     __tablename__ = "pfss"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    date: Mapped[DateTime] = mapped_column(DateTime, index=True)
+    date: Mapped[DateTime] = mapped_column(DateTime)
     path: Mapped[VARCHAR] = mapped_column(VARCHAR(255), unique=True)
     lod: Mapped[int] = mapped_column(Integer)
+    # Rows are always looked up by the date closest to a given one within a single lod
+    __table_args__ = (
+        Index("pfss_lod_date", "lod", "date"),
+    )
     def __repr__(self) -> str:
         return f"GONG(id={self.id}, path={self.path})"
 
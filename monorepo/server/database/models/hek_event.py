@@ -0,0 +1,37 @@
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from sqlalchemy import Integer, DateTime, VARCHAR, JSON, Index
+
+from .base import Model
+
+class HekEvent(Model):
+    """
+    An event from the HEK along with its precomputed coordinates.
+    """
+    __tablename__ = "hek_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kb_archivid: Mapped[VARCHAR] = mapped_column(VARCHAR(255), unique=True)
+    event_type: Mapped[VARCHAR] = mapped_column(VARCHAR(16))
+    start: Mapped[DateTime] = mapped_column(DateTime)
+    end: Mapped[DateTime] = mapped_column(DateTime)
+    # The event as returned by /event, with every field as a string
+    vo_event: Mapped[dict] = mapped_column(JSON)
+    # The event's EventCoordinateDetails
+    coordinates: Mapped[dict] = mapped_column(JSON)
+    __table_args__ = (
+        Index("hek_events_interval", "start", "end", "event_type"),
+    )
+    def __repr__(self) -> str:
+        return f"HekEvent(id={self.id}, kb_archivid={self.kb_archivid}, {self.event_type} from {self.start!r} to {self.end!r})"
+
+class HekIngestWindow(Model):
+    """
+    A time range whose HEK events have all been stored in hek_events.
+    """
+    __tablename__ = "hek_ingest_windows"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    start: Mapped[DateTime] = mapped_column(DateTime, index=True)
+    end: Mapped[DateTime] = mapped_column(DateTime)
+    ingested_at: Mapped[DateTime] = mapped_column(DateTime)
+    def __repr__(self) -> str:
+        return f"HekIngestWindow({self.start!r} to {self.end!r}, ingested at {self.ingested_at!r})"
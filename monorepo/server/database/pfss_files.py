@@ -0,0 +1,130 @@
+"""
+Precompressed PFSS files for building /pfss/gong/ bundles without recompressing.
+
+A bundle is a count followed by each file's length and contents, sent as one
+gzip member. Each file is stored compressed as a raw deflate stream that ends
+with a sync flush, which leaves the stream byte aligned without marking its
+last block as final. Streams like that can be concatenated into one deflate
+stream, so the bundle is spliced together from small streams for the framing
+and each file's stored stream, then given a gzip header and trailer. The
+trailer's CRC is combined from each file's stored CRC.
+
+`scripts/pfss/import.py` writes the compressed copy of each file next to it
+with COMPRESSED_SUFFIX. Files without an up to date copy are compressed when
+they're read.
+"""
+import os
+import struct
+import zlib
+
+COMPRESSED_SUFFIX = ".deflate"
+COMPRESS_LEVEL = 9
+
+# Compressed copies start with the CRC32 and length of the uncompressed file
+_HEADER = struct.Struct("<II")
+# gzip header with no file name or modification time, and unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# Empty final deflate block
+_FINAL_BLOCK = b"\x03\x00"
+
+def _Deflate(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def _ZeroOperators() -> list[list[int]]:
+    """
+    Returns the GF(2) matrices that advance a CRC32 over 2^n zero bytes,
+    for each n up to 2^63 bytes.
+    """
+    def times(matrix: list[int], vector: int) -> int:
+        result, idx = 0, 0
+        while vector:
+            if vector & 1:
+                result ^= matrix[idx]
+            vector >>= 1
+            idx += 1
+        return result
+    # Advances over one zero bit
+    operator = [0xedb88320] + [1 << n for n in range(31)]
+    # Squared 3 times to advance over one zero byte
+    for _ in range(3):
+        operator = [times(operator, column) for column in operator]
+    operators = []
+    for _ in range(64):
+        operators.append(operator)
+        operator = [times(operator, column) for column in operator]
+    return operators
+
+_ZERO_OPERATORS = _ZeroOperators()
+
+def _Crc32Combine(crc1: int, crc2: int, length2: int) -> int:
+    """
+    Returns the CRC32 of two concatenated pieces of data from their CRCs,
+    the same as zlib's crc32_combine.
+    """
+    for operator in _ZERO_OPERATORS:
+        if length2 == 0:
+            break
+        if length2 & 1:
+            vector, crc1, idx = crc1, 0, 0
+            while vector:
+                if vector & 1:
+                    crc1 ^= operator[idx]
+                vector >>= 1
+                idx += 1
+        length2 >>= 1
+    return crc1 ^ crc2
+
+def Compress(data: bytes, level: int = COMPRESS_LEVEL) -> bytes:
+    """
+    Compresses a PFSS file into the format of its compressed copy
+    """
+    return _HEADER.pack(zlib.crc32(data), len(data)) + _Deflate(data, level)
+
+def _HasCompressedCopy(fname: str) -> bool:
+    compressed = fname + COMPRESSED_SUFFIX
+    return os.path.exists(compressed) and os.stat(compressed).st_mtime_ns >= os.stat(fname).st_mtime_ns
+
+def WriteCompressedCopy(fname: str) -> bool:
+    """
+    Writes the compressed copy of a PFSS file if it's missing or older than the file.
+    Returns True if it was written.
+    """
+    if _HasCompressedCopy(fname):
+        return False
+    with open(fname, "rb") as fp:
+        data = Compress(fp.read())
+    # Written to a temporary file first so readers never see a partial copy
+    tmp = f"{fname}{COMPRESSED_SUFFIX}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fp:
+        fp.write(data)
+    os.replace(tmp, fname + COMPRESSED_SUFFIX)
+    return True
+
+def ReadCompressed(fname: str) -> bytes:
+    """
+    Returns a PFSS file in the format written by Compress
+    """
+    if _HasCompressedCopy(fname):
+        with open(fname + COMPRESSED_SUFFIX, "rb") as fp:
+            return fp.read()
+    with open(fname, "rb") as fp:
+        return Compress(fp.read())
+
+def BuildBundle(files: list[bytes]) -> bytes:
+    """
+    Builds a gzipped bundle from files returned by ReadCompressed
+    """
+    count = struct.pack(">i", len(files))
+    parts = [_GZIP_HEADER, _Deflate(count, 1)]
+    crc, length = zlib.crc32(count), len(count)
+    for compressed in files:
+        file_crc, file_length = _HEADER.unpack_from(compressed)
+        framing = struct.pack(">I", file_length)
+        parts.append(_Deflate(framing, 1))
+        parts.append(memoryview(compressed)[_HEADER.size:])
+        crc = _Crc32Combine(zlib.crc32(framing, crc), file_crc, file_length)
+        length += len(framing) + file_length
+    parts.append(_FINAL_BLOCK)
+    parts.append(struct.pack("<II", crc, length & 0xffffffff))
+    return b"".join(parts)
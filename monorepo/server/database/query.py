@@ -1,29 +1,72 @@
+from functools import lru_cache
 from sqlalchemy.orm import Session
-from sqlalchemy import text, select
+from sqlalchemy import text, select, bindparam, column, Integer, DateTime
+from sqlalchemy.sql.elements import TextClause
 from ._db import engine
 from .models import GongPFSS
 from datetime import datetime
 from typing import Union
-import json
+
+# Number of dates resolved per database round trip by QueryGongNearest.
+# Each date is 2 subqueries, and SQLite allows at most 500 in one UNION.
+GONG_QUERY_CHUNK = 200
 
 def QueryGong(date: datetime, lod: int = 33) -> Union[GongPFSS, None]:
-    date_str = date.strftime("%Y-%m-%d %H:%M:%S")
+    """
+    Returns the PFSS row closest in time to the given date, or None if there
+    are no rows with the given level of detail.
+    """
+    return QueryGongNearest([date], lod)[0]
+
+@lru_cache
+def _NearestStatement(count: int) -> TextClause:
+    """
+    Builds a query for the closest row at or before, and the closest row
+    after, each of count dates. Rows are tagged with the index of their date.
+    The statement only depends on count so it's built once for each chunk size.
+    """
+    subqueries = []
+    for i in range(count):
+        subqueries.append(f"SELECT * FROM (SELECT {i} AS idx, id, path, date, lod FROM pfss WHERE date <= :date{i} AND lod = :lod ORDER BY date DESC LIMIT 1) b{i}")
+        subqueries.append(f"SELECT * FROM (SELECT {i} AS idx, id, path, date, lod FROM pfss WHERE date > :date{i} AND lod = :lod ORDER BY date ASC LIMIT 1) a{i}")
+    sql = text("\nUNION ALL\n".join(subqueries))
+    # Typed so dates are stored and compared the same way as GongPFSS.date
+    sql = sql.bindparams(*[bindparam(f"date{i}", type_=DateTime) for i in range(count)])
+    return sql.columns(column("idx", Integer), GongPFSS.id, GongPFSS.path, GongPFSS.date, GongPFSS.lod)
+
+def QueryGongNearest(dates: list[datetime], lod: int = 33, chunk_size: int = GONG_QUERY_CHUNK) -> list[Union[GongPFSS, None]]:
+    """
+    Returns the PFSS row closest in time to each of the given dates.
+    All dates are resolved in one query, or one per chunk_size dates.
+
+    Parameters
+    ----------
+    dates: `list[datetime]`
+        Dates to find PFSS rows for
+    lod: `int`
+        Level of detail of the PFSS rows
+    chunk_size: `int`
+        Maximum number of dates resolved in one query
+
+    Returns
+    -------
+    The closest row for each date in the same order as dates, None where
+    there are no rows with the given level of detail.
+    """
+    unique_dates = list(dict.fromkeys(dates))
+    nearest = {}
     with Session(engine) as session:
-        sql = text(f"""
-            SELECT s.id, s.path, s.date FROM (
-                SELECT * FROM (SELECT id, path, date FROM pfss WHERE date <= '{date_str}' AND lod = {lod} ORDER BY date DESC LIMIT 1) q1
-                UNION ALL
-                SELECT * FROM (SELECT id, path, date FROM pfss WHERE date > '{date_str}' AND lod = {lod} ORDER BY date ASC LIMIT 1) q2
-            ) s
-            ORDER BY ABS(TIMEDIFF(s.date, '{date_str}'))
-            LIMIT 1;
-        """)
-        sql.columns(GongPFSS.id, GongPFSS.path, GongPFSS.date)
-        query = select(GongPFSS).from_statement(sql)
-        # I don't know if there's a nicer way to just get the result.
-        results = session.execute(query).scalars().all()
-        count = len(results)
-        if (count > 0):
-            return results[0]
-        else:
-            return None
+        for start in range(0, len(unique_dates), chunk_size):
+            chunk = unique_dates[start:start + chunk_size]
+            params = {f"date{i}": date for i, date in enumerate(chunk)}
+            query = select(column("idx"), GongPFSS).from_statement(_NearestStatement(len(chunk)))
+            for index, row in session.execute(query, {"lod": lod, **params}):
+                date = chunk[index]
+                if date not in nearest:
+                    nearest[date] = row
+                    continue
+                distance, best = abs(row.date - date), abs(nearest[date].date - date)
+                # The earlier row wins ties
+                if distance < best or (distance == best and row.date <= date):
+                    nearest[date] = row
+    return [nearest.get(date) for date in dates]
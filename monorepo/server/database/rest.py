@@ -1,6 +1,6 @@
-import gzip
-import concurrent.futures
-import struct
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
 from datetime import datetime
 
 from flask import request
@@ -9,17 +9,42 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from .models import Model, Layer, Scene, SceneData
-from .query import QueryGong
+from .gong_catalog import gong_catalog
+from .pfss_files import ReadCompressed, BuildBundle, COMPRESSED_SUFFIX
 from ._db import engine
 from helios_exceptions import HeliosExceptionResponse
 from routes.common.response import SendResponse
 from routes.common.dates import ParseDate
 from meta.mimetype import MimeType
+from file_cache import FileCache
 import routes.tags as Tags
+import conf
 
-def _ReadFile(fname: str) -> bytes:
-    with open(fname, "rb") as fp:
-        return fp.read()
+# Compressed PFSS files shared by all workers on the host. Each file is
+# mapped from [cache] pfss_dir, so hot files are held in memory once.
+_PFSS_CACHE = FileCache("pfss", int(conf.get("cache", "pfss_max_bytes", "268435456")), conf.get("cache", "pfss_dir", "") or None)
+
+# Reads PFSS files missing from the cache. Shared by all requests so the
+# number of concurrent reads from the pfss-data volume stays bounded.
+_pool = ThreadPoolExecutor(max_workers=int(conf.get("pfss", "max_concurrent_reads", "4")), thread_name_prefix="pfss_read")
+
+def _PfssKey(fname: str) -> str:
+    # Regenerated files get a new key
+    return f"{fname}{COMPRESSED_SUFFIX}:{os.stat(fname).st_mtime_ns}"
+
+def _ReadPfssFiles(fnames: list[str]) -> list[bytes | mmap.mmap]:
+    """
+    Returns each PFSS file in the format written by `pfss_files.Compress`,
+    reading files that aren't in the cache concurrently and caching them.
+    """
+    keys = [_PfssKey(fname) for fname in fnames]
+    cached = _PFSS_CACHE.GetMany(keys)
+    missing = {key: fname for key, fname in zip(keys, fnames) if key not in cached}
+    if len(missing) > 0:
+        read = dict(zip(missing.keys(), _pool.map(ReadCompressed, missing.values())))
+        _PFSS_CACHE.PutMany(read)
+        cached.update(read)
+    return [cached[key] for key in keys]
 
 def _Get(model: Model, id: int) -> dict:
     with Session(engine) as session:
@@ -104,24 +129,14 @@ def register(app: OpenAPI):
              })
     def get_field_lines_gong(query: GetGongPFSSQueryParameters):
         dates = query.dates
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(QueryGong, date) for date in dates]
-            # Put results into a set to remove duplicates.
-            # There may be duplicate results when the requested dates return the same gong file
-            query_results = set([future.result() for future in futures])
-            # Remove "Nones" (if there is any None, they will all be None because it means the database is empty)
-            without_nones = filter(lambda x: x is not None, query_results)
-            # Put deduped results back into a list and sort
-            sorted_result = sorted(without_nones, key=lambda x: x.date)
-            # Load data for each result
-            data_futures = [executor.submit(_ReadFile, pfss.path) for pfss in sorted_result]
-            data = [future.result() for future in data_futures]
-            # Build file bundle
-            bytes = bytearray()
-            bytes += struct.pack(">i", len(data))
-            for binary in data:
-                # Add length of the binary
-                bytes += struct.pack(">I", len(binary))
-                bytes += binary
-            gzipped = gzip.compress(bytes, compresslevel=1)
-            return SendResponse(gzipped, mime=MimeType.Binary)
+        # Put results into a set to remove duplicates.
+        # There may be duplicate results when the requested dates return the same gong file
+        query_results = set(gong_catalog.Nearest(dates))
+        # Remove "Nones" (if there is any None, they will all be None because it means the database is empty)
+        without_nones = filter(lambda x: x is not None, query_results)
+        # Put deduped results back into a list and sort
+        sorted_result = sorted(without_nones, key=lambda x: x.date)
+        # Load data for each result
+        members = _ReadPfssFiles([pfss.path for pfss in sorted_result])
+        # Splice the already compressed files into one gzip member
+        return SendResponse(BuildBundle(members), mime=MimeType.Binary)
@@ -0,0 +1,42 @@
+import gzip
+import os
+import struct
+import zlib
+
+from database.pfss_files import WriteCompressedCopy, ReadCompressed, BuildBundle, Compress, COMPRESSED_SUFFIX, _Crc32Combine
+
+def _Decompress(compressed: bytes) -> bytes:
+    # Skips the bundle's count and length
+    return gzip.decompress(BuildBundle([compressed]))[8:]
+
+def test_compressed_copy(tmp_path):
+    fname = str(tmp_path / "pfss.bin")
+    with open(fname, "wb") as fp:
+        fp.write(b"lines" * 100)
+    assert WriteCompressedCopy(fname)
+    assert not WriteCompressedCopy(fname)
+    assert _Decompress(ReadCompressed(fname)) == b"lines" * 100
+
+    # A regenerated file isn't served from its old copy
+    with open(fname, "wb") as fp:
+        fp.write(b"new lines")
+    os.utime(fname + COMPRESSED_SUFFIX, ns=(0, 0))
+    assert _Decompress(ReadCompressed(fname)) == b"new lines"
+    assert WriteCompressedCopy(fname)
+    assert _Decompress(ReadCompressed(fname)) == b"new lines"
+
+def test_bundle_matches_uncompressed_format():
+    files = [b"", b"\x01" * 3, os.urandom(5000), b"lines" * 20000]
+    bundle = BuildBundle([Compress(data) for data in files])
+    expected = struct.pack(">i", len(files)) + b"".join(struct.pack(">I", len(data)) + data for data in files)
+    # The bundle is a single gzip member, which decoders that stop after the
+    # first member (like browsers) read completely
+    decompressor = zlib.decompressobj(wbits=31)
+    assert decompressor.decompress(bundle) == expected
+    assert decompressor.eof
+    assert decompressor.unused_data == b""
+
+def test_crc32_combine():
+    first, second = os.urandom(1000), os.urandom(70000)
+    assert _Crc32Combine(zlib.crc32(first), zlib.crc32(second), len(second)) == zlib.crc32(first + second)
+    assert _Crc32Combine(zlib.crc32(first), zlib.crc32(b""), 0) == zlib.crc32(first)
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+import gzip
+import os
+import struct
+
+import pytest
+from sqlalchemy import DateTime, Integer, bindparam, column, delete, text
+from sqlalchemy.orm import Session
+
+from main import app
+import database.query
+import database.rest
+from database._db import engine
+from database.models import GongPFSS
+from database.query import QueryGong, QueryGongNearest, _NearestStatement
+from database.gong_catalog import GongCatalog
+from file_cache import FileCache
+
+# Far from any real data in the test database
+DAY = datetime(1990, 1, 1)
+# Not used by real PFSS data
+LOD = -1
+
+@pytest.fixture
+def pfss(tmp_path) -> list[GongPFSS]:
+    """
+    Stores PFSS rows every 6 hours through DAY, with a file for each
+    """
+    rows = []
+    for i in range(4):
+        path = tmp_path / f"pfss_{i}.bin"
+        path.write_bytes(bytes([i]) * (i + 1))
+        rows.append(GongPFSS(date=DAY + timedelta(hours=6 * i), path=str(path), lod=LOD))
+    with Session(engine, expire_on_commit=False) as session, session.begin():
+        session.add_all(rows)
+    yield rows
+    with Session(engine) as session, session.begin():
+        session.execute(delete(GongPFSS).where(GongPFSS.lod == LOD))
+
+def test_query_gong_nearest(pfss):
+    dates = [
+        DAY - timedelta(days=3),
+        DAY + timedelta(hours=2),
+        DAY + timedelta(hours=4),
+        # Ties go to the earlier row
+        DAY + timedelta(hours=9),
+        DAY + timedelta(hours=6),
+        DAY + timedelta(days=3),
+        DAY + timedelta(hours=2),
+    ]
+    expected = [0, 0, 1, 1, 1, 3, 0]
+    for chunk_size in [1, 3, 200]:
+        results = QueryGongNearest(dates, LOD, chunk_size)
+        assert [result.id for result in results] == [pfss[i].id for i in expected]
+    assert QueryGong(DAY + timedelta(hours=13), LOD).id == pfss[2].id
+
+def test_query_gong_nearest_ties_ignore_row_order(pfss, monkeypatch):
+    def reversed_statement(count: int):
+        # Returns rows after each date before the rows before it
+        subqueries = _NearestStatement(count).element.text.split("\nUNION ALL\n")
+        sql = text("\nUNION ALL\n".join(reversed(subqueries)))
+        sql = sql.bindparams(*[bindparam(f"date{i}", type_=DateTime) for i in range(count)])
+        return sql.columns(column("idx", Integer), GongPFSS.id, GongPFSS.path, GongPFSS.date, GongPFSS.lod)
+    monkeypatch.setattr(database.query, "_NearestStatement", reversed_statement)
+    results = QueryGongNearest([DAY + timedelta(hours=9), DAY + timedelta(hours=15)], LOD)
+    assert [result.id for result in results] == [pfss[1].id, pfss[2].id]
+
+def test_query_gong_nearest_empty():
+    assert QueryGongNearest([DAY, DAY + timedelta(hours=1)], LOD) == [None, None]
+    assert QueryGongNearest([], LOD) == []
+
+@pytest.mark.skipif(engine.dialect.name != "sqlite", reason="Reads SQLite's query plan")
+def test_query_gong_nearest_uses_index():
+    with engine.connect() as connection:
+        plan = connection.execute(text("EXPLAIN QUERY PLAN " + str(_NearestStatement(2))), {"date0": DAY, "date1": DAY, "lod": LOD}).all()
+    details = [row[3] for row in plan]
+    # Each side of each date is a single seek on (lod, date), without sorting
+    assert [detail for detail in details if "pfss" in detail] == [
+        "SEARCH pfss USING INDEX pfss_lod_date (lod=? AND date<?)",
+        "SEARCH pfss USING INDEX pfss_lod_date (lod=? AND date>?)",
+    ] * 2
+    assert not any("TEMP B-TREE" in detail for detail in details)
+
+def test_get_field_lines_gong(pfss, monkeypatch, tmp_path):
+    catalog = GongCatalog(refresh_seconds=0)
+    monkeypatch.setattr(database.rest.gong_catalog, "Nearest", lambda dates: catalog.Nearest(dates, LOD))
+    cache = FileCache("pfss", 1000000, str(tmp_path / "cache"))
+    monkeypatch.setattr(database.rest, "_PFSS_CACHE", cache)
+    client = app.test_client()
+    dates = [DAY + timedelta(hours=4), DAY + timedelta(hours=20), DAY + timedelta(hours=5)]
+    for _ in range(2):
+        response = client.get("/pfss/gong/", query_string=[("dates", date.isoformat()) for date in dates])
+        assert response.status_code == 200
+        data = gzip.decompress(response.data)
+        assert struct.unpack(">i", data[:4])[0] == 2
+        # Files are sorted by date, with their lengths
+        assert data[4:] == struct.pack(">I", 2) + bytes([1, 1]) + struct.pack(">I", 4) + bytes([3] * 4)
+    # The second request is read from the cache
+    stats = cache.Stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+    assert client.get("/metrics/cache").json["pfss"]["hit_ratio"] == 0.5
+
+    # Files that changed are read again
+    with open(pfss[1].path, "wb") as fp:
+        fp.write(b"new")
+    os.utime(pfss[1].path, ns=(0, 0))
+    data = gzip.decompress(client.get("/pfss/gong/", query_string=[("dates", dates[0].isoformat())]).data)
+    assert data[4:] == struct.pack(">I", 3) + b"new"
+
+def test_gong_catalog(pfss):
+    catalog = GongCatalog(refresh_seconds=0)
+    dates = [DAY + timedelta(hours=h) for h in range(-30, 50, 1)] + [DAY + timedelta(hours=3, seconds=1)]
+    expected = QueryGongNearest(dates, LOD)
+    results = catalog.Nearest(dates, LOD)
+    assert [(result.id, result.date, result.path) for result in results] == [(row.id, row.date, row.path) for row in expected]
+    assert catalog.Nearest(dates, LOD - 1) == [None] * len(dates)
+
+    # New rows are picked up, and deleted rows are dropped
+    with Session(engine) as session, session.begin():
+        session.add(GongPFSS(date=DAY + timedelta(days=2), path="pfss_new.bin", lod=LOD))
+    assert catalog.Nearest([DAY + timedelta(days=3)], LOD)[0].path == "pfss_new.bin"
+    with Session(engine) as session, session.begin():
+        session.execute(delete(GongPFSS).where(GongPFSS.lod == LOD, GongPFSS.date < DAY + timedelta(hours=12)))
+    assert [result.path for result in catalog.Nearest([DAY, DAY + timedelta(days=3)], LOD)] == [pfss[2].path, "pfss_new.bin"]
+
+def test_gong_catalog_rows_added_out_of_order(pfss):
+    with Session(engine) as session, session.begin():
+        session.execute(delete(GongPFSS).where(GongPFSS.id == pfss[0].id))
+    catalog = GongCatalog(refresh_seconds=0)
+    assert catalog.Nearest([DAY], LOD)[0].id == pfss[1].id
+    # A row with an id below the max id is found too
+    with Session(engine) as session, session.begin():
+        session.add(GongPFSS(id=pfss[0].id, date=DAY, path="pfss_restored.bin", lod=LOD))
+    assert catalog.Nearest([DAY], LOD)[0].path == "pfss_restored.bin"
+
+def test_gong_catalog_refresh_interval(pfss):
+    catalog = GongCatalog(refresh_seconds=3600)
+    assert catalog.Nearest([DAY], LOD)[0].id == pfss[0].id
+    with Session(engine) as session, session.begin():
+        session.execute(delete(GongPFSS).where(GongPFSS.id == pfss[0].id))
+    # Not checked again until the refresh interval passes
+    assert catalog.Nearest([DAY], LOD)[0].id == pfss[0].id
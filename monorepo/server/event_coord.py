@@ -2,14 +2,17 @@ from argparse import RawTextHelpFormatter
 from argparse import ArgumentParser
 from datetime import datetime
 from enum import Enum
-from coordinate_lookup import get_observer_coordinate
+from functools import lru_cache
+from coordinate_lookup import get_observer_coordinate, get_observer_coordinates
 from get_heeq import convert_skycoords_to_heeq, Coordinate
 from helios_exceptions import HeliosException
+from helios_frame import earth_position, earth_skycoord, earth_latitude
 import sunpy
-from sunpy.coordinates import get_earth
+import numpy as np
 from numpy import isnan
 
-from astropy.coordinates import SkyCoord
+from astropy.coordinates import SkyCoord, Latitude, Longitude
+from astropy.time import Time
 import astropy.units as u
 
 # from get_heeq import convert_skycoords_to_heeq
@@ -39,6 +42,9 @@ class CoordinateSystem(Enum):
         except ValueError as e:
             raise HeliosException(str(e))
 
+# Coordinate systems that need the observer's position, which is looked up by observatory
+OBSERVER_SYSTEMS = {CoordinateSystem.Projective, CoordinateSystem.Stonyhurst}
+
 # Set arguments to be passed to parser.add_argument here.
 # Format is ([positional_args], {keyword_args: value})
 PROGRAM_ARGS = [
@@ -62,7 +68,22 @@ def _clean_units(units):
     arcs = degs.replace("arcseconds", "arcsec")
     return arcs
 
-def _clean_observatory(observatory):
+@lru_cache
+def _parse_units(units):
+    """
+    Parses cleaned units the same way SkyCoord's unit keyword does.
+    Returns a unit for each of the 3 coordinates.
+    """
+    try:
+        parsed = tuple(u.Unit(unit) for unit in units.split(","))
+    except ValueError:
+        parsed = ()
+    if not 1 <= len(parsed) <= 3:
+        raise ValueError("Unit keyword must have one to three unit values as tuple or comma-separated string.")
+    # A single unit applies to every coordinate
+    return parsed * 3 if len(parsed) == 1 else parsed
+
+def clean_observatory(observatory):
     """
     Attempts to return a valid event observatory
     """
@@ -71,37 +92,67 @@ def _clean_observatory(observatory):
     else:
         return observatory
 
-def _generate_result(observer_heeq, event_stonyhurst, msg):
+def _generate_result(observer_heeq, lat, lon, obstime, msg):
     """
     Generates a consistent return result
     """
-    result = {"observer": observer_heeq, "notes": msg, "event": {
-        "lat": (event_stonyhurst.lat - sunpy.coordinates.sun.B0(event_stonyhurst.obstime)).deg,
-        "lon": event_stonyhurst.lon.deg
-    }}
-    if isnan(result["event"]["lat"]):
-        result["event"]["lat"] = 0
-    if isnan(result["event"]["lon"]):
-        result["event"]["lon"] = 0
-    return result
+    return _generate_results([observer_heeq], lat, lon, obstime, [msg])[0]
 
-def process_radial_coordinates(angle, date):
-    angle = int(angle)
-    observer = get_earth(time=date)
+def _generate_results(observer_heeqs, lat, lon, obstime, notes):
+    """
+    Generates results for scalar or array stonyhurst latitudes and longitudes in degrees.
+    The B0 correction is computed for all events at once.
+    """
+    lat = np.atleast_1d(lat - np.degrees(earth_latitude(obstime)))
+    lon = np.atleast_1d(lon)
+    # Events that can't be placed on the sun are put at 0, 0
+    lat = np.where(isnan(lat), 0, lat).tolist()
+    lon = np.where(isnan(lon), 0, lon).tolist()
+    return [{"observer": observer_heeq, "notes": msg, "event": {"lat": event_lat, "lon": event_lon}}
+            for observer_heeq, msg, event_lat, event_lon in zip(observer_heeqs, notes, lat, lon)]
+
+def _earth_heeq(date) -> Coordinate:
+    x, y, z = earth_position(Time(date)).tolist()
+    return Coordinate(x=x, y=y, z=z)
+
+def _radial_to_stonyhurst(angle):
+    """
+    Maps scalar or array radial angles in degrees onto the limb as stonyhurst
+    latitudes and longitudes in degrees.
+    """
+    angle = np.trunc(angle)
     # radial angle starts from the north pole, latitude starts from the equator. So to get the
     # correct stonyhurst angle, add 90 to the angle.
-    longitude = -90 if angle <= 180 else 90
-    latitude = (90 - angle) if angle <= 180 else (angle - 270)
-    event_stonyhurst = SkyCoord(longitude, latitude, unit="deg,deg", obstime=date, observer=observer, frame=sunpy.coordinates.HeliographicStonyhurst)
-    observer_heeq = convert_skycoords_to_heeq(observer)
-    return _generate_result(observer_heeq, event_stonyhurst, "")
+    longitude = np.where(angle <= 180, -90.0, 90.0)
+    latitude = np.where(angle <= 180, 90 - angle, angle - 270)
+    # Angles past 360 degrees aren't on the limb
+    off_limb = np.abs(latitude) > 90
+    if np.any(off_limb):
+        raise HeliosException("Latitude of radial angle(s) {} must be within -90 deg <= angle <= 90 deg".format(np.asarray(angle)[off_limb]))
+    return latitude, longitude
+
+def _stonyhurst_degrees(lon, lat, units):
+    """
+    Converts scalar or array stonyhurst coordinates in the given units to
+    degrees, with longitudes wrapped the same way as HeliographicStonyhurst.
+    """
+    lon_unit, lat_unit = _parse_units(units)[:2]
+    lon = Longitude(lon, unit=lon_unit, wrap_angle=180 * u.deg)
+    lat = Latitude(lat, unit=lat_unit)
+    return lon.deg, lat.deg
+
+def process_radial_coordinates(angle, date):
+    latitude, longitude = _radial_to_stonyhurst(int(angle))
+    observer_heeq = _earth_heeq(date)
+    return _generate_result(observer_heeq, latitude, longitude, Time(date), "")
 
-def process_helioprojective_coordinates(x, y, date, observatory, units):
+def process_helioprojective_coordinates(x, y, date, observatory, units, observer=None):
     """
     Converts heliprojective coordinates to a heliographic stonyhurst coordinate within a constant reference frame.
+    If the observer has already been looked up, pass its get_observer_coordinate result as observer.
     """
     # Get the observer's position as a skycoord
-    observer_coordinate = get_observer_coordinate(observatory, date)
+    observer_coordinate = observer or get_observer_coordinate(observatory, date)
     # Create the projective coordinate for the event
     event_coord_projective = SkyCoord(x, y, unit=units, obstime=date, observer=observer_coordinate["coordinate"], frame=sunpy.coordinates.Helioprojective)
 
@@ -110,48 +161,51 @@ def process_helioprojective_coordinates(x, y, date, observatory, units):
     # Get the event's coordinate as heliographic stonyhurst
     event_stonyhurst = event_coord_projective.transform_to(sunpy.coordinates.HeliographicStonyhurst)
 
-    return _generate_result(observer_heeq, event_stonyhurst, observer_coordinate["notes"])
+    return _generate_result(observer_heeq, event_stonyhurst.lat.deg, event_stonyhurst.lon.deg, event_stonyhurst.obstime, observer_coordinate["notes"])
 
-def process_stonyhurst_coordinates(lon, lat, date, observatory, units):
+def process_stonyhurst_coordinates(lon, lat, date, observatory, units, observer=None):
     # Get the observer's position as a skycoord
-    observer_coordinate = get_observer_coordinate(observatory, date)
+    observer_coordinate = observer or get_observer_coordinate(observatory, date)
     # Get the observer's heeq coordinate
     observer_heeq = convert_skycoords_to_heeq(observer_coordinate["coordinate"])
 
-    # Create the coordinate for the event
-    # Since we're really just returning lat/lon anyway, the useful part of this is handling arbitrary units
-    event_stonyhurst = SkyCoord(lon, lat, unit=units, obstime=date, observer=observer_coordinate["coordinate"], frame=sunpy.coordinates.HeliographicStonyhurst)
+    # The event is already stonyhurst, so only the units need converting
+    lon, lat = _stonyhurst_degrees(lon, lat, units)
 
-    return _generate_result(observer_heeq, event_stonyhurst, observer_coordinate["notes"])
+    return _generate_result(observer_heeq, lat, lon, Time(date), observer_coordinate["notes"])
 
 def process_carrington_coordinates(x, y, z, date, observatory, units):
 
     # Create the coordinate for the event
     # Since we're really just returning lat/lon anyway, the useful part of this is handling arbitrary units
-    event_carrington = SkyCoord(x, y, z, unit=units, obstime=date, observer="earth", frame=sunpy.coordinates.HeliographicCarrington)
+    # Carrington system events are from an earth observer
+    event_carrington = SkyCoord(x, y, z, unit=units, obstime=date, observer=earth_skycoord(Time(date)), frame=sunpy.coordinates.HeliographicCarrington)
 
-    # Carrington system events are from an earth observer, so
-    observer_coordinate = event_carrington.observer
     # Get the observer's heeq coordinate
-    observer_heeq = convert_skycoords_to_heeq(observer_coordinate)
+    observer_heeq = _earth_heeq(date)
 
     event_stonyhurst = event_carrington.transform_to(sunpy.coordinates.HeliographicStonyhurst)
 
-    return _generate_result(observer_heeq, event_stonyhurst)
+    return _generate_result(observer_heeq, event_stonyhurst.lat.deg, event_stonyhurst.lon.deg, event_stonyhurst.obstime, "")
 
 
-def get_event_coordinates(coordinate_system, coord1, coord2, coord3, date, observatory, units) -> Coordinate:
+def get_event_coordinates(coordinate_system, coord1, coord2, coord3, date, observatory, units, observer=None) -> Coordinate:
+    """
+    Converts an event's coordinates into a stonyhurst position and the observer's position.
+    observer is an optional get_observer_coordinate result for systems in OBSERVER_SYSTEMS,
+    so callers converting many events can look up all of their observers at once.
+    """
     try:
         if (type(coordinate_system) != CoordinateSystem):
             coordinate_system = CoordinateSystem.from_str(coordinate_system)
-        observatory = _clean_observatory(observatory)
+        observatory = clean_observatory(observatory)
         units = _clean_units(units)
         if (coordinate_system == CoordinateSystem.Radial):
             return process_radial_coordinates(coord1, date)
         elif (coordinate_system == CoordinateSystem.Projective):
-            return process_helioprojective_coordinates(coord1, coord2, date, observatory, units)
+            return process_helioprojective_coordinates(coord1, coord2, date, observatory, units, observer)
         elif (coordinate_system == CoordinateSystem.Stonyhurst):
-            return process_stonyhurst_coordinates(coord1, coord2, date, observatory, units)
+            return process_stonyhurst_coordinates(coord1, coord2, date, observatory, units, observer)
         elif (coordinate_system == CoordinateSystem.Carrington):
             if (coord3 is None):
                 raise HeliosException("Coordinate 3 is required for the carrington event coordinates")
@@ -166,6 +220,78 @@ def get_event_coordinates(coordinate_system, coord1, coord2, coord3, date, obser
         else:
             raise e
 
+def get_events_coordinates(events, observers=None) -> list[dict]:
+    """
+    Converts many events at once. Events with the same coordinate system,
+    units, and observer are converted together in one vectorized transform.
+    Results match calling get_event_coordinates for each event.
+
+    :param events: List of (coordinate_system, coord1, coord2, coord3, date, observatory, units) tuples, the same arguments as get_event_coordinates
+    :param observers: Optional get_observer_coordinate results for each event, None for events outside OBSERVER_SYSTEMS. Looked up in bulk when not given.
+    :return: One result for each event, in the same order
+    """
+    events = [(system if type(system) == CoordinateSystem else CoordinateSystem.from_str(system), *rest) for system, *rest in events]
+    if observers is None:
+        observers = [None] * len(events)
+        needs_observer = [i for i, event in enumerate(events) if event[0] in OBSERVER_SYSTEMS]
+        found = get_observer_coordinates([(clean_observatory(events[i][5]), events[i][4]) for i in needs_observer])
+        for i, observer in zip(needs_observer, found):
+            observers[i] = observer
+    # Layout is (system, units, observer): [event index]
+    groups = {}
+    for i, (system, _, _, _, _, _, units) in enumerate(events):
+        observer = observers[i]["coordinate"] if system in OBSERVER_SYSTEMS else None
+        # Observers for the same source and minute are the same object
+        groups.setdefault((system, _clean_units(units), id(observer)), []).append(i)
+    results = [None] * len(events)
+    for (system, units, _), indices in groups.items():
+        group = [events[i] for i in indices]
+        group_observers = [observers[i] for i in indices]
+        try:
+            converted = _convert_group(system, group, units, group_observers)
+        except ValueError as e:
+            # Same handling as get_event_coordinates
+            if ("Unit keyword must have" in str(e)):
+                raise HeliosException(str(e) + " Got {}".format(units))
+            else:
+                raise e
+        for i, result in zip(indices, converted):
+            results[i] = result
+    return results
+
+def _convert_group(system, events, units, observers):
+    """
+    Converts events which share a coordinate system, units, and observer
+    """
+    coord1 = np.array([event[1] for event in events], dtype=float)
+    coord2 = np.array([event[2] for event in events], dtype=float)
+    dates = Time([event[4] for event in events])
+    if system == CoordinateSystem.Radial:
+        latitude, longitude = _radial_to_stonyhurst(coord1)
+        return _generate_results(_earth_heeqs(dates), latitude, longitude, dates, [""] * len(events))
+    if system == CoordinateSystem.Carrington:
+        if any(event[3] is None for event in events):
+            raise HeliosException("Coordinate 3 is required for the carrington event coordinates")
+        coord3 = np.array([event[3] for event in events], dtype=float)
+        observer = earth_skycoord(dates)
+        event_carrington = SkyCoord(coord1, coord2, coord3, unit=units, obstime=dates, observer=observer, frame=sunpy.coordinates.HeliographicCarrington)
+        event_stonyhurst = event_carrington.transform_to(sunpy.coordinates.HeliographicStonyhurst)
+        return _generate_results(_earth_heeqs(dates), event_stonyhurst.lat.deg, event_stonyhurst.lon.deg, dates, [""] * len(events))
+    observer_heeq = convert_skycoords_to_heeq(observers[0]["coordinate"])
+    notes = [observer["notes"] for observer in observers]
+    if system == CoordinateSystem.Stonyhurst:
+        longitude, latitude = _stonyhurst_degrees(coord1, coord2, units)
+        return _generate_results([observer_heeq] * len(events), latitude, longitude, dates, notes)
+    # The observer is at its own obstime, which sunpy can't broadcast to the
+    # events' obstimes unless the observer has the events' shape.
+    observer = np.broadcast_to(observers[0]["coordinate"].frame, dates.shape)
+    event_coord_projective = SkyCoord(coord1, coord2, unit=units, obstime=dates, observer=observer, frame=sunpy.coordinates.Helioprojective)
+    event_stonyhurst = event_coord_projective.transform_to(sunpy.coordinates.HeliographicStonyhurst)
+    return _generate_results([observer_heeq] * len(events), event_stonyhurst.lat.deg, event_stonyhurst.lon.deg, dates, notes)
+
+def _earth_heeqs(dates) -> list[Coordinate]:
+    return [Coordinate(x=x, y=y, z=z) for x, y, z in earth_position(dates).T.tolist()]
+
 # All args set will be passed as keyword args to main
 def main(coordinate_system, coord1, coord2, coord3, date, observatory, units):
     print(get_event_coordinates(coordinate_system, coord1, coord2, coord3, date, observatory, units))
@@ -0,0 +1,225 @@
+"""
+Cache of immutable values stored as files in a shared directory.
+
+Put the directory on a tmpfs like /dev/shm and every worker process on the
+host maps the same pages, so each value is held in memory once per host
+instead of once per worker, and lookups don't take any lock. Hosts without
+/dev/shm, like macOS, default to the temporary directory instead. Values can't
+change after they're written, so keys should identify the content, for
+example a path and its modification time.
+
+Each file's modification time is its last access time. When the cache is
+over its size limit, the least recently used files are removed. Hit and miss
+counts are kept in memory and added to a counters file shared by all workers
+at most every `_FLUSH_SECONDS`.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# Maximum seconds that lookups' counters are held in memory
+_FLUSH_SECONDS = 5
+# Access times are only updated when they're older than this
+_TOUCH_SECONDS = 5
+
+# hits, misses, evictions
+_COUNTERS = struct.Struct("<QQQ")
+_COUNTERS_FILE = "counters"
+_ENTRY_SUFFIX = ".entry"
+# Default parent directory of caches, used when it exists
+_SHARED_MEMORY = "/dev/shm"
+
+# All caches created by the application, layout is name: FileCache
+_caches = {}
+
+class FileCache:
+    def __init__(self, name: str, max_bytes: int, path: str = None):
+        """
+        Parameters
+        ----------
+        name: `str`
+            Unique name for this cache.
+        max_bytes: `int`
+            Maximum total size of values before entries are evicted.
+        path: `str`
+            Directory to store values in, created if it doesn't exist.
+            Defaults to a directory named after the cache in /dev/shm, or in
+            the temporary directory if there is no /dev/shm.
+        """
+        self.name = name
+        self.max_bytes = max_bytes
+        parent = _SHARED_MEMORY if os.path.isdir(_SHARED_MEMORY) else tempfile.gettempdir()
+        self.path = path or os.path.join(parent, f"helios_{name}_cache")
+        os.makedirs(self.path, exist_ok=True)
+        self._counters_path = os.path.join(self.path, _COUNTERS_FILE)
+        # Counters recorded by lookups that haven't been written yet
+        self._pending_lock = threading.Lock()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._flushed_at = time.monotonic()
+        _caches[name] = self
+
+    def _EntryPath(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + _ENTRY_SUFFIX)
+
+    def _Read(self, key: str) -> mmap.mmap | bytes | None:
+        path = self._EntryPath(key)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            stat = os.fstat(fd)
+            # Empty files can't be mapped
+            value = mmap.mmap(fd, stat.st_size, access=mmap.ACCESS_READ) if stat.st_size > 0 else b""
+            if time.time() - stat.st_mtime > _TOUCH_SECONDS:
+                try:
+                    os.utime(fd)
+                except OSError:
+                    # Evicted by another worker, the value is still mapped
+                    pass
+            return value
+        finally:
+            os.close(fd)
+
+    def Get(self, key: str) -> mmap.mmap | bytes | None:
+        """
+        Returns the cached value for the given key mapped read only,
+        or None if it isn't cached.
+        """
+        return self.GetMany([key]).get(key)
+
+    def GetMany(self, keys: list[str]) -> dict[str, mmap.mmap | bytes]:
+        """
+        Returns a dict of the cached values for the given keys, mapped read only.
+        Keys that aren't cached are left out of the result.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for key in keys:
+            value = self._Read(key)
+            if value is not None:
+                found[key] = value
+        with self._pending_lock:
+            self._pending_hits += len(found)
+            self._pending_misses += len(keys) - len(found)
+        if time.monotonic() - self._flushed_at >= _FLUSH_SECONDS:
+            self._UpdateCounters()
+        return found
+
+    def _UpdateCounters(self, evictions: int = 0, reset: bool = False) -> tuple[int, int, int]:
+        """
+        Adds this worker's pending counts to the shared counters and returns them
+        """
+        with self._pending_lock:
+            hits, misses = self._pending_hits, self._pending_misses
+            self._pending_hits, self._pending_misses = 0, 0
+            self._flushed_at = time.monotonic()
+        fd = os.open(self._counters_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, _COUNTERS.size, 0)
+            counters = _COUNTERS.unpack(data) if len(data) == _COUNTERS.size and not reset else (0, 0, 0)
+            counters = (counters[0] + hits, counters[1] + misses, counters[2] + evictions)
+            os.pwrite(fd, _COUNTERS.pack(*counters), 0)
+            return counters
+        finally:
+            os.close(fd)
+
+    def Put(self, key: str, value: bytes):
+        """
+        Stores a value in the cache
+        """
+        self.PutMany({key: value})
+
+    def PutMany(self, items: dict[str, bytes]):
+        """
+        Stores all the given key/value pairs in the cache.
+        Values that don't fit in the directory's filesystem aren't cached.
+        """
+        for key, value in items.items():
+            path = self._EntryPath(key)
+            # Written to a temporary file first so readers never see a partial value
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "wb") as fp:
+                    fp.write(value)
+                os.replace(tmp, path)
+            except OSError as e:
+                logging.warning(f"Failed to store {key} in {self.name} cache: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        self._Evict()
+
+    def _Entries(self) -> list[tuple[str, os.stat_result]]:
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    try:
+                        entries.append((entry.path, entry.stat()))
+                    except FileNotFoundError:
+                        pass
+        return entries
+
+    def _Evict(self):
+        """
+        Removes the least recently used entries until the cache fits within max_bytes
+        """
+        entries = self._Entries()
+        total = sum(stat.st_size for _, stat in entries)
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                # Another worker evicted it first
+                pass
+            total -= stat.st_size
+        self._UpdateCounters(evicted)
+
+    def Stats(self) -> dict:
+        """
+        Returns this cache's counters, shared by all workers. Lookups in
+        other workers are counted within `_FLUSH_SECONDS`.
+        """
+        hits, misses, evictions = self._UpdateCounters()
+        entries = self._Entries()
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups > 0 else 0,
+            "evictions": evictions,
+            "bytes": sum(stat.st_size for _, stat in entries),
+            "max_bytes": self.max_bytes,
+            "entries": len(entries)
+        }
+
+    def Clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        for path, _ in self._Entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._UpdateCounters(reset=True)
+
+def Stats() -> dict:
+    """
+    Returns the counters for every cache, keyed by cache name.
+    """
+    return {name: cache.Stats() for name, cache in _caches.items()}
@@ -1,12 +1,12 @@
 from argparse import ArgumentParser
 
+import numpy as np
 from pydantic import BaseModel
 from sunpy.map import Map
-import sunpy.coordinates
-from sunpy.coordinates import transform_with_sun_center
-import astropy.units as u
 
 import jp2parser
+# REFERENCE_POINT lives with the conversion engine, it is re-exported here.
+from helios_frame import REFERENCE_POINT, skycoord_to_helios, skycoord_to_helios_astropy
 
 PROGRAM_DESCRIPTION = "Extract observer's HEEQ coordinates from a jp2 file via sunpy"
 
@@ -15,8 +15,6 @@ PROGRAM_ARGS = [
     (['jp2'], {'type': str, 'help': 'JP2 file to extract coordinates from'})
 ]
 
-REFERENCE_POINT = sunpy.coordinates.get_earth("2018-08-11 00:00:00")
-
 class Coordinate(BaseModel):
     """
     A coordinate to be used with the Helios web application. This coordinate
@@ -72,14 +70,36 @@ def get_heeq_coordinates_from_jp2(jp2_map: Map):
 
 
 def convert_skycoords_to_heeq(base_coords) -> Coordinate:
-    with transform_with_sun_center():
-        coords = base_coords.transform_to(REFERENCE_POINT)
-        coords.representation_type="cartesian"
-        return Coordinate(
-            x=coords.x.to(u.solRad).value,
-            y=coords.y.to(u.solRad).value,
-            z=coords.z.to(u.solRad).value
-        )
+    x, y, z = convert_skycoords_to_heeq_array(base_coords).reshape(3)
+    return Coordinate(x=x, y=y, z=z)
+
+def convert_skycoords_to_heeq_array(base_coords, use_astropy: bool = False) -> np.ndarray:
+    """
+    Transforms all coordinates in the given SkyCoord to the Helios reference
+    frame in one vectorized call.
+
+    Parameters
+    ----------
+    base_coords: `SkyCoord`
+        Scalar or array SkyCoord to transform.
+    use_astropy: `bool`
+        Run the transformation through astropy's frame graph instead of the
+        precomputed rotations in `helios_frame`. Used to validate the results.
+
+    Returns
+    -------
+    `np.ndarray` with shape (3, ...) holding x, y, and z in solar radii.
+    """
+    if use_astropy:
+        return skycoord_to_helios_astropy(base_coords)
+    return skycoord_to_helios(base_coords)
+
+def heeq_array_to_list(xyz: np.ndarray) -> list[dict]:
+    """
+    Converts the output of `convert_skycoords_to_heeq_array` into a list of
+    json serializable {x, y, z} dicts.
+    """
+    return [{"x": x, "y": y, "z": z} for x, y, z in np.reshape(xyz, (3, -1)).T.tolist()]
 
 #######################
 # Template code below #
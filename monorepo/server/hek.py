@@ -2,7 +2,11 @@
 # Without passing this to argparse, it will print PROGRAM_DESCRIPTION to stdout all on one line even if it has newline characters.
 from argparse import RawTextHelpFormatter
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from astropy.time import Time
 from sunpy.net import attrs as a, Fido
+import conf
 
 # This is passed to ArgumentParser's "description."
 # It is the information printed before the accepted arguments when you run the script with "-h/--help"
@@ -16,9 +20,50 @@ PROGRAM_ARGS = [
     (["end_time"], {'type': str, 'help': "End of time range to query"}),
 ]
 
-def query_hek(start_time, end_time):
+# Long time ranges are split into queries of at most this size, which are
+# run concurrently. Shared by all requests so the number of concurrent HEK
+# queries stays bounded.
+_MAX_WINDOW = timedelta(hours=float(conf.get("hek", "max_window_hours", "6")))
+_pool = ThreadPoolExecutor(max_workers=int(conf.get("hek", "max_concurrent_queries", "4")), thread_name_prefix="hek_query")
+
+def _search(start_time, end_time):
     return Fido.search(a.Time(start_time, end_time), a.hek.EventType("**"))[0]
 
+def _split(start_time, end_time) -> list:
+    """
+    Splits the time range into sub-ranges no longer than _MAX_WINDOW
+    """
+    start = Time(start_time).to_datetime()
+    end = Time(end_time).to_datetime()
+    ranges = []
+    while start + _MAX_WINDOW < end:
+        ranges.append((start, start + _MAX_WINDOW))
+        start += _MAX_WINDOW
+    ranges.append((start, end))
+    return ranges
+
+def query_hek(start_time, end_time) -> list:
+    """
+    Returns all HEK events within the time range.
+    Long time ranges are queried as concurrent sub-ranges and merged.
+
+    :param start_time: Beginning of time range to query
+    :type start_time: str, datetime
+    :param end_time: End of time range to query
+    :type end_time: str, datetime
+    :return: The events as HEK table rows, without duplicates
+    """
+    ranges = _split(start_time, end_time)
+    if len(ranges) == 1:
+        return list(_search(*ranges[0]))
+    tables = _pool.map(lambda sub_range: _search(*sub_range), ranges)
+    # Events that span sub-ranges are returned by each of them
+    events = {}
+    for table in tables:
+        for event in table:
+            events.setdefault(str(event["kb_archivid"]), event)
+    return list(events.values())
+
 # All args passed in will be passed as keyword args to main.
 def main(start_time, end_time):
     results = query_hek(start_time, end_time)
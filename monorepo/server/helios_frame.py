@@ -0,0 +1,245 @@
+"""
+Fast conversions into the Helios reference frame.
+
+The Helios frame is the HeliographicStonyhurst frame of `REFERENCE_POINT`
+with the sun kept at the origin. Since every frame we receive coordinates in
+is also centered on the sun, converting into the Helios frame is a rotation.
+
+- HCRS is fixed in space, so its rotation into the Helios frame is computed
+  once at import.
+- HeliographicStonyhurst shares its Z axis (the sun's rotation axis) with the
+  Helios frame. Its X axis follows the earth, so a coordinate observed at time
+  t is rotated about Z by the earth's Helios longitude at time t.
+
+Any other frame falls back to astropy's transformation graph.
+
+The earth's position is needed for nearly every conversion, so it is
+tabulated at a fixed cadence from `EARTH_TABLE_START` until a margin past
+the present and interpolated. The table is filled in blocks the first time
+each block is used.
+"""
+import threading
+
+import erfa
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+from astropy.coordinates import SkyCoord, CartesianRepresentation, HCRS
+import sunpy.coordinates
+from sunpy.coordinates import HeliographicStonyhurst, transform_with_sun_center
+
+REFERENCE_POINT = sunpy.coordinates.get_earth("2018-08-11 00:00:00")
+
+def _rotation_matrix(frame) -> np.ndarray:
+    """
+    Computes the rotation matrix from the given (sun centered, time
+    independent) frame into the Helios frame by transforming its basis vectors.
+    """
+    basis = SkyCoord(CartesianRepresentation(np.eye(3) * u.AU), frame=frame)
+    with transform_with_sun_center():
+        return basis.transform_to(REFERENCE_POINT).cartesian.xyz.to_value(u.AU)
+
+_HCRS_TO_HELIOS = _rotation_matrix(HCRS(obstime=REFERENCE_POINT.obstime))
+
+_AU_TO_SOLRAD = (1 * u.AU).to_value(u.solRad)
+
+EARTH_TABLE_START = Time("1995-01-01 00:00:00")
+# Spacing (in days) between tabulated earth positions. The cubic interpolation
+# between them is accurate to about 1e-8 solar radii.
+_EARTH_TABLE_STEP = 0.25
+# Days past the present to include in the table
+_EARTH_TABLE_MARGIN = 2 * 365
+# Number of positions computed at once when the table is filled
+_EARTH_TABLE_BLOCK = 256
+
+def _earth_position_exact(jd1: np.ndarray, jd2: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the earth's Helios frame position in solar radii at the given
+    two part julian dates.
+    """
+    # This is the same ephemeris astropy uses for get_body_barycentric, but
+    # epv00 also returns the heliocentric position directly, which saves
+    # computing the sun's position.
+    earth_helio, _ = erfa.epv00(jd1, jd2)
+    return _HCRS_TO_HELIOS @ earth_helio['p'].T * _AU_TO_SOLRAD
+
+class _EarthTable:
+    def __init__(self, start: Time, step: float, end: Time):
+        self.start = start.tt.jd1 + start.tt.jd2
+        self.step = step
+        blocks = int(np.ceil((end.tt.jd - self.start) / step / _EARTH_TABLE_BLOCK))
+        self.positions = np.empty((3, blocks * _EARTH_TABLE_BLOCK))
+        self.ready = np.zeros(blocks, dtype=bool)
+        self.lock = threading.Lock()
+
+    def _fill(self, blocks: np.ndarray):
+        if np.all(self.ready[blocks]):
+            return
+        with self.lock:
+            missing = blocks[~self.ready[blocks]]
+            idx = (missing[:, None] * _EARTH_TABLE_BLOCK + np.arange(_EARTH_TABLE_BLOCK)).ravel()
+            self.positions[:, idx] = _earth_position_exact(np.full(idx.shape, self.start), idx * self.step)
+            self.ready[missing] = True
+
+    def evaluate(self, jd1: np.ndarray, jd2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Interpolates the earth's position at the given TT julian dates.
+
+        Returns
+        -------
+        The positions with shape (3, N), and a mask of which dates were in the
+        table. Positions for dates outside the table are left unset.
+        """
+        offset = ((jd1 - self.start) + jd2) / self.step
+        base = np.floor(offset).astype(int)
+        inside = (base >= 1) & (base < self.positions.shape[1] - 2)
+        result = np.empty((3, len(offset)))
+        if np.any(inside):
+            base = base[inside]
+            t = offset[inside] - base
+            self._fill(np.unique(np.concatenate(((base - 1) // _EARTH_TABLE_BLOCK, (base + 2) // _EARTH_TABLE_BLOCK))))
+            # Cubic Lagrange interpolation through the 4 surrounding positions
+            result[:, inside] = (self.positions[:, base - 1] * (-t * (t - 1) * (t - 2) / 6)
+                                 + self.positions[:, base] * ((t + 1) * (t - 1) * (t - 2) / 2)
+                                 + self.positions[:, base + 1] * (-(t + 1) * t * (t - 2) / 2)
+                                 + self.positions[:, base + 2] * ((t + 1) * t * (t - 1) / 6))
+        return result, inside
+
+_earth_table = _EarthTable(EARTH_TABLE_START, _EARTH_TABLE_STEP, Time.now() + _EARTH_TABLE_MARGIN * u.day)
+
+def earth_position(obstime) -> np.ndarray:
+    """
+    Returns the earth's position in the Helios frame at the given time(s).
+    This matches `sunpy.coordinates.get_earth` converted to the Helios frame.
+
+    Parameters
+    ----------
+    obstime: `Time`
+        Scalar or array of times
+
+    Returns
+    -------
+    `np.ndarray` with shape (3, ...) holding x, y, and z in solar radii.
+    """
+    # The ephemeris expects TDB, but TDB and TT differ by less than 2ms, which
+    # moves the earth by well under a meter. TT is much cheaper to compute.
+    tt = obstime.tt
+    jd1, jd2 = np.ravel(tt.jd1), np.ravel(tt.jd2)
+    result, inside = _earth_table.evaluate(jd1, jd2)
+    if not np.all(inside):
+        result[:, ~inside] = _earth_position_exact(jd1[~inside], jd2[~inside])
+    return result.reshape((3,) + obstime.shape)
+
+def earth_skycoord(obstime) -> SkyCoord:
+    """
+    Returns the earth's position as a HeliographicStonyhurst SkyCoord.
+    Use this in place of `sunpy.coordinates.get_earth`.
+    """
+    x, y, z = earth_position(obstime)
+    radius = np.sqrt(x**2 + y**2 + z**2)
+    # The earth is always at 0 longitude in HeliographicStonyhurst
+    return SkyCoord(np.zeros_like(radius) * u.deg, np.arcsin(z / radius) * u.rad, radius * u.solRad,
+                    frame=HeliographicStonyhurst, obstime=obstime)
+
+def earth_longitude(obstime) -> np.ndarray:
+    """
+    Returns the earth's longitude in the Helios frame at the given time(s).
+    This is the angle between a HeliographicStonyhurst frame at `obstime` and
+    the Helios frame.
+
+    Parameters
+    ----------
+    obstime: `Time`
+        Scalar or array of times
+
+    Returns
+    -------
+    `np.ndarray` of longitudes in radians with the same shape as `obstime`.
+    """
+    x, y, _ = earth_position(obstime)
+    return np.arctan2(y, x)
+
+def earth_latitude(obstime) -> np.ndarray:
+    """
+    Returns the earth's latitude in the Helios frame at the given time(s).
+    HeliographicStonyhurst shares its latitude with the Helios frame, so this
+    is the B0 angle, `sunpy.coordinates.sun.B0`.
+
+    Parameters
+    ----------
+    obstime: `Time`
+        Scalar or array of times
+
+    Returns
+    -------
+    `np.ndarray` of latitudes in radians with the same shape as `obstime`.
+    """
+    x, y, z = earth_position(obstime)
+    return np.arcsin(z / np.sqrt(x**2 + y**2 + z**2))
+
+def hgs_to_helios(xyz: np.ndarray, obstime) -> np.ndarray:
+    """
+    Rotates HeliographicStonyhurst cartesian coordinates into the Helios frame.
+
+    Parameters
+    ----------
+    xyz: `np.ndarray`
+        Array with shape (3, ...) of HGS cartesian coordinates.
+    obstime: `Time`
+        Observation time of the HGS frame. Either scalar or broadcastable
+        against xyz[0].
+    """
+    angle = earth_longitude(obstime)
+    cos, sin = np.cos(angle), np.sin(angle)
+    x, y, z = xyz
+    return np.stack(np.broadcast_arrays(cos * x - sin * y, sin * x + cos * y, z))
+
+def helios_to_hgs(xyz: np.ndarray, obstime) -> np.ndarray:
+    """
+    Inverse of `hgs_to_helios`. Rotates Helios frame cartesian coordinates
+    into a HeliographicStonyhurst frame at `obstime`.
+    """
+    angle = earth_longitude(obstime)
+    cos, sin = np.cos(angle), np.sin(angle)
+    x, y, z = xyz
+    return np.stack(np.broadcast_arrays(cos * x + sin * y, -sin * x + cos * y, z))
+
+def helios_to_hcrs(xyz: np.ndarray) -> np.ndarray:
+    """
+    Rotates Helios frame cartesian coordinates into HCRS (with the sun at the
+    origin).
+    """
+    return np.einsum('ji,j...->i...', _HCRS_TO_HELIOS, xyz)
+
+def skycoord_to_helios(coords: SkyCoord) -> np.ndarray:
+    """
+    Converts the given coordinates into the Helios frame.
+
+    Parameters
+    ----------
+    coords: `SkyCoord`
+        Scalar or array SkyCoord to convert.
+
+    Returns
+    -------
+    `np.ndarray` with shape (3, ...) holding x, y, and z in solar radii.
+    """
+    frame = coords.frame
+    if isinstance(frame, HeliographicStonyhurst):
+        xyz = frame.make_3d().cartesian.xyz.to_value(u.solRad)
+        return hgs_to_helios(xyz, frame.obstime)
+    elif isinstance(frame, HCRS):
+        xyz = frame.cartesian.xyz.to_value(u.solRad)
+        return np.einsum('ij,j...->i...', _HCRS_TO_HELIOS, xyz)
+    else:
+        return skycoord_to_helios_astropy(coords)
+
+def skycoord_to_helios_astropy(coords: SkyCoord) -> np.ndarray:
+    """
+    Converts the given coordinates into the Helios frame using astropy's
+    transformation graph. This is much slower than `skycoord_to_helios`, and
+    is kept to validate the fast path and handle uncommon frames.
+    """
+    with transform_with_sun_center():
+        result = coords.transform_to(REFERENCE_POINT)
+        return result.cartesian.xyz.to_value(u.solRad)
@@ -10,6 +10,7 @@ from routes.common.response import SendResponse
 from routes.common.dates import ParseDate
 from routes import ephemeris as ephemeris_routes
 from routes import events as event_routes
+from routes import metrics as metrics_routes
 
 logging.basicConfig(filename="helios_server.log", level=logging.DEBUG)
 
@@ -37,4 +38,5 @@ def handle_internal_error(e: Exception):
 
 ephemeris_routes.register(app)
 event_routes.register(app)
+metrics_routes.register(app)
 database_endpoints.register(app)
\ No newline at end of file
@@ -6,3 +6,4 @@ class MimeType(Enum):
     """
     JSON = 'application/json'
     Binary = 'application/octet-stream'
+    NDJSON = 'application/x-ndjson'
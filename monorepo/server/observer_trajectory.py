@@ -0,0 +1,99 @@
+"""
+Time series of known observer positions for a single source.
+
+Spacecraft move smoothly, so an observer position at any time between two
+nearby known positions can be interpolated instead of looking up another
+image. Positions are interpolated in the Helios frame, where the motion of
+earth orbiting spacecraft isn't mixed up with the rotating
+HeliographicStonyhurst axes.
+"""
+import threading
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
+from sunpy.coordinates import HeliographicStonyhurst
+
+from helios_frame import skycoord_to_helios, helios_to_hgs
+
+class ObserverTrajectory:
+    def __init__(self, max_gap: float, max_samples: int = 20000):
+        """
+        Parameters
+        ----------
+        max_gap: `float`
+            Seconds between a requested time and the known positions used to
+            answer it. Requests further than this from any known position
+            are misses.
+        max_samples: `int`
+            Maximum number of positions to keep. When exceeded, every other
+            position is dropped.
+        """
+        self.max_gap = max_gap
+        self.max_samples = max_samples
+        # Sorted unix times, Helios frame positions in solar radii with shape
+        # (3, N), and the solar radius in meters of each known position.
+        # Replaced together on every update so readers don't need the lock.
+        self._samples = (np.empty(0), np.empty((3, 0)), np.empty(0))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples[0])
+
+    def Add(self, coordinate: SkyCoord):
+        """
+        Adds known observer positions to the trajectory.
+
+        Parameters
+        ----------
+        coordinate: `SkyCoord`
+            Scalar or array observer coordinate, each with its own obstime
+        """
+        times = np.atleast_1d(coordinate.obstime.unix)
+        positions = skycoord_to_helios(coordinate).reshape(3, -1)
+        rsun = np.broadcast_to(coordinate.frame.rsun.to_value(u.m), times.shape)
+        with self._lock:
+            old_times, old_positions, old_rsun = self._samples
+            times, idx = np.unique(np.concatenate((old_times, times)), return_index=True)
+            positions = np.concatenate((old_positions, positions), axis=1)[:, idx]
+            rsun = np.concatenate((old_rsun, rsun))[idx]
+            if len(times) > self.max_samples:
+                times, positions, rsun = times[::2], positions[:, ::2], rsun[::2]
+            self._samples = (times, positions, rsun)
+
+    def Lookup(self, date) -> SkyCoord | None:
+        """
+        Returns the observer position at the given date, or None if there
+        isn't a known position within max_gap of it.
+
+        When the date is between two known positions within max_gap, the
+        position is interpolated to the requested date. Otherwise the nearest
+        known position is returned as is.
+        """
+        times, positions, rsun = self._samples
+        if len(times) == 0:
+            return None
+        obstime = Time(date)
+        t = obstime.unix
+        right = np.searchsorted(times, t)
+        left = right - 1
+        has_left = left >= 0 and t - times[left] <= self.max_gap
+        has_right = right < len(times) and times[right] - t <= self.max_gap
+        if has_left and has_right:
+            weight = (t - times[left]) / (times[right] - times[left])
+            xyz = positions[:, left] * (1 - weight) + positions[:, right] * weight
+            return _HgsCoordinate(xyz, obstime, rsun[left])
+        if not (has_left or has_right):
+            return None
+        nearest = left if has_left else right
+        return _HgsCoordinate(positions[:, nearest], Time(times[nearest], format="unix"), rsun[nearest])
+
+def _HgsCoordinate(xyz: np.ndarray, obstime: Time, rsun: float) -> SkyCoord:
+    """
+    Converts a Helios frame position into a spherical HeliographicStonyhurst SkyCoord
+    """
+    x, y, z = helios_to_hgs(xyz, obstime)
+    radius = np.sqrt(x**2 + y**2 + z**2)
+    return SkyCoord(HeliographicStonyhurst(np.arctan2(y, x) * u.rad, np.arcsin(z / radius) * u.rad, radius * u.solRad,
+                                           obstime=obstime, rsun=rsun * u.m), copy=False)
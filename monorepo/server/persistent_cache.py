@@ -0,0 +1,347 @@
+"""
+Key/value cache stored in a local SQLite database.
+
+The database file is shared by every worker process on the host and survives
+restarts. Each cache has a size limit, when it is exceeded the least recently
+used entries are evicted. Hit, miss, and eviction counters are stored with the
+cache so they reflect all workers.
+
+Lookups are plain reads so they never wait on SQLite's write lock. The access
+times and hit/miss counts they record are kept in memory and written with the
+next `Put`, or at most `_FLUSH_SECONDS` later.
+
+Identical misses from concurrent requests can be coalesced with `Coalesce`, so
+only one of them runs the expensive upstream call while the rest wait for its
+result.
+"""
+from contextlib import contextmanager
+from typing import Callable, Iterable, TypeVar
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import conf
+
+T = TypeVar("T")
+
+# SQLite limits the number of parameters in a single statement
+_CHUNK_SIZE = 500
+
+# Maximum seconds that lookups' access times and counters are held in memory
+_FLUSH_SECONDS = 5
+
+# All caches created by the application, layout is name: PersistentCache
+_caches = {}
+
+def _Chunks(items: list, size: int = _CHUNK_SIZE):
+    for idx in range(0, len(items), size):
+        yield items[idx:idx + size]
+
+class PersistentCache:
+    def __init__(self, name: str, max_bytes: int, path: str = None):
+        """
+        Parameters
+        ----------
+        name: `str`
+            Unique name for this cache. Multiple caches may share a database file.
+        max_bytes: `int`
+            Maximum total size of keys and values before entries are evicted.
+        path: `str`
+            Path to the SQLite database. Defaults to the [cache] path setting.
+        """
+        self.name = name
+        self.max_bytes = max_bytes
+        self.path = path or conf.get("cache", "path", "helios_cache.sqlite")
+        self._local = threading.local()
+        # Access times and counters recorded by lookups that haven't been written yet
+        self._pending_lock = threading.Lock()
+        self._pending_accessed = {}
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._flushed_at = time.monotonic()
+        self._CreateTables()
+        _caches[name] = self
+
+    def _Connection(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection to the database.
+        Connections can't be shared across threads or forked processes.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            # Autocommit mode, transactions are started explicitly.
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _CreateTables(self):
+        db = self._Connection()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                cache TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                expires REAL,
+                PRIMARY KEY (cache, key)
+            );
+            CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (cache, accessed);
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                cache TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                evictions INTEGER NOT NULL DEFAULT 0,
+                coalesced INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                entries INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS cache_leases (
+                cache TEXT NOT NULL,
+                key TEXT NOT NULL,
+                expires REAL NOT NULL,
+                PRIMARY KEY (cache, key)
+            );
+        """)
+        db.execute("INSERT OR IGNORE INTO cache_stats (cache) VALUES (?)", (self.name,))
+
+    @contextmanager
+    def _Transaction(self):
+        """
+        Runs the body of the with statement in a write transaction.
+        The transaction is committed on exit or rolled back on error.
+        """
+        db = self._Connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def Get(self, key: str) -> bytes | None:
+        """
+        Returns the cached value for the given key, or None if it isn't cached.
+        """
+        return self.GetMany([key]).get(key)
+
+    def GetMany(self, keys: Iterable[str], record: bool = True) -> dict[str, bytes]:
+        """
+        Returns a dict of the cached values for the given keys.
+        Keys that aren't cached are left out of the result.
+
+        Parameters
+        ----------
+        keys: `Iterable[str]`
+            Keys to look up
+        record: `bool`
+            Count this lookup in the hit/miss counters
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        db = self._Connection()
+        for chunk in _Chunks(keys):
+            rows = db.execute(
+                f"SELECT key, value FROM cache_entries WHERE cache = ? AND key IN ({','.join('?' * len(chunk))}) AND (expires IS NULL OR expires > ?)",
+                (self.name, *chunk, now))
+            found.update(rows)
+        with self._pending_lock:
+            self._pending_accessed.update((key, now) for key in found)
+            if record:
+                self._pending_hits += len(found)
+                self._pending_misses += len(keys) - len(found)
+        if time.monotonic() - self._flushed_at >= _FLUSH_SECONDS:
+            with self._Transaction() as db:
+                self._Flush(db)
+        return found
+
+    def _Flush(self, db: sqlite3.Connection):
+        """
+        Writes the access times and counters recorded by lookups
+        """
+        with self._pending_lock:
+            accessed, hits, misses = self._pending_accessed, self._pending_hits, self._pending_misses
+            self._pending_accessed, self._pending_hits, self._pending_misses = {}, 0, 0
+            self._flushed_at = time.monotonic()
+        db.executemany("UPDATE cache_entries SET accessed = MAX(accessed, ?) WHERE cache = ? AND key = ?",
+                       [(accessed_at, self.name, key) for key, accessed_at in accessed.items()])
+        if hits > 0 or misses > 0:
+            db.execute("UPDATE cache_stats SET hits = hits + ?, misses = misses + ? WHERE cache = ?", (hits, misses, self.name))
+
+    def Put(self, key: str, value: bytes, ttl: float = None):
+        """
+        Stores a value in the cache.
+
+        Parameters
+        ----------
+        key: `str`
+            Key to store the value under
+        value: `bytes`
+            Value to store
+        ttl: `float`
+            Seconds until the value expires. None means it never expires.
+        """
+        self.PutMany({key: value}, ttl)
+
+    def PutMany(self, items: dict[str, bytes], ttl: float = None):
+        """
+        Stores all the given key/value pairs in the cache.
+        See `Put` for parameter details.
+        """
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        with self._Transaction() as db:
+            keys = list(items.keys())
+            replaced_bytes = 0
+            replaced_count = 0
+            for chunk in _Chunks(keys):
+                size, count = db.execute(
+                    f"SELECT COALESCE(SUM(size), 0), COUNT(*) FROM cache_entries WHERE cache = ? AND key IN ({','.join('?' * len(chunk))})",
+                    (self.name, *chunk)).fetchone()
+                replaced_bytes += size
+                replaced_count += count
+            rows = [(self.name, key, value, len(key) + len(value), now, expires) for key, value in items.items()]
+            db.executemany("INSERT OR REPLACE INTO cache_entries (cache, key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added_bytes = sum(row[3] for row in rows) - replaced_bytes
+            db.execute("UPDATE cache_stats SET bytes = bytes + ?, entries = entries + ? WHERE cache = ?",
+                       (added_bytes, len(rows) - replaced_count, self.name))
+            # So eviction sees this worker's latest lookups
+            self._Flush(db)
+            self._Evict(db, now)
+
+    def _Evict(self, db: sqlite3.Connection, now: float):
+        """
+        Removes expired entries, then least recently used entries until the
+        cache fits within max_bytes.
+        """
+        total, = db.execute("SELECT bytes FROM cache_stats WHERE cache = ?", (self.name,)).fetchone()
+        if total <= self.max_bytes:
+            return
+        expired = db.execute("SELECT key, size FROM cache_entries WHERE cache = ? AND expires <= ?", (self.name, now)).fetchall()
+        self._Delete(db, expired)
+        total -= sum(size for _, size in expired)
+        while total > self.max_bytes:
+            oldest = db.execute("SELECT key, size FROM cache_entries WHERE cache = ? ORDER BY accessed LIMIT 100", (self.name,)).fetchall()
+            if len(oldest) == 0:
+                break
+            # Only evict as many as needed to get under the limit
+            evict = []
+            for key, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                evict.append((key, size))
+                total -= size
+            self._Delete(db, evict)
+
+    def _Delete(self, db: sqlite3.Connection, entries: list[tuple[str, int]]):
+        if len(entries) == 0:
+            return
+        db.executemany("DELETE FROM cache_entries WHERE cache = ? AND key = ?", [(self.name, key) for key, _ in entries])
+        db.execute("UPDATE cache_stats SET bytes = bytes - ?, entries = entries - ?, evictions = evictions + ? WHERE cache = ?",
+                   (sum(size for _, size in entries), len(entries), len(entries), self.name))
+
+    def Coalesce(self, key: str, compute: Callable[[], T], ready: Callable[[], T | None], timeout: float = 60) -> T:
+        """
+        Runs `compute` unless an identical computation is already running in
+        any thread or worker, in which case this waits for it to finish.
+
+        Parameters
+        ----------
+        key: `str`
+            Identifies the computation. Calls with the same key are coalesced.
+        compute: `Callable[[], T]`
+            Does the upstream work and stores the result in the cache.
+        ready: `Callable[[], T | None]`
+            Reads the result of `compute` from the cache, or returns None if
+            it's not there yet.
+        timeout: `float`
+            Maximum seconds to wait for another worker's computation before
+            running `compute` anyway.
+        """
+        if self._AcquireLease(key, timeout):
+            try:
+                # Another computation may have finished between this
+                # request's cache miss and taking the lease
+                result = ready()
+                if result is not None:
+                    return result
+                return compute()
+            finally:
+                self._ReleaseLease(key)
+        with self._Transaction() as db:
+            db.execute("UPDATE cache_stats SET coalesced = coalesced + 1 WHERE cache = ?", (self.name,))
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            result = ready()
+            if result is not None:
+                return result
+            if not self._LeaseActive(key):
+                break
+        # The other computation failed or took too long
+        result = ready()
+        if result is not None:
+            return result
+        logging.warning(f"Coalesced request {key} in {self.name} cache was not completed, computing it again")
+        return compute()
+
+    def _AcquireLease(self, key: str, timeout: float) -> bool:
+        now = time.time()
+        with self._Transaction() as db:
+            db.execute("DELETE FROM cache_leases WHERE cache = ? AND key = ? AND expires <= ?", (self.name, key, now))
+            cursor = db.execute("INSERT OR IGNORE INTO cache_leases (cache, key, expires) VALUES (?, ?, ?)", (self.name, key, now + timeout))
+            return cursor.rowcount == 1
+
+    def _ReleaseLease(self, key: str):
+        with self._Transaction() as db:
+            db.execute("DELETE FROM cache_leases WHERE cache = ? AND key = ?", (self.name, key))
+
+    def _LeaseActive(self, key: str) -> bool:
+        row = self._Connection().execute("SELECT 1 FROM cache_leases WHERE cache = ? AND key = ? AND expires > ?",
+                                         (self.name, key, time.time())).fetchone()
+        return row is not None
+
+    def Stats(self) -> dict:
+        """
+        Returns this cache's counters, shared by all workers. Lookups in
+        other workers are counted within `_FLUSH_SECONDS`.
+        """
+        with self._Transaction() as db:
+            self._Flush(db)
+        row = self._Connection().execute("SELECT hits, misses, evictions, coalesced, bytes, entries FROM cache_stats WHERE cache = ?",
+                                         (self.name,)).fetchone()
+        hits, misses, evictions, coalesced, size, entries = row
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups > 0 else 0,
+            "evictions": evictions,
+            "coalesced": coalesced,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "entries": entries
+        }
+
+    def Clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        with self._Transaction() as db:
+            self._Flush(db)
+            db.execute("DELETE FROM cache_entries WHERE cache = ?", (self.name,))
+            db.execute("DELETE FROM cache_leases WHERE cache = ?", (self.name,))
+            db.execute("UPDATE cache_stats SET hits = 0, misses = 0, evictions = 0, coalesced = 0, bytes = 0, entries = 0 WHERE cache = ?", (self.name,))
+
+def Stats() -> dict:
+    """
+    Returns the counters for every cache, keyed by cache name.
+    """
+    return {name: cache.Stats() for name, cache in _caches.items()}
@@ -0,0 +1,89 @@
+"""
+Packed binary encoding for coordinate responses.
+
+JSON stays the default. A client may request the binary format with the
+`format` query parameter (float32 or float64), or by sending
+`Accept: application/octet-stream`, which selects float32.
+
+The binary response is gzipped and laid out as a 32 byte little-endian header
+followed by the positions:
+
+| Offset | Type       | Description                                           |
+|--------|------------|-------------------------------------------------------|
+| 0      | 4 bytes    | Magic bytes "HLCS"                                    |
+| 4      | uint8      | Format version, currently 1                           |
+| 5      | uint8      | Bytes per value, 4 for float32 or 8 for float64       |
+| 6      | uint16     | Reserved                                              |
+| 8      | uint32     | Number of positions                                   |
+| 12     | uint32     | Reserved                                              |
+| 16     | float64    | Unix time of the first position, NaN if not a range   |
+| 24     | float64    | Seconds between positions, 0 if not a range           |
+| 32     | float[N*3] | x, y, z of each position in solar radii               |
+
+The header is a multiple of 8 bytes so the positions can be read directly
+into a Float32Array or Float64Array.
+"""
+from typing import Literal
+import gzip
+import struct
+
+import numpy as np
+from astropy.time import Time
+from flask import request
+from pydantic import BaseModel, Field
+
+from meta.mimetype import MimeType
+from routes.common.response import SendResponse, VaryOnAccept
+
+MAGIC = b"HLCS"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBHIIdd")
+
+DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8")
+}
+
+class FormatQueryParameters(BaseModel):
+    format: Literal["json", "float32", "float64"] | None = Field(
+        default=None,
+        description="Response format. Binary formats are gzipped packed little-endian arrays, see routes/common/coordinates.py for the layout.")
+
+def BinaryFormat(format: str | None) -> np.dtype | None:
+    """
+    Returns the dtype to pack coordinates with, or None if the response
+    should be JSON. An explicit format takes priority over the Accept header.
+    """
+    if format is None:
+        VaryOnAccept()
+        if request.accept_mimetypes.best == MimeType.Binary.value:
+            format = "float32"
+    return DTYPES.get(format)
+
+def PackCoordinates(xyz: np.ndarray, dtype: np.dtype, start: Time = None, cadence: float = 0) -> bytes:
+    """
+    Packs coordinates into the binary layout described in this module.
+
+    Parameters
+    ----------
+    xyz: `np.ndarray`
+        Array with shape (3, ...) of positions in solar radii
+    dtype: `np.dtype`
+        Little-endian float dtype to pack the positions with
+    start: `Time`
+        Time of the first position for ranges
+    cadence: `float`
+        Seconds between positions for ranges
+    """
+    positions = np.ascontiguousarray(np.reshape(xyz, (3, -1)).T, dtype=dtype)
+    header = _HEADER.pack(MAGIC, VERSION, dtype.itemsize, 0, len(positions), 0,
+                          float("nan") if start is None else start.unix, cadence)
+    return header + positions.tobytes()
+
+def SendCoordinates(xyz: np.ndarray, dtype: np.dtype, start: Time = None, cadence: float = 0):
+    """
+    Sends coordinates to the user in the gzipped binary format.
+    See `PackCoordinates` for parameter details.
+    """
+    gzipped = gzip.compress(PackCoordinates(xyz, dtype, start, cadence), compresslevel=1)
+    return SendResponse(gzipped, mime=MimeType.Binary)
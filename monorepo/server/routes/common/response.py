@@ -1,10 +1,12 @@
 import json
+from typing import Iterable
 
-from flask import make_response
+from flask import after_this_request, make_response, Response, stream_with_context
 
+from helios_exceptions import HeliosException
 from meta.mimetype import MimeType
 
-def SendResponse(data: bytes | dict, mime: MimeType = MimeType.JSON, status: int = None):
+def SendResponse(data: bytes | dict, mime: MimeType = MimeType.JSON, status: int = None, max_age: int = None):
     """
     Wrap up the given data and send it to the user with the appropriate HTTP status.
 
@@ -26,6 +28,9 @@ def SendResponse(data: bytes | dict, mime: MimeType = MimeType.JSON, status: int
         The MIME type to send with the response. Defaults to 'application/json'
     status: `int | None`
         Optional HTTP status code override
+    max_age: `int | None`
+        Seconds that clients and proxies may cache a successful response.
+        Only use this for responses that never change.
     """
     if data is None:
         data = {"error": "Nothing to return"}
@@ -34,6 +39,7 @@ def SendResponse(data: bytes | dict, mime: MimeType = MimeType.JSON, status: int
         response.mimetype = mime.value
         response.content_encoding = "gzip"
         response.access_control_allow_origin = "*"
+        _SetMaxAge(response, max_age)
         return response
     else:
         response = make_response(json.dumps(data))
@@ -41,5 +47,51 @@ def SendResponse(data: bytes | dict, mime: MimeType = MimeType.JSON, status: int
             response.status_code = status or 400
         response.mimetype = mime.value
         response.access_control_allow_origin = "*"
+        if "error" not in data:
+            _SetMaxAge(response, max_age)
         return response
 
+def _SetMaxAge(response, max_age: int | None):
+    if max_age is not None:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+
+def VaryOnAccept():
+    """
+    Marks the response to the current request as depending on the Accept
+    header, so caches don't send the JSON response to clients that asked for
+    another format or vice versa. Call this whenever the Accept header
+    chooses the response format.
+    """
+    @after_this_request
+    def add_vary(response):
+        response.vary.add("Accept")
+        return response
+
+def SendStream(items: Iterable[dict], mime: MimeType = MimeType.NDJSON):
+    """
+    Streams the given items to the user as newline delimited json. Each item is
+    sent as soon as it's produced, so large results don't need to be held in
+    memory and the user can start processing the first items right away.
+
+    The HTTP status is sent before the items are produced, so a
+    `HeliosException` raised while producing them is sent as a final
+    {"error": ...} line.
+
+    Parameters
+    ----------
+    items: `Iterable[dict]`
+        The items to send. Generators are only consumed as the response is sent.
+    mime: `MimeType`
+        The MIME type to send with the response. Defaults to 'application/x-ndjson'
+    """
+    def generate():
+        try:
+            for item in items:
+                yield json.dumps(item) + "\n"
+        except HeliosException as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+    response = Response(stream_with_context(generate()), mimetype=mime.value)
+    response.access_control_allow_origin = "*"
+    return response
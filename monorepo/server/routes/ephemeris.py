@@ -2,29 +2,68 @@ from datetime import datetime
 
 from flask_openapi3 import OpenAPI
 from pydantic import BaseModel, Field
-import sunpy.coordinates
+from astropy.time import Time
 
 from . import tags as Tags
+from .common.coordinates import FormatQueryParameters, BinaryFormat, SendCoordinates
+from .common.response import SendResponse
 from helios_exceptions import HeliosExceptionResponse
-from get_heeq import Coordinate, convert_skycoords_to_heeq
+from get_heeq import Coordinate
+from helios_frame import earth_position
 import api.ephemeris as ephemeris
 
+# An image's observer position never changes, so clients may keep it for a year
+_OBSERVER_MAX_AGE = 365 * 24 * 60 * 60
+
 class Jp2IdPathParameters(BaseModel):
     id: int = Field(description="Helioviewer JPEG2000 ID.")
 
+class Jp2IdsQueryParameters(BaseModel):
+    ids: list[int] = Field(description="Helioviewer JPEG2000 IDs.", min_length=1, max_length=500)
+
+class ObserverPositionsResponse(BaseModel):
+    positions: dict[int, Coordinate] = Field(description="Observer coordinates keyed by image id")
+    errors: dict[int, str] = Field(description="Reasons that the remaining images couldn't be looked up, keyed by image id")
+
 class EphemerisPathParameters(BaseModel):
-    provider: str = Field(description="One of the ephemeris providers. ['horizons']")
+    provider: str = Field(description="One of the ephemeris providers. ['horizons', 'local']")
     body: str = Field(description="Observatory/Celestial body of interest.")
 
-class EphemerisQueryParameters(BaseModel):
+class EphemerisQueryParameters(FormatQueryParameters):
+    dates: list[datetime] = Field(description="List of dates to return coordinates for.", min_length=1)
+
+class ProviderPathParameters(BaseModel):
+    provider: str = Field(description="One of the ephemeris providers. ['horizons', 'local']")
+
+class BatchQueryParameters(BaseModel):
+    bodies: list[str] = Field(description="Observatories/Celestial bodies of interest.", min_length=1, max_length=32)
     dates: list[datetime] = Field(description="List of dates to return coordinates for.", min_length=1)
 
 class EphemerisResponse(BaseModel):
     positions: list[Coordinate] = Field(description="One coordinate for each date given")
 
+class RangeQueryParameters(FormatQueryParameters):
+    start: datetime = Field(description="First date in the range")
+    end: datetime = Field(description="Last date in the range")
+    cadence: float = Field(description="Seconds between each date", gt=0)
+
+class RangeResponse(BaseModel):
+    start: datetime = Field(description="Date of the first position")
+    cadence: float = Field(description="Seconds between each position")
+    count: int = Field(description="Number of positions. Position i is at start + i * cadence")
+    x: list[float]
+    y: list[float]
+    z: list[float]
+
 class DatePath(BaseModel):
     date: datetime
 
+def _SendRange(dates, cadence: float, xyz, format: str | None):
+    dtype = BinaryFormat(format)
+    if dtype is not None:
+        return SendCoordinates(xyz, dtype, dates[0], cadence)
+    return ephemeris.RangeResponse(dates[0], cadence, xyz)
+
 def register(app: OpenAPI):
     @app.get("/observer/position/<id>",
              operation_id="GetJp2Observer",
@@ -39,7 +78,43 @@ def register(app: OpenAPI):
         Returns the observer position for a specific jpeg2000 image.
         """
         from api.observer_position import get_observer_position
-        return get_observer_position(path.id).model_dump()
+        return SendResponse(get_observer_position(path.id).model_dump(), max_age=_OBSERVER_MAX_AGE)
+
+    @app.get("/observer/positions",
+             operation_id="GetJp2Observers",
+             summary="Get observer coordinates for many images",
+             tags=[Tags.Ephemeris],
+             responses={
+                 200: ObserverPositionsResponse
+             })
+    def positions_from_jp2s(query: Jp2IdsQueryParameters):
+        """
+        Returns the observer position for each of the given jpeg2000 images.
+        Images that haven't been looked up before are looked up concurrently.
+        """
+        from api.observer_position import get_observer_positions
+        positions, errors = get_observer_positions(query.ids)
+        data = {
+            "positions": {id: position.model_dump() for id, position in positions.items()},
+            "errors": {id: str(error) for id, error in errors.items()}
+        }
+        # The response can only be kept if every image was found
+        return SendResponse(data, max_age=_OBSERVER_MAX_AGE if len(errors) == 0 else None)
+
+    @app.get("/ephemeris/<provider>",
+             operation_id="GetBodyPositions",
+             summary="Get coordinates for multiple bodies",
+             tags=[Tags.Ephemeris],
+             responses={
+                 200: {"description": "Object keyed by body, each holding one coordinate for each date given"},
+                 400: HeliosExceptionResponse
+             })
+    def get_batch_positions(path: ProviderPathParameters, query: BatchQueryParameters):
+        """
+        Returns coordinates for each body at each of the given dates.
+        Bodies are queried concurrently.
+        """
+        return ephemeris.GetBodies(path.provider, query.bodies, query.dates)
 
     @app.get("/ephemeris/<provider>/<body>",
              operation_id="GetBodyPosition",
@@ -50,7 +125,42 @@ def register(app: OpenAPI):
                  400: HeliosExceptionResponse
              })
     def get_positions(path: EphemerisPathParameters, query: EphemerisQueryParameters):
-        return ephemeris.Get(path.provider, path.body, query.dates)
+        positions = ephemeris.Get(path.provider, path.body, query.dates)
+        dtype = BinaryFormat(query.format)
+        if dtype is not None:
+            return SendCoordinates(ephemeris.PositionsToArray(positions), dtype)
+        return positions
+
+    @app.get("/ephemeris/<provider>/<body>/range",
+             operation_id="GetBodyPositionRange",
+             summary="Get coordinates over a date range",
+             tags=[Tags.Ephemeris],
+             responses={
+                 200: RangeResponse,
+                 400: HeliosExceptionResponse
+             })
+    def get_position_range(path: EphemerisPathParameters, query: RangeQueryParameters):
+        """
+        Returns coordinates at every `cadence` seconds from start to end.
+        """
+        dates, xyz = ephemeris.GetRange(path.provider, path.body, query.start, query.end, query.cadence)
+        return _SendRange(dates, query.cadence, xyz, query.format)
+
+    @app.get("/earth/range",
+             operation_id="GetEarthPositionRange",
+             summary="Get earth's coordinates over a date range",
+             tags=[Tags.Ephemeris],
+             responses={
+                 200: RangeResponse,
+                 400: HeliosExceptionResponse
+             })
+    def get_earth_range(query: RangeQueryParameters):
+        """
+        Returns earth's coordinates at every `cadence` seconds from start to end.
+        """
+        dates = ephemeris.DateRange(query.start, query.end, query.cadence)
+        xyz = earth_position(dates)
+        return _SendRange(dates, query.cadence, xyz, query.format)
 
     @app.get("/earth/<date>",
              operation_id="GetEarthPosition",
@@ -59,6 +169,10 @@ def register(app: OpenAPI):
              responses={
                  200: Coordinate
              })
-    def get_earth(path: DatePath):
-        data = convert_skycoords_to_heeq(sunpy.coordinates.get_earth(path.date))
-        return data.model_dump()
\ No newline at end of file
+    def get_earth(path: DatePath, query: FormatQueryParameters):
+        xyz = earth_position(Time(path.date))
+        dtype = BinaryFormat(query.format)
+        if dtype is not None:
+            return SendCoordinates(xyz, dtype)
+        x, y, z = xyz.tolist()
+        return Coordinate(x=x, y=y, z=z).model_dump()
\ No newline at end of file
@@ -1,15 +1,28 @@
 from datetime import datetime
+from typing import Literal
 
+from flask import request
 from flask_openapi3 import OpenAPI
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from helios_exceptions import HeliosExceptionResponse
 
-from api.events import Event
+from api.events import Event, COMPACT_FIELDS
+from meta.mimetype import MimeType
 from routes import tags as Tags
+from routes.common.response import SendStream, VaryOnAccept
 
 class EventLookupPathParameters(BaseModel):
     start: datetime
     end: datetime
+    # Optional lists must be plain lists for flask_openapi3 to read repeated query parameters
+    types: list[str] = Field(default=[], description="HEK event types to return (i.e. FL, AR). Defaults to all types.")
+    fields: list[str] = Field(default=[], description="vo_event fields to return. Overrides profile.")
+    profile: Literal["compact", "full"] = Field(
+        default="compact",
+        description="Set of vo_event fields to return. compact returns the fields that describe the event's type, time, and position, full returns every HEK field.")
+    format: Literal["json", "ndjson"] | None = Field(
+        default=None,
+        description="Response format. ndjson streams one Event per line as soon as each is ready, in no particular order. Also selected by `Accept: application/x-ndjson`.")
 
 class EventResponse(BaseModel):
     results: list[Event]
@@ -26,7 +39,19 @@ def register(app: OpenAPI):
     def get_events(query: EventLookupPathParameters):
         start = query.start
         end = query.end
+        types = query.types or None
+        fields = query.fields or None
+        if fields is None and query.profile == "compact":
+            fields = COMPACT_FIELDS
+
+        if query.format is None:
+            VaryOnAccept()
+        stream = query.format == "ndjson" or (query.format is None and request.accept_mimetypes.best == MimeType.NDJSON.value)
+        if stream:
+            from api.events import iter_hek_events, project_vo_event
+            events = iter_hek_events(start, end, types)
+            return SendStream({"vo_event": project_vo_event(event.vo_event, fields), "coordinates": event.coordinates} for event in events)
 
         from api.events import lookup_hek_events
-        events = lookup_hek_events(start, end)
+        events = lookup_hek_events(start, end, types, fields)
         return EventResponse(results=events['results']).model_dump()
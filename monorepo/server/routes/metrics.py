@@ -0,0 +1,17 @@
+from flask_openapi3 import OpenAPI
+
+from . import tags as Tags
+import persistent_cache
+import file_cache
+
+def register(app: OpenAPI):
+    @app.get("/metrics/cache",
+             operation_id="GetCacheMetrics",
+             summary="Get cache counters",
+             tags=[Tags.Metrics])
+    def cache_metrics():
+        """
+        Returns hit, miss, eviction, and coalescing counters for each server
+        side cache. Counters are shared by all workers.
+        """
+        return {**persistent_cache.Stats(), **file_cache.Stats()}
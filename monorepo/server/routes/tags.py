@@ -7,4 +7,5 @@ from flask_openapi3 import Tag
 Ephemeris = Tag(name="Ephemeris", description="Coordinates for observatories and celestial bodies")
 Event = Tag(name="Events", description="Heliophysics Event Data")
 Scene = Tag(name="Scene", description="For sharing saved scenes")
-PFSS  = Tag(name="Data", description="Potential Field Source Surface data")
\ No newline at end of file
+PFSS  = Tag(name="Data", description="Potential Field Source Surface data")
+Metrics = Tag(name="Metrics", description="Server health and performance counters")
\ No newline at end of file
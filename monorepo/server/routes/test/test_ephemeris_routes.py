@@ -1,9 +1,20 @@
+import gzip
 import json
+import threading
+
+import numpy as np
 import pytest
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import HeliographicStonyhurst
 
 from main import app
 
+import api.ephemeris as ephemeris
+import api.observer_position as observer_position
 from api.ephemeris.horizons import Horizons
+from helios_exceptions import HeliosException
+from persistent_cache import PersistentCache
+from routes.common.coordinates import MAGIC
 
 @pytest.fixture
 def client():
@@ -24,6 +35,37 @@ def test_observer_position_invalid_id(client):
     data = json.loads(response.data)
     assert "Couldn't find image" in data["error"]
 
+def test_observer_positions_cached(client, monkeypatch, tmp_path):
+    lookups = []
+    def fake_lookup(ids):
+        lookups.append(ids)
+        return [HeliosException(f"Couldn't find image with id {id}") if id == 0 else
+                SkyCoord(0, 0, 215, unit="deg,deg,solRad", frame=HeliographicStonyhurst, obstime="2023-01-01") for id in ids]
+    monkeypatch.setattr(observer_position, "get_observer_coordinates_by_id", fake_lookup)
+    monkeypatch.setattr(observer_position, "_CACHE", PersistentCache("jp2_observer", 10000, str(tmp_path / "cache.sqlite")))
+
+    response = client.get("/observer/positions?ids=1&ids=2&ids=1&ids=0")
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert list(data["positions"].keys()) == ["1", "2"]
+    position = data["positions"]["1"]
+    assert np.linalg.norm([position["x"], position["y"], position["z"]]) == pytest.approx(215)
+    assert "Couldn't find image" in data["errors"]["0"]
+    # Missing images mean the response may change
+    assert response.cache_control.max_age is None
+
+    response = client.get("/observer/positions?ids=2&ids=3")
+    assert response.status_code == 200
+    assert list(json.loads(response.data)["positions"].keys()) == ["2", "3"]
+    assert response.cache_control.max_age > 0
+    # Cached images aren't looked up again
+    assert lookups == [[1, 2, 0], [3]]
+
+    response = client.get("/observer/position/1")
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    assert lookups == [[1, 2, 0], [3]]
+
 def test_ephemeris_missing_parameters(client):
     response = client.get("/ephemeris/horizons/SDO")
     # 422 for missing dates parameter
@@ -39,6 +81,7 @@ def test_ephemeris_horizons(client, monkeypatch):
     def fake_horizons(*args, **kwargs) -> list[dict]:
         return [{'x': 1, 'y': 2, 'z': 3}]
     monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
 
     horizons_providers = ['Horizons', 'horizons']
     for horizons in horizons_providers:
@@ -48,10 +91,143 @@ def test_ephemeris_horizons(client, monkeypatch):
         assert response.json[0]['y'] == 2
         assert response.json[0]['z'] == 3
 
+def test_ephemeris_cached(client, monkeypatch):
+    calls = []
+    def fake_horizons(body, dates) -> list[dict]:
+        calls.append(dates)
+        return [{'x': idx, 'y': 0, 'z': 0} for idx, _ in enumerate(dates)]
+    monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
+
+    response = client.get("/ephemeris/horizons/SDO?dates=2023-01-01T00:00:00Z")
+    assert response.status_code == 200
+    # Only the uncached dates are queried
+    response = client.get("/ephemeris/horizons/SDO?dates=2023-01-01T00:00:00.0001Z&dates=2023-01-01T00:00:10Z&dates=2023-01-02T00:00:00Z")
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert [date.isoformat() for date in calls[1]] == ["2023-01-01T00:00:10", "2023-01-02T00:00:00"]
+    assert [position['x'] for position in response.json] == [0, 0, 1]
+    assert ephemeris.CacheStats()["hits"] == 1
+    # Dates off the cache's grid are cached exactly
+    response = client.get("/ephemeris/horizons/SDO?dates=2023-01-01T00:00:10Z")
+    assert len(calls) == 2
+    assert response.json[0]['x'] == 0
+
+def test_ephemeris_batch(client, monkeypatch):
+    # Bodies are queried concurrently, so every query waits here until all
+    # three are in flight. Sequential queries would break the barrier.
+    barrier = threading.Barrier(3, timeout=10)
+    def fake_horizons(body, dates) -> list[dict]:
+        barrier.wait()
+        return [{'x': len(body), 'y': idx, 'z': 0} for idx, _ in enumerate(dates)]
+    monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
+
+    response = client.get("/ephemeris/horizons?bodies=SDO&bodies=STEREO-A&bodies=SOHO&dates=2023-01-01T00:00:00Z&dates=2023-01-02T00:00:00Z")
+    assert response.status_code == 200
+    assert set(response.json.keys()) == {"SDO", "STEREO-A", "SOHO"}
+    assert response.json["STEREO-A"] == [{'x': 8, 'y': 0, 'z': 0}, {'x': 8, 'y': 1, 'z': 0}]
+
 def test_get_earth(client):
     response = client.get("/earth/2023-01-01 00:00:00")
     data = response.json
     print(data)
     assert data['x'] == pytest.approx(-166.2722)
     assert data['y'] == pytest.approx(130.1701)
-    assert data['z'] == pytest.approx(-10.9540)
\ No newline at end of file
+    assert data['z'] == pytest.approx(-10.9540)
+
+def test_range_finer_than_cache_grid(client, monkeypatch):
+    def fake_horizons(body, dates) -> list[dict]:
+        return [{'x': date.timestamp(), 'y': 0, 'z': 0} for date in dates]
+    monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
+    response = client.get("/ephemeris/horizons/SDO/range?start=2023-01-01T00:00:00Z&end=2023-01-01T00:01:00Z&cadence=10")
+    assert response.status_code == 200
+    # Each date gets its own position instead of the closest minute's
+    assert np.diff(response.json['x']) == pytest.approx([10] * 6)
+
+def test_get_earth_range(client):
+    response = client.get("/earth/range?start=2023-01-01T00:00:00Z&end=2023-01-01T01:00:00Z&cadence=600")
+    data = response.json
+    assert data['count'] == 7
+    assert data['cadence'] == 600
+    assert data['start'] == "2023-01-01T00:00:00.000"
+    # Last position should match the single date endpoint
+    last = client.get("/earth/2023-01-01 01:00:00").json
+    for axis in ['x', 'y', 'z']:
+        assert len(data[axis]) == 7
+        assert data[axis][-1] == pytest.approx(last[axis])
+
+def test_ephemeris_range(client, monkeypatch):
+    requested = []
+    def fake_horizons(body, dates) -> list[dict]:
+        requested.extend(dates)
+        return [{'x': idx, 'y': 0, 'z': 0} for idx, _ in enumerate(dates)]
+    monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
+
+    response = client.get("/ephemeris/horizons/SDO/range?start=2023-01-01T00:00:00Z&end=2023-01-01T00:05:00Z&cadence=60")
+    assert response.status_code == 200
+    assert response.json['count'] == 6
+    assert response.json['x'] == [0, 1, 2, 3, 4, 5]
+    assert len(requested) == 6
+
+def test_range_errors(client):
+    response = client.get("/earth/range?start=2023-01-02T00:00:00Z&end=2023-01-01T00:00:00Z&cadence=60")
+    assert response.status_code == 400
+    response = client.get("/earth/range?start=2000-01-01T00:00:00Z&end=2023-01-01T00:00:00Z&cadence=1")
+    assert response.status_code == 400
+    assert "maximum" in response.json['error']
+    response = client.get("/earth/range?start=2023-01-01T00:00:00Z&end=2023-01-02T00:00:00Z&cadence=0")
+    assert response.status_code == 422
+
+
+def _unpack(response) -> tuple[np.ndarray, float, float]:
+    """
+    Decodes a binary coordinate response into positions, start, and cadence
+    """
+    assert response.mimetype == "application/octet-stream"
+    data = gzip.decompress(response.data)
+    assert data[:4] == MAGIC
+    size = data[5]
+    count = int.from_bytes(data[8:12], "little")
+    start, cadence = np.frombuffer(data[16:32], dtype="<f8")
+    positions = np.frombuffer(data[32:], dtype="<f4" if size == 4 else "<f8")
+    return positions.reshape(count, 3), start, cadence
+
+def test_get_earth_range_binary(client):
+    url = "/earth/range?start=2023-01-01T00:00:00Z&end=2023-01-01T01:00:00Z&cadence=600"
+    expected = client.get(url).json
+    for format in ["float32", "float64"]:
+        positions, start, cadence = _unpack(client.get(url + f"&format={format}"))
+        assert cadence == 600
+        assert start == 1672531200
+        assert positions[:, 0] == pytest.approx(expected['x'])
+        assert positions[:, 1] == pytest.approx(expected['y'])
+        assert positions[:, 2] == pytest.approx(expected['z'])
+    # Accept header selects float32
+    response = client.get(url, headers={"Accept": "application/octet-stream"})
+    positions, _, _ = _unpack(response)
+    assert gzip.decompress(response.data)[5] == 4
+    assert "Accept" in response.vary
+    # Caches know JSON responses depend on the Accept header too
+    assert "Accept" in client.get(url).vary
+    # Explicit json format overrides the Accept header
+    response = client.get(url + "&format=json", headers={"Accept": "application/octet-stream"})
+    assert response.json['count'] == 7
+    assert "Accept" not in response.vary
+
+def test_get_earth_binary(client):
+    expected = client.get("/earth/2023-01-01 00:00:00").json
+    positions, start, cadence = _unpack(client.get("/earth/2023-01-01 00:00:00?format=float64"))
+    assert np.isnan(start)
+    assert positions[0].tolist() == pytest.approx([expected['x'], expected['y'], expected['z']])
+
+def test_ephemeris_binary(client, monkeypatch):
+    def fake_horizons(body, dates) -> list[dict]:
+        return [{'x': 1, 'y': 2, 'z': 3} for _ in dates]
+    monkeypatch.setattr(Horizons, "Get", fake_horizons)
+    ephemeris._cache.Clear()
+    response = client.get("/ephemeris/horizons/SDO?dates=2023-01-01T00:00:00Z&dates=2023-01-02T00:00:00Z&format=float32")
+    positions, _, _ = _unpack(response)
+    assert positions.tolist() == [[1, 2, 3], [1, 2, 3]]
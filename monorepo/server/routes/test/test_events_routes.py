@@ -1,6 +1,13 @@
+from datetime import datetime, timedelta
+import json
+import threading
+
 import pytest
+from astropy.time import Time
 
 from main import app
+import api.events as events
+from persistent_cache import PersistentCache
 
 @pytest.fixture
 def client():
@@ -9,4 +16,68 @@ def client():
 def test_get_events(client):
     response = client.get("/event?start=2022-01-01 00:00:00&end=2022-01-01 00:01:00")
     print(response.data)
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_get_events_stream(client, monkeypatch, tmp_path):
+    day = datetime(1991, 1, 1)
+    second_bucket = threading.Event()
+    def fake_query_hek(start, end):
+        # Hold the second bucket until the first event has been received
+        if start > day:
+            assert second_bucket.wait(10)
+        return [{
+            "kb_archivid": f"ivo://helio-informatics.org/FL_{start.hour}",
+            "event_type": "FL",
+            "event_starttime": Time(start),
+            "event_endtime": Time(start + timedelta(minutes=10)),
+            "event_coordsys": "UTC-HRC-TOPO",
+            "event_coord1": 45.0,
+            "event_coord2": 0.0,
+            "event_coord3": None,
+            "event_coordunit": "degrees",
+            "obs_instrument": "various",
+            "event_probability": 0.5
+        }]
+    monkeypatch.setattr(events, "query_hek", fake_query_hek)
+    monkeypatch.setattr(events, "_cache", PersistentCache("hek", 1000000, str(tmp_path / "cache.sqlite")))
+
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00&format=ndjson", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.iter_encoded()
+    first = json.loads(next(lines))
+    assert first["vo_event"]["kb_archivid"].endswith("FL_0")
+    assert "observer" in first["coordinates"]
+    second_bucket.set()
+    assert [json.loads(line)["vo_event"]["kb_archivid"][-4:] for line in lines] == ["FL_1"]
+
+    # The same events are streamed when asking with the Accept header
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00", headers={"Accept": "application/x-ndjson"})
+    assert len(response.data.splitlines()) == 2
+    assert "Accept" in response.vary
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00")
+    assert "Accept" in response.vary
+    results = json.loads(response.data)["results"]
+    assert len(results) == 2
+    # The compact profile leaves out fields the viewer doesn't use
+    assert "event_probability" not in results[0]["vo_event"]
+    assert results[0]["vo_event"]["event_type"] == "FL"
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00&profile=full")
+    assert json.loads(response.data)["results"][0]["vo_event"]["event_probability"] == "0.5"
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00&fields=event_type&fields=not_a_field&format=ndjson")
+    assert [json.loads(line)["vo_event"] for line in response.data.splitlines()] == [{"event_type": "FL"}] * 2
+    response = client.get("/event?start=1991-01-01T00:00:00&end=1991-01-01T01:30:00&types=AR&types=CH")
+    assert json.loads(response.data)["results"] == []
+
+def test_get_events_utc_dates(client, monkeypatch, tmp_path):
+    queries = []
+    def fake_query_hek(start, end):
+        queries.append((start, end))
+        return []
+    monkeypatch.setattr(events, "query_hek", fake_query_hek)
+    monkeypatch.setattr(events, "_cache", PersistentCache("hek", 1000000, str(tmp_path / "cache.sqlite")))
+    # The app sends dates from toISOString, which end in Z
+    response = client.get("/event?start=1992-01-01T00:30:00.000Z&end=1992-01-01T01:30:00.000Z")
+    assert response.status_code == 200
+    assert json.loads(response.data)["results"] == []
+    assert sorted(queries) == [(datetime(1992, 1, 1, 0), datetime(1992, 1, 1, 1)), (datetime(1992, 1, 1, 1), datetime(1992, 1, 1, 2))]
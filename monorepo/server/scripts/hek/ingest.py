@@ -0,0 +1,51 @@
+try:
+    from api.events import ingest_hek_events
+except Exception as e:
+    print(e)
+    print(
+        "Please run as a module from the parent folder via `python -m scripts.hek.ingest`"
+    )
+    import sys
+
+    sys.exit(1)
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Stores HEK events with their coordinates in the database so /event doesn't need to query the HEK"
+    )
+    parser.add_argument("--days", type=float, default=3, help="Ingest this many days before --end. Ignored if --start is given.")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Start of the time range to ingest")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="End of the time range to ingest, defaults to now")
+    parser.add_argument("--window-hours", type=float, default=6, help="Size of each HEK query")
+    return parser.parse_args()
+
+
+def get_windows(start: datetime, end: datetime, size: timedelta) -> list:
+    """
+    Splits the time range into windows aligned to multiples of size, so
+    repeated runs store the same windows. The last window ends at end.
+    """
+    epoch = datetime(1970, 1, 1)
+    window_start = epoch + ((start - epoch) // size) * size
+    windows = []
+    while window_start < end:
+        windows.append((window_start, min(window_start + size, end)))
+        window_start += size
+    return windows
+
+
+def ingest(start: datetime, end: datetime, size: timedelta):
+    for window_start, window_end in get_windows(start, end, size):
+        count = ingest_hek_events(window_start, window_end)
+        print(f"{window_start.isoformat()} to {window_end.isoformat()}: {count} events")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    end = args.end or datetime.utcnow()
+    start = args.start or end - timedelta(days=args.days)
+    ingest(start, end, timedelta(hours=args.window_hours))
@@ -1,6 +1,7 @@
 try:
     from database._db import engine
     from database.models import GongPFSS
+    from database.pfss_files import WriteCompressedCopy
 except Exception as e:
     print(e)
     print(
@@ -63,7 +64,17 @@ def add_files_to_db(files: list):
         session.commit()
 
 
+def write_compressed_copies(files: list):
+    """
+    Writes the compressed copy of each file that /pfss/gong/ sends, for files
+    that don't have an up to date one.
+    """
+    written = sum(WriteCompressedCopy(filepath) for filepath in files)
+    print(f"Compressed {written} of {len(files)} files")
+
+
 if __name__ == "__main__":
     args = parse_args()
     files = get_file_list(args.pfss_dir)
+    write_compressed_copies(files)
     add_files_to_db(files)
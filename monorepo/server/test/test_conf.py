@@ -7,4 +7,8 @@ def test_replace_env_vars():
     test_str = "This {TEST} is {IT}"
     expected_result = "This test is it"
     result = conf._replace_env_vars(test_str)
-    assert result == expected_result
\ No newline at end of file
+    assert result == expected_result
+
+def test_get_default():
+    assert conf.get("not_a_section", "not_a_key", "default") == "default"
+    assert conf.get("database", "connection_string", "default") != "default"
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import HeliographicStonyhurst
+
+import coordinate_lookup
+from get_heeq import convert_skycoords_to_heeq_array
+from persistent_cache import PersistentCache
+
+# Trimmed down HMI jp2 header with the keywords needed to build a sunpy Map
+HEADER = """<?xml version="1.0" encoding="utf-8"?><meta><fits>
+<SIMPLE>1</SIMPLE><NAXIS>2</NAXIS><NAXIS1>4096</NAXIS1><NAXIS2>4096</NAXIS2>
+<DATE-OBS>2023-01-01T00:00:05.57</DATE-OBS><TELESCOP>SDO/HMI</TELESCOP><INSTRUME>HMI_FRONT2</INSTRUME>
+<WAVELNTH>6173</WAVELNTH><WAVEUNIT>angstrom</WAVEUNIT><CTYPE1>HPLN-TAN</CTYPE1><CTYPE2>HPLT-TAN</CTYPE2>
+<CDELT1>0.6</CDELT1><CDELT2>0.6</CDELT2><CRPIX1>2048</CRPIX1><CRPIX2>2048</CRPIX2><CRVAL1>0</CRVAL1><CRVAL2>0</CRVAL2>
+<CUNIT1>arcsec</CUNIT1><CUNIT2>arcsec</CUNIT2><RSUN_REF>696000000</RSUN_REF>
+<DSUN_OBS>147105052173.1</DSUN_OBS><HGLN_OBS>0.0123</HGLN_OBS><HGLT_OBS>-3.0123</HGLT_OBS>
+<CRLN_OBS>100.5</CRLN_OBS><CRLT_OBS>-3.0123</CRLT_OBS>
+</fits><helioviewer></helioviewer></meta>"""
+
+@pytest.fixture
+def lookups(monkeypatch, tmp_path) -> list:
+    """
+    Replaces the helioviewer queries with a fake observer and counts how many
+    times it is looked up.
+    """
+    lookups = []
+    def fake_closest_image(date, source_id):
+        lookups.append(source_id)
+        return {"id": 1}
+    def fake_observer(id):
+        return SkyCoord(12.5 * u.deg, -3.25 * u.deg, 1.5e11 * u.m, rsun=6.96e8 * u.m,
+                        frame=HeliographicStonyhurst, obstime="2023-01-01T00:00:05")
+    monkeypatch.setattr(coordinate_lookup, "_get_closest_image", fake_closest_image)
+    monkeypatch.setattr(coordinate_lookup, "get_observer_coordinate_by_id", fake_observer)
+    monkeypatch.setattr(coordinate_lookup, "_CACHE", PersistentCache("observer", 10000, str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(coordinate_lookup, "_TRAJECTORIES", {})
+    return lookups
+
+def test_observer_is_cached(lookups, monkeypatch):
+    date = datetime(2023, 1, 1, 0, 0, 0)
+    first = coordinate_lookup.get_observer_coordinate("AIA", date)
+    # Nearby dates are answered by the known position in the trajectory
+    second = coordinate_lookup.get_observer_coordinate("AIA", datetime(2023, 1, 1, 0, 20, 0))
+    # Same minute hits the shared cache in a worker without the trajectory
+    monkeypatch.setattr(coordinate_lookup, "_TRAJECTORIES", {})
+    third = coordinate_lookup.get_observer_coordinate("AIA", datetime(2023, 1, 1, 0, 0, 30))
+    assert len(lookups) == 1
+    for result in [first, second, third]:
+        coordinate = result["coordinate"]
+        assert coordinate.lon.deg == pytest.approx(12.5)
+        assert coordinate.lat.deg == pytest.approx(-3.25)
+        assert coordinate.radius.to_value(u.m) == pytest.approx(1.5e11)
+        assert coordinate.rsun.to_value(u.m) == pytest.approx(6.96e8)
+        assert coordinate.obstime.isot == "2023-01-01T00:00:05.000"
+    # A date further than the trajectory's gap tolerance goes upstream
+    coordinate_lookup.get_observer_coordinate("AIA", datetime(2023, 1, 1, 2, 0, 0))
+    assert len(lookups) == 2
+    stats = coordinate_lookup._CACHE.Stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+def test_notes_are_cached(lookups):
+    date = datetime(2023, 1, 1, 0, 0, 0)
+    coordinate_lookup.get_observer_coordinate("not an observatory", date)
+    result = coordinate_lookup.get_observer_coordinate("not an observatory", date)
+    assert len(lookups) == 1
+    assert "defaulting to AIA" in result["notes"]
+
+def test_bulk_lookup(lookups):
+    observations = [
+        ("AIA", datetime(2023, 1, 1, 0, 0, 0)),
+        ("not an observatory", datetime(2023, 1, 1, 0, 0, 30)),
+        ("LASCO_C2", datetime(2023, 1, 1, 0, 0, 0)),
+        ("AIA", datetime(2023, 1, 1, 0, 0, 10)),
+    ]
+    results = coordinate_lookup.get_observer_coordinates(observations)
+    # Unknown observatories map to AIA, so only AIA and LASCO are looked up
+    assert sorted(lookups) == [4, 8]
+    assert len(results) == len(observations)
+    assert [result["notes"] == "" for result in results] == [True, False, True, True]
+    assert all(result["coordinate"].lon.deg == pytest.approx(12.5) for result in results)
+    assert coordinate_lookup.get_observer_coordinates([]) == []
+
+
+def _assert_matches_map(header: str):
+    direct = coordinate_lookup._observer_from_keywords(coordinate_lookup._read_fits_keywords(header))
+    assert direct is not None
+    expected = coordinate_lookup._observer_from_map(header)
+    assert convert_skycoords_to_heeq_array(direct) == pytest.approx(convert_skycoords_to_heeq_array(expected), abs=1e-9)
+    assert direct.obstime == expected.obstime
+    assert direct.rsun == expected.rsun
+
+def test_header_observer_matches_map():
+    _assert_matches_map(HEADER)
+    # Carrington keywords are used when stonyhurst keywords are missing
+    _assert_matches_map(HEADER.replace("<HGLN_OBS>0.0123</HGLN_OBS><HGLT_OBS>-3.0123</HGLT_OBS>", ""))
+
+def test_unusual_header_uses_map(monkeypatch):
+    calls = []
+    def fake_map(header):
+        calls.append(header)
+    monkeypatch.setattr(coordinate_lookup, "_observer_from_map", fake_map)
+    coordinate_lookup.get_observer_coordinate_from_header(HEADER)
+    assert len(calls) == 0
+    # Dates without a time are completed by instrument specific map sources
+    coordinate_lookup.get_observer_coordinate_from_header(HEADER.replace("2023-01-01T00:00:05.57", "2023-01-01"))
+    coordinate_lookup.get_observer_coordinate_from_header(HEADER.replace("<DSUN_OBS>147105052173.1</DSUN_OBS>", ""))
+    # Without rsun_ref the radius comes from other keywords
+    coordinate_lookup.get_observer_coordinate_from_header(HEADER.replace("<RSUN_REF>696000000</RSUN_REF>", "<RSUN_OBS>975.0</RSUN_OBS>"))
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("instrument", [
+    "<TELESCOP>SDO/AIA</TELESCOP><INSTRUME>AIA_3</INSTRUME>",
+    "<TELESCOP>SOHO</TELESCOP><INSTRUME>EIT</INSTRUME>",
+    "<OBSRVTRY>Solar Orbiter</OBSRVTRY><INSTRUME>EUI</INSTRUME>",
+])
+def test_instrument_observer_uses_map(monkeypatch, instrument):
+    # These map sources change how the observer is read from the header
+    calls = []
+    monkeypatch.setattr(coordinate_lookup, "_observer_from_map", lambda header: calls.append(header))
+    coordinate_lookup.get_observer_coordinate_from_header(HEADER.replace("<TELESCOP>SDO/HMI</TELESCOP><INSTRUME>HMI_FRONT2</INSTRUME>", instrument))
+    assert len(calls) == 1
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+import astropy.units as u
+import sunpy.coordinates
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import HeliographicStonyhurst
+
+from event_coord import get_event_coordinates, get_events_coordinates, CoordinateSystem
+from helios_exceptions import HeliosException
+
+def _observer(lon: float, obstime: str) -> dict:
+    return {
+        "coordinate": SkyCoord(lon * u.deg, -3 * u.deg, 1.47e11 * u.m, rsun=6.96e8 * u.m,
+                               frame=HeliographicStonyhurst, obstime=obstime),
+        "notes": ""
+    }
+
+def _events() -> tuple[list, list]:
+    """
+    Returns a mix of events in every coordinate system, and observers for the
+    events that need one.
+    """
+    aia = _observer(0.01, "2023-01-01T00:00:05")
+    stereo = _observer(-12.5, "2023-01-01T01:00:00")
+    unknown = {"coordinate": aia["coordinate"], "notes": "No position data available for unknown, defaulting to AIA"}
+    events, observers = [], []
+    for i in range(12):
+        date = datetime(2023, 1, 1) + timedelta(minutes=7 * i)
+        # Far off disk projective events can't be placed on the sun
+        events.append((CoordinateSystem.Projective, -1200 + 200 * i, 50 * i - 300, None, date, "AIA", "arcseconds arcseconds"))
+        observers.append(aia if i % 3 else unknown)
+        events.append((CoordinateSystem.Projective, 200 - 20 * i, 30 * i, None, date, "EUVI", "arcsec,arcsec"))
+        observers.append(stereo)
+        events.append((CoordinateSystem.Stonyhurst, 10 * i - 60, 40 - 5 * i, None, date, "AIA", "degrees degrees"))
+        observers.append(aia)
+        events.append((CoordinateSystem.Radial, 30 * i + 0.5, 0, None, date, "LASCO", "degrees"))
+        observers.append(None)
+        events.append((CoordinateSystem.Carrington.value, 20 * i, 30 - 5 * i, 1, date, "various", "deg deg solRad"))
+        observers.append(None)
+    return events, observers
+
+def test_events_match_single_conversion():
+    events, observers = _events()
+    results = get_events_coordinates(events, observers)
+    assert len(results) == len(events)
+    for event, observer, result in zip(events, observers, results):
+        expected = get_event_coordinates(*event, observer=observer)
+        assert result["notes"] == expected["notes"]
+        assert result["observer"].model_dump() == pytest.approx(expected["observer"].model_dump())
+        assert result["event"]["lat"] == pytest.approx(expected["event"]["lat"], abs=1e-9)
+        assert result["event"]["lon"] == pytest.approx(expected["event"]["lon"], abs=1e-9)
+
+def test_events_bad_units():
+    events, observers = _events()
+    events[0] = (*events[0][:6], "arcsec arcsec arcsec arcsec")
+    with pytest.raises(HeliosException, match="Got arcsec,arcsec,arcsec,arcsec"):
+        get_events_coordinates(events, observers)
+
+def _skycoord_stonyhurst(lon, lat, date, units) -> dict:
+    """
+    Converts a stonyhurst event with sunpy's frames, the way event_coord did
+    before its closed-form stonyhurst and radial paths.
+    """
+    event = SkyCoord(lon, lat, unit=units, obstime=date, frame=HeliographicStonyhurst)
+    lat = (event.lat - sunpy.coordinates.sun.B0(event.obstime)).deg
+    return {"lat": lat, "lon": event.lon.deg}
+
+def test_closed_form_systems_match_skycoord():
+    date = datetime(2023, 3, 20, 12)
+    events, expected = [], []
+    for angle in [0, 45.7, 180, 180.5, 270, 359.9]:
+        events.append((CoordinateSystem.Radial, angle, None, None, date, "LASCO", "degrees"))
+        lon, lat = (-90, 90 - int(angle)) if int(angle) <= 180 else (90, int(angle) - 270)
+        expected.append(_skycoord_stonyhurst(lon, lat, date, "deg,deg"))
+    for lon, lat, units in [(-60, 40, "degrees degrees"), (190, -20, "deg,deg"), (-180, 0, "deg"),
+                            (720000, -3600, "arcseconds arcseconds"), (3.5, -0.2, "rad rad")]:
+        events.append((CoordinateSystem.Stonyhurst, lon, lat, None, date, "AIA", units))
+        expected.append(_skycoord_stonyhurst(lon, lat, date, units.replace(" ", ",").replace("degrees", "deg").replace("arcseconds", "arcsec")))
+    observers = [None if event[0] == CoordinateSystem.Radial else _observer(0.01, "2023-03-20T12:00:00") for event in events]
+    single = [get_event_coordinates(*event, observer=observer) for event, observer in zip(events, observers)]
+    grouped = get_events_coordinates(events, observers)
+    for result, grouped_result, reference in zip(single, grouped, expected):
+        # B0 is interpolated from the earth table, which is well within an arcsecond of sunpy
+        assert result["event"]["lat"] == pytest.approx(reference["lat"], abs=1e-5)
+        assert result["event"]["lon"] == pytest.approx(reference["lon"], abs=1e-9)
+        assert grouped_result["event"] == pytest.approx(result["event"], abs=1e-9)
+
+def test_closed_form_systems_reject_invalid_events():
+    date = datetime(2023, 1, 1)
+    aia = _observer(0.01, "2023-01-01T00:00:05")
+    with pytest.raises(HeliosException, match="Got arcsec,arcsec,arcsec,arcsec"):
+        get_event_coordinates(CoordinateSystem.Stonyhurst, 10, 20, None, date, "AIA", "arcsec arcsec arcsec arcsec", observer=aia)
+    with pytest.raises(HeliosException, match="Got parsecs,deg"):
+        get_events_coordinates([(CoordinateSystem.Stonyhurst, 10, 20, None, date, "AIA", "parsecs deg")], [aia])
+    # Off the sun, as sunpy rejects them
+    with pytest.raises(ValueError, match="Latitude"):
+        get_event_coordinates(CoordinateSystem.Stonyhurst, 10, 120, None, date, "AIA", "deg deg", observer=aia)
+    with pytest.raises(HeliosException, match="Latitude"):
+        get_events_coordinates([(CoordinateSystem.Radial, 400, None, None, date, "LASCO", "deg")])
+    with pytest.raises(HeliosException, match="Latitude"):
+        get_event_coordinates(CoordinateSystem.Radial, 400, None, None, date, "LASCO", "deg")
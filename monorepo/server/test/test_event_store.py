@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from astropy.time import Time
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+import api.events as events
+from database._db import engine
+from database.events import MissingHekWindows
+from database.models import HekEvent, HekIngestWindow
+from persistent_cache import PersistentCache
+
+# Far from any real data in the test database
+DAY = datetime(1990, 1, 1)
+
+def _hek_event(id: int, event_type: str, start: datetime, hours: float) -> dict:
+    """
+    Returns an event with the fields used by /event, shaped like a row from the HEK
+    """
+    return {
+        "kb_archivid": f"ivo://helio-informatics.org/{event_type}_{id}",
+        "event_type": event_type,
+        "event_starttime": Time(start),
+        "event_endtime": Time(start + timedelta(hours=hours)),
+        "event_coordsys": "UTC-HRC-TOPO" if id % 2 else "UTC-HGC-TOPO",
+        "event_coord1": 30.0 * id,
+        "event_coord2": 10.0,
+        "event_coord3": 1.0,
+        "event_coordunit": "degrees" if id % 2 else "deg deg solRad",
+        "obs_instrument": "various"
+    }
+
+HEK = [
+    _hek_event(1, "FL", DAY + timedelta(hours=1), 1),
+    _hek_event(2, "AR", DAY - timedelta(hours=12), 48),
+    _hek_event(3, "FL", DAY + timedelta(hours=5), 2),
+    _hek_event(4, "CH", DAY + timedelta(hours=20), 1),
+]
+
+@pytest.fixture
+def hek(monkeypatch, tmp_path) -> list:
+    """
+    Replaces the HEK with the events above and records the time range of each query
+    """
+    queries = []
+    def fake_query_hek(start, end):
+        queries.append((start, end))
+        return [event for event in HEK if event["event_starttime"].to_datetime() <= end and event["event_endtime"].to_datetime() >= start]
+    monkeypatch.setattr(events, "query_hek", fake_query_hek)
+    monkeypatch.setattr(events, "_cache", PersistentCache("hek", 1000000, str(tmp_path / "cache.sqlite")))
+    yield queries
+    with Session(engine) as session, session.begin():
+        session.execute(delete(HekEvent).where(HekEvent.start < DAY + timedelta(days=2)))
+        session.execute(delete(HekIngestWindow).where(HekIngestWindow.start < DAY + timedelta(days=2)))
+
+def _ids(results: dict) -> list:
+    return [event.vo_event["kb_archivid"][-4:] for event in results["results"]]
+
+def test_events_from_store(hek):
+    assert events.ingest_hek_events(DAY, DAY + timedelta(hours=6)) == 3
+    assert events.ingest_hek_events(DAY + timedelta(hours=6), DAY + timedelta(hours=12)) == 2
+    hek.clear()
+    # Ingested ranges are answered without the HEK
+    results = events.lookup_hek_events(DAY + timedelta(hours=3), DAY + timedelta(hours=10))
+    assert hek == []
+    assert _ids(results) == ["AR_2", "FL_3"]
+    stored = results["results"][1]
+    live = events.convert_hek_events([HEK[2]])[0]
+    assert stored.vo_event == live.vo_event
+    assert stored.coordinates.model_dump() == live.coordinates
+    # Only the hourly buckets that aren't ingested go to the HEK
+    results = events.lookup_hek_events(DAY, DAY + timedelta(hours=22))
+    assert sorted(hek) == [(DAY + timedelta(hours=h), DAY + timedelta(hours=h + 1)) for h in range(12, 22)]
+    assert _ids(results) == ["AR_2", "FL_1", "FL_3", "CH_4"]
+    results = events.lookup_hek_events(DAY, DAY + timedelta(hours=22), ["FL"])
+    assert _ids(results) == ["FL_1", "FL_3"]
+
+def test_ingest_windows(hek):
+    events.ingest_hek_events(DAY, DAY + timedelta(hours=6))
+    events.ingest_hek_events(DAY + timedelta(hours=12), DAY + timedelta(hours=18))
+    assert MissingHekWindows(DAY - timedelta(hours=1), DAY + timedelta(hours=20)) == [
+        (DAY - timedelta(hours=1), DAY),
+        (DAY + timedelta(hours=6), DAY + timedelta(hours=12)),
+        (DAY + timedelta(hours=18), DAY + timedelta(hours=20))
+    ]
+    # Re-ingesting replaces events and windows instead of duplicating them
+    events.ingest_hek_events(DAY, DAY + timedelta(hours=18))
+    assert MissingHekWindows(DAY, DAY + timedelta(hours=18)) == []
+    with Session(engine) as session:
+        assert session.query(HekEvent).where(HekEvent.start < DAY + timedelta(days=2)).count() == 3
+        assert session.query(HekIngestWindow).where(HekIngestWindow.start < DAY + timedelta(days=2)).count() == 1
+
+def test_dates_with_timezone(hek):
+    events.ingest_hek_events(DAY, DAY + timedelta(hours=6))
+    # The same range as UTC and as UTC+02:00
+    utc = [(DAY + timedelta(hours=h)).replace(tzinfo=timezone.utc) for h in (0, 6)]
+    offset = [date.astimezone(timezone(timedelta(hours=2))) for date in utc]
+    hek.clear()
+    assert _ids(events.lookup_hek_events(*utc)) == ["AR_2", "FL_1", "FL_3"]
+    assert _ids(events.lookup_hek_events(*offset)) == ["AR_2", "FL_1", "FL_3"]
+    assert hek == []
+
+def test_cached_buckets(hek):
+    results = events.lookup_hek_events(DAY + timedelta(minutes=30), DAY + timedelta(hours=2, minutes=30))
+    assert len(hek) == 3
+    assert _ids(results) == ["AR_2", "FL_1"]
+    # Overlapping ranges only query the new buckets
+    results = events.lookup_hek_events(DAY + timedelta(hours=2), DAY + timedelta(hours=5, minutes=30))
+    assert sorted(hek[3:]) == [(DAY + timedelta(hours=3), DAY + timedelta(hours=4)), (DAY + timedelta(hours=4), DAY + timedelta(hours=5)),
+                               (DAY + timedelta(hours=5), DAY + timedelta(hours=6))]
+    assert _ids(results) == ["AR_2", "FL_1", "FL_3"]
+    stats = events._cache.Stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 6
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+import file_cache
+from file_cache import FileCache
+
+@pytest.fixture
+def cache(tmp_path) -> FileCache:
+    return FileCache("test", 10, str(tmp_path / "cache"))
+
+def test_get_put(cache):
+    assert cache.Get("a") is None
+    cache.Put("a", b"value")
+    assert cache.Get("a")[:] == b"value"
+    cache.Put("empty", b"")
+    assert cache.Get("empty") == b""
+    stats = cache.Stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (2, 1, 2, 5)
+
+def test_counters_shared_by_workers(cache):
+    cache.Put("a", b"value")
+    cache.GetMany(["a", "b"])
+    # Another worker using the same directory
+    other = FileCache("other", 10, cache.path)
+    assert other.Get("a")[:] == b"value"
+    stats = other.Stats()
+    assert (stats["hits"], stats["misses"]) == (1, 0)
+    stats = cache.Stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+def test_evicts_least_recently_used(cache):
+    cache.PutMany({"a": b"1234", "b": b"1234"})
+    # Make "a" the least recently used
+    os.utime(cache._EntryPath("a"), (0, 0))
+    os.utime(cache._EntryPath("b"), (1, 1))
+    assert cache.Get("b") is not None
+    cache.Put("c", b"1234")
+    assert cache.Get("a") is None
+    assert cache.Get("b") is not None
+    stats = cache.Stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 2, 8)
+
+def test_mapped_value_survives_eviction(cache):
+    cache.Put("a", b"1234")
+    value = cache.Get("a")
+    cache.Clear()
+    assert cache.Get("a") is None
+    assert value[:] == b"1234"
+    assert cache.Stats()["entries"] == 0
+
+def test_default_path_without_shared_memory(monkeypatch, tmp_path):
+    monkeypatch.setattr(file_cache, "_SHARED_MEMORY", str(tmp_path / "missing"))
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    cache = FileCache("test", 10)
+    assert cache.path == str(tmp_path / "helios_test_cache")
+    cache.Put("a", b"value")
+    assert cache.Get("a")[:] == b"value"
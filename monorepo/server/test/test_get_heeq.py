@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import astropy.units as u
+from astropy.time import Time
+from sunpy.coordinates import get_earth
+
+from get_heeq import convert_skycoords_to_heeq, convert_skycoords_to_heeq_array, heeq_array_to_list
+from api.ephemeris.provider import CoordinateProvider
+
+def test_batch_conversion_matches_scalar_conversion():
+    dates = Time("2023-01-01 00:00:00") + np.arange(5) * u.day
+    coords = get_earth(dates)
+    xyz = convert_skycoords_to_heeq_array(coords)
+    assert xyz.shape == (3, 5)
+    for idx, coord in enumerate(coords):
+        expected = convert_skycoords_to_heeq(coord)
+        assert xyz[0, idx] == pytest.approx(expected.x)
+        assert xyz[1, idx] == pytest.approx(expected.y)
+        assert xyz[2, idx] == pytest.approx(expected.z)
+
+def test_convert_sky_coords_returns_dicts():
+    coords = get_earth(Time(["2023-01-01 00:00:00", "2023-01-02 00:00:00"]))
+    expected = heeq_array_to_list(convert_skycoords_to_heeq_array(coords))
+    assert list(expected[0].keys()) == ['x', 'y', 'z']
+    # Array SkyCoords and lists of scalar SkyCoords give the same result
+    for result in [CoordinateProvider.ConvertSkyCoords(coords), CoordinateProvider.ConvertSkyCoords([coords[0], coords[1]])]:
+        for idx, position in enumerate(result):
+            assert position == pytest.approx(expected[idx])
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+import threading
+
+import hek
+
+def test_long_ranges_are_split(monkeypatch):
+    queries = []
+    # Sub-ranges are queried concurrently, so each query waits here until all
+    # four are in flight. Sequential queries would break the barrier.
+    barrier = threading.Barrier(4, timeout=10)
+    def fake_search(start, end):
+        queries.append((start, end))
+        if end - start == timedelta(hours=6):
+            barrier.wait()
+        # One event per hour, each lasting two hours
+        hours = int((end - start) / timedelta(hours=1))
+        return [{"kb_archivid": f"{(start + timedelta(hours=h - 1)).isoformat()}"} for h in range(hours + 1)]
+    monkeypatch.setattr(hek, "_search", fake_search)
+    monkeypatch.setattr(hek, "_MAX_WINDOW", timedelta(hours=6))
+
+    start = datetime(2023, 1, 1)
+    events = hek.query_hek(start, start + timedelta(days=1))
+    assert sorted(queries) == [(start + timedelta(hours=h), start + timedelta(hours=h + 6)) for h in range(0, 24, 6)]
+    ids = [event["kb_archivid"] for event in events]
+    assert len(ids) == len(set(ids)) == 25
+    assert ids == sorted(ids)
+
+    queries.clear()
+    hek.query_hek("2023-01-01 00:00:00", "2023-01-01 01:00:00")
+    assert queries == [(start, start + timedelta(hours=1))]
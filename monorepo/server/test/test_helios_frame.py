@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import astropy.units as u
+from astropy.time import Time
+from astropy.coordinates import SkyCoord, HCRS
+from sunpy.coordinates import HeliographicStonyhurst, HeliographicCarrington, get_earth
+
+from get_heeq import convert_skycoords_to_heeq_array
+from helios_frame import hgs_to_helios, helios_to_hgs, earth_position, earth_skycoord
+
+# Maximum allowed difference between the fast path and astropy in solar radii.
+# This is about 700 meters.
+TOLERANCE = 1e-6
+
+def _random_hgs(obstime) -> SkyCoord:
+    rng = np.random.default_rng(0)
+    count = obstime.size
+    return SkyCoord(
+        rng.uniform(-180, 180, count) * u.deg,
+        rng.uniform(-90, 90, count) * u.deg,
+        rng.uniform(0.01, 5, count) * u.AU,
+        frame=HeliographicStonyhurst, obstime=obstime
+    )
+
+def _assert_matches_astropy(coords):
+    fast = convert_skycoords_to_heeq_array(coords)
+    exact = convert_skycoords_to_heeq_array(coords, use_astropy=True)
+    assert fast.shape == exact.shape
+    assert np.max(np.abs(fast - exact)) < TOLERANCE
+
+def test_sparse_dates_match_astropy():
+    dates = Time("1995-01-01") + np.linspace(0, 35 * 365, 500) * u.day
+    _assert_matches_astropy(_random_hgs(dates))
+
+def test_dense_dates_match_astropy():
+    # Enough dates that the earth's longitude is interpolated from a grid
+    dates = Time("2023-01-01") + np.arange(2000) * u.min
+    _assert_matches_astropy(_random_hgs(dates))
+
+def test_other_frames_match_astropy():
+    dates = Time("2010-01-01") + np.linspace(0, 365, 50) * u.day
+    earth = get_earth(dates)
+    _assert_matches_astropy(earth[0])
+    _assert_matches_astropy(earth.transform_to(HCRS(obstime=dates)))
+    _assert_matches_astropy(earth.transform_to(HeliographicCarrington(obstime=dates, observer="earth")))
+
+def test_helios_to_hgs_is_inverse():
+    dates = Time("2020-01-01") + np.linspace(0, 365, 10) * u.day
+    xyz = np.random.default_rng(1).uniform(-200, 200, (3, 10))
+    assert helios_to_hgs(hgs_to_helios(xyz, dates), dates) == pytest.approx(xyz)
+
+
+@pytest.mark.parametrize("dates", [
+    # Spans the table and dates before and after it
+    Time("1990-01-01") + np.linspace(0, 45 * 365, 300) * u.day,
+    # Dense dates between tabulated positions
+    Time("2023-01-01") + np.arange(2000) * u.min
+])
+def test_earth_position_matches_sunpy(dates):
+    expected = convert_skycoords_to_heeq_array(get_earth(dates), use_astropy=True)
+    assert np.max(np.abs(earth_position(dates) - expected)) < TOLERANCE
+
+def test_earth_skycoord_matches_sunpy():
+    dates = Time("2015-06-01") + np.linspace(0, 365, 20) * u.day
+    expected = get_earth(dates)
+    earth = earth_skycoord(dates)
+    assert earth.lon.deg == pytest.approx(expected.lon.deg, abs=1e-8)
+    assert earth.lat.deg == pytest.approx(expected.lat.deg, abs=1e-8)
+    assert earth.radius.to_value(u.solRad) == pytest.approx(expected.radius.to_value(u.solRad), abs=TOLERANCE)
+    scalar = earth_skycoord(Time("2015-06-01"))
+    assert scalar.lat.deg == pytest.approx(expected[0].lat.deg, abs=1e-8)
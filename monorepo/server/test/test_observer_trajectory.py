@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import astropy.units as u
+from astropy.time import Time
+
+from get_heeq import convert_skycoords_to_heeq_array
+from helios_frame import earth_skycoord
+from observer_trajectory import ObserverTrajectory
+
+# Known positions every 10 minutes, so anything up to 10 minutes away is
+# covered by the trajectory.
+START = Time("2023-01-01 00:00:00")
+
+@pytest.fixture
+def trajectory() -> ObserverTrajectory:
+    trajectory = ObserverTrajectory(max_gap=600)
+    trajectory.Add(earth_skycoord(START + np.arange(0, 60, 10) * u.min))
+    return trajectory
+
+def test_interpolates_between_samples(trajectory):
+    date = START + 23 * u.min
+    result = trajectory.Lookup(date.to_datetime())
+    assert result.obstime == date
+    expected = convert_skycoords_to_heeq_array(earth_skycoord(date))
+    # Earth moves along a nearly straight line over 10 minutes
+    assert convert_skycoords_to_heeq_array(result) == pytest.approx(expected, abs=1e-5)
+
+def test_nearest_sample_outside_range(trajectory):
+    # 5 minutes after the last sample returns the last sample as is
+    result = trajectory.Lookup((START + 55 * u.min).to_datetime())
+    assert result.obstime.isot == (START + 50 * u.min).isot
+    expected = convert_skycoords_to_heeq_array(earth_skycoord(START + 50 * u.min))
+    assert convert_skycoords_to_heeq_array(result) == pytest.approx(expected, abs=1e-9)
+
+def test_gap_is_a_miss(trajectory):
+    assert trajectory.Lookup((START - 11 * u.min).to_datetime()) is None
+    assert trajectory.Lookup((START + 61 * u.min).to_datetime()) is None
+    assert ObserverTrajectory(max_gap=600).Lookup(START.to_datetime()) is None
+
+def test_add_scalar_and_max_samples():
+    trajectory = ObserverTrajectory(max_gap=600, max_samples=4)
+    for minutes in range(5):
+        trajectory.Add(earth_skycoord(START + minutes * u.min))
+    # Adding the same time again is ignored
+    trajectory.Add(earth_skycoord(START))
+    assert len(trajectory) == 3
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+
+import pytest
+
+from persistent_cache import PersistentCache
+
+@pytest.fixture
+def cache(tmp_path) -> PersistentCache:
+    return PersistentCache("test", 1000, str(tmp_path / "cache.sqlite"))
+
+def test_get_put(cache):
+    assert cache.Get("a") is None
+    cache.Put("a", b"value")
+    assert cache.Get("a") == b"value"
+    stats = cache.Stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len("a") + len(b"value")
+
+def test_replace_keeps_size(cache):
+    cache.Put("a", b"12345")
+    cache.Put("a", b"123")
+    assert cache.Get("a") == b"123"
+    assert cache.Stats()["bytes"] == 4
+    assert cache.Stats()["entries"] == 1
+
+def test_get_many(cache):
+    cache.PutMany({"a": b"1", "b": b"2"})
+    assert cache.GetMany(["a", "b", "c"]) == {"a": b"1", "b": b"2"}
+    assert cache.Stats()["misses"] == 1
+
+def test_get_while_writing(cache):
+    cache.Put("a", b"value")
+    # Another worker holds the write lock
+    writer = sqlite3.connect(cache.path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    results = []
+    thread = threading.Thread(target=lambda: results.append(cache.Get("a")))
+    thread.start()
+    thread.join(5)
+    blocked = thread.is_alive()
+    writer.execute("ROLLBACK")
+    thread.join()
+    assert not blocked
+    assert results == [b"value"]
+    # The lookup is counted once it's written
+    assert cache.Stats()["hits"] == 1
+
+def test_ttl(cache):
+    cache.Put("a", b"value", ttl=-1)
+    assert cache.Get("a") is None
+
+def test_lru_eviction(cache):
+    # Each entry is 100 bytes, so the cache holds 10 of them
+    for idx in range(10):
+        cache.Put(f"{idx}", b"x" * 99)
+    # Touch the first entry so it's no longer the least recently used
+    cache.Get("0")
+    cache.Put("10", b"x" * 98)
+    assert cache.Get("0") is not None
+    assert cache.Get("1") is None
+    stats = cache.Stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+
+def test_shared_between_instances(cache):
+    cache.Put("a", b"value")
+    other = PersistentCache("test", 1000, cache.path)
+    assert other.Get("a") == b"value"
+    # Caches with different names don't share entries
+    assert PersistentCache("other", 1000, cache.path).Get("a") is None
+
+def test_coalesce(cache):
+    calls = []
+    checked = set()
+    condition = threading.Condition()
+    def ready():
+        with condition:
+            checked.add(threading.current_thread())
+            condition.notify_all()
+        return cache.Get("result")
+    def compute():
+        calls.append(1)
+        # Holds the computation until every other request is waiting for it
+        with condition:
+            assert condition.wait_for(lambda: len(checked - {threading.current_thread()}) == 3, timeout=10)
+        cache.Put("result", b"done")
+        return b"done"
+
+    results = []
+    def request():
+        results.append(cache.Coalesce("flight", compute, ready))
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [b"done"] * 4
+    assert cache.Stats()["coalesced"] == 3
+
+    # A request that missed the cache before the computation finished, and
+    # takes the lease after it was released, uses the stored result
+    assert cache.Coalesce("flight", lambda: calls.append(1), lambda: cache.Get("result")) == b"done"
+    assert len(calls) == 1
+
+def test_coalesce_after_failure(cache):
+    def fail():
+        raise RuntimeError("upstream failure")
+    with pytest.raises(RuntimeError):
+        cache.Coalesce("flight", fail, lambda: None)
+    # The failed computation's lease is released
+    assert cache.Coalesce("flight", lambda: b"ok", lambda: None) == b"ok"